@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai de l'affectation équilibrée à K ilotiers
+
+Usage : python benchmarks/bench_assignment.py [familles] [ilotiers...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carte_ilotier.assignment import NUMPY_AVAILABLE, balanced_assignment, zone_capacities, zone_minimums
+from carte_ilotier.distances import distance_matrix
+
+
+def main(argv):
+    families = int(argv[0]) if argv else 50000
+    zone_counts = [int(value) for value in argv[1:]] or [2, 3, 6, 12]
+    random.seed(42)
+    lats = [35.5 + random.random() * 0.4 for _ in range(families)]
+    lngs = [139.5 + random.random() * 0.4 for _ in range(families)]
+
+    print(f"{families} familles, NumPy : {'oui' if NUMPY_AVAILABLE else 'non'}")
+    print(f"{'ilotiers':>9} {'naturel (km)':>14} {'équilibré (km)':>15} {'temps':>8}")
+    for zone_count in zone_counts:
+        ilotier_lats = [35.5 + random.random() * 0.4 for _ in range(zone_count)]
+        ilotier_lngs = [139.5 + random.random() * 0.4 for _ in range(zone_count)]
+        matrix = distance_matrix(lats, lngs, ilotier_lats, ilotier_lngs)
+        rows = matrix if isinstance(matrix, list) else matrix.tolist()
+        natural = sum(min(row) for row in rows)
+
+        # Same bounds as ZonePipeline.apply_balance_algorithm
+        capacities = zone_capacities(families, [1] * zone_count)
+        minimums = zone_minimums(families, [1] * zone_count)
+        start = time.perf_counter()
+        assignment = balanced_assignment(matrix, capacities, minimums=minimums)
+        elapsed = time.perf_counter() - start
+
+        balanced = sum(row[zone] for row, zone in zip(rows, assignment))
+        print(f"{zone_count:>9} {natural:>14.1f} {balanced:>15.1f} {elapsed:>7.3f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai du calcul des distances familles x ilotiers
+
+Compare la boucle historique (deux appels Haversine par famille), le calcul
+matriciel en Python pur et le calcul vectorisé NumPy.
+
+Usage : python benchmarks/bench_distances.py [tailles...]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carte_ilotier.distances import NUMPY_AVAILABLE, distance_matrix, haversine
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+ILOTIERS = [(35.6938, 139.7034), (35.6581, 139.7414)]
+
+
+def legacy_loop(lats, lngs):
+    rows = []
+    for lat, lng in zip(lats, lngs):
+        rows.append([haversine(lat, lng, ilat, ilng) for ilat, ilng in ILOTIERS])
+    return rows
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main(argv):
+    sizes = [int(size) for size in argv] or DEFAULT_SIZES
+    random.seed(42)
+    target_lats = [lat for lat, lng in ILOTIERS]
+    target_lngs = [lng for lat, lng in ILOTIERS]
+
+    print(f"{'familles':>10} {'boucle':>10} {'python':>10} {'numpy':>10} {'gain':>8} {'écart max':>12}")
+    for size in sizes:
+        lats = [35.5 + random.random() * 0.4 for _ in range(size)]
+        lngs = [139.5 + random.random() * 0.4 for _ in range(size)]
+
+        loop_time, expected = timed(legacy_loop, lats, lngs)
+        python_time, _ = timed(distance_matrix, lats, lngs, target_lats, target_lngs, use_numpy=False)
+        if NUMPY_AVAILABLE:
+            numpy_time, matrix = timed(distance_matrix, lats, lngs, target_lats, target_lngs, use_numpy=True)
+            error = max(abs(a - b) for row, ref in zip(matrix.tolist(), expected) for a, b in zip(row, ref))
+            print(f"{size:>10} {loop_time:>9.3f}s {python_time:>9.3f}s {numpy_time:>9.3f}s "
+                  f"{loop_time / numpy_time:>7.1f}x {error:>12.2e}")
+        else:
+            print(f"{size:>10} {loop_time:>9.3f}s {python_time:>9.3f}s {'-':>10} "
+                  f"{loop_time / python_time:>7.1f}x {'-':>12}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai de la mémoire occupée par les familles chargées
+
+Compare l'ancien enregistrement (dict par famille contenant la ligne source
+dans 'raw_data', puis les clés dist_ilotierN/zone/... ajoutées par
+l'équilibrage) avec la classe Family à __slots__.
+
+Usage : python benchmarks/bench_memory.py [tailles...]
+"""
+
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carte_ilotier.pipeline import ZonePipeline
+from registry import registry_rows
+
+DEFAULT_SIZES = [100000, 300000]
+ZONES = 3
+
+
+def legacy_families(count):
+    """Ancien format : un dict par famille, ligne source comprise"""
+    families = {}
+    for row in registry_rows(count):
+        code = row['Famille']
+        if code not in families or row['Personne lien (O/N)'] == 'O':
+            families[code] = {
+                'family_code': code,
+                'address': ', '.join([row['Adresse postale'], row['Code postal de résidence'],
+                                      row['Ville de residence']]),
+                'contact_name': f"{row['Prénoms']} {row['Nom de famille']}",
+                'mobile': row['Mobile perso'],
+                'phone': row['Téléphone perso'],
+                'email': row['Adresse électronique 2 (Usage communication consulaire et vote électronique)'],
+                'raw_data': row
+            }
+    for family in families.values():
+        family['lat'], family['lng'] = random.random(), random.random()
+        for zone in range(1, ZONES + 1):
+            family[f'dist_ilotier{zone}'] = random.random()
+        family['natural_zone'] = family['zone'] = 1
+        family['ilotier'] = 'Ilotier 1'
+        family['distance'] = random.random()
+    return list(families.values())
+
+
+def compact_families(count):
+    """Format actuel : Family à __slots__, ligne source référencée par son index"""
+    pipeline = ZonePipeline(log=lambda message: None)
+    families = {}
+    for row_index, row in enumerate(registry_rows(count)):
+        pipeline.process_family_row(row, families, row_index)
+    for family in families.values():
+        family.lat, family.lng = random.random(), random.random()
+        family.distances = [random.random() for _ in range(ZONES)]
+        family.natural_zone = family.zone = 1
+        family.ilotier = 'Ilotier 1'
+        family.distance = random.random()
+    return list(families.values())
+
+
+def retained_bytes(build, count):
+    tracemalloc.start()
+    families = build(count)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del families
+    return current
+
+
+def main(argv):
+    sizes = [int(size) for size in argv] or DEFAULT_SIZES
+
+    print(f"{'lignes':>9} {'dict + raw_data':>16} {'Family':>10} {'réduction':>10}")
+    for size in sizes:
+        legacy = retained_bytes(legacy_families, size)
+        compact = retained_bytes(compact_families, size)
+        print(f"{size:>9} {legacy / 2**20:>13.1f} Mo {compact / 2**20:>7.1f} Mo "
+              f"{(1 - compact / legacy) * 100:>9.0f}%")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
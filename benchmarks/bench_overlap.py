@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai du recouvrement lecture / géocodage
+
+Compare la durée totale d'un traitement complet lorsque le géocodage attend
+la fin de la lecture du fichier (séquentiel) et lorsqu'il commence pendant
+la lecture (recouvrement). Le géocodeur simulé attend `--latency` secondes
+par adresse, comme un service distant.
+
+Usage : python benchmarks/bench_overlap.py [--rows 20000] [--formats csv xlsx] [--latency 0.004]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carte_ilotier.geocoders import Geocoder
+from carte_ilotier.pipeline import ZonePipeline
+from registry import write_registry
+
+ILOTIERS = [('Ilotier 1', 'Ilotier 1'), ('Ilotier 2', 'Ilotier 2'), ('Ilotier 3', 'Ilotier 3')]
+# No rate limit: only the latency of the service is simulated
+SETTINGS = {'requests_per_second': 10**6, 'burst': 10**6, 'workers': 8}
+
+
+class RemoteGeocoder(Geocoder):
+    """Coordonnées déterministes dérivées de l'adresse, après une attente simulant le réseau"""
+
+    name = 'remote'
+    rate_limited = True
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def geocode(self, address):
+        time.sleep(self.latency)
+        digest = hashlib.md5(address.encode('utf-8')).digest()
+        return 35.5 + digest[0] / 640, 139.5 + digest[1] / 640
+
+
+def measure(input_file, output_dir, overlap, latency):
+    """Durée totale (s) et durées des étapes de lecture et de géocodage"""
+    pipeline = ZonePipeline(log=lambda message: None, geocoding_settings=SETTINGS, overlap=overlap)
+    start = time.perf_counter()
+    pipeline.run(input_file, ILOTIERS, RemoteGeocoder(latency), output_dir=output_dir)
+    total = time.perf_counter() - start
+    stages = {stage['name']: stage for stage in pipeline.metrics.stages}
+    if overlap:
+        return total, stages['load_geocode']['load_seconds'], stages['load_geocode']['seconds']
+    return total, stages['load']['seconds'], stages['load']['seconds'] + stages['geocode_families']['seconds']
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Recouvrement de la lecture et du géocodage")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--formats', nargs='+', choices=['csv', 'xlsx'], default=['csv', 'xlsx'])
+    parser.add_argument('--latency', type=float, default=0.004, help="Attente par adresse (secondes)")
+    args = parser.parse_args(argv)
+
+    print(f"{'format':>6} {'mode':>12} {'lecture':>9} {'lecture+géocodage':>18} {'total':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for file_format in args.formats:
+            input_file = os.path.join(tmp, f"registre_{args.rows}.{file_format}")
+            write_registry(input_file, args.rows)
+            for overlap in (False, True):
+                total, load, load_geocode = measure(input_file, tmp, overlap, args.latency)
+                mode = 'recouvrement' if overlap else 'séquentiel'
+                print(f"{file_format:>6} {mode:>12} {load:>8.3f}s {load_geocode:>17.3f}s {total:>7.3f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
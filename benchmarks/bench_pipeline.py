@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai de la chaîne de traitement complète
+
+Génère des registres fictifs (benchmarks/registry.py) en CSV et Excel,
+puis mesure chaque étape de ZonePipeline avec un géocodeur simulé (sans
+réseau) : durée et pic de mémoire (tracemalloc, lors d'un second passage
+pour ne pas fausser les durées). Les résultats sont écrits en JSON pour
+comparer les versions entre elles.
+
+Usage :
+    python benchmarks/bench_pipeline.py [--sizes 1000 10000 100000 1000000]
+        [--formats csv xlsx] [--output resultats.json] [--compare ancien.json]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carte_ilotier.distances import NUMPY_AVAILABLE
+from carte_ilotier.geocoders import Geocoder
+from carte_ilotier.pipeline import ZonePipeline
+from registry import write_registry
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_FORMATS = ['csv', 'xlsx']
+ILOTIERS = {
+    'Ilotier 1': {'address': 'Ilotier 1', 'zone': 1, 'lat': 35.6938, 'lng': 139.7034},
+    'Ilotier 2': {'address': 'Ilotier 2', 'zone': 2, 'lat': 35.6581, 'lng': 139.7414},
+    'Ilotier 3': {'address': 'Ilotier 3', 'zone': 3, 'lat': 35.6762, 'lng': 139.6503},
+}
+STAGES = ['load', 'geocode', 'balance', 'save_json', 'save_csv', 'save_kml']
+
+
+class SyntheticGeocoder(Geocoder):
+    """Coordonnées déterministes dérivées de l'adresse, autour de Tokyo"""
+
+    name = 'synthetic'
+
+    def geocode(self, address):
+        digest = hashlib.md5(address.encode('utf-8')).digest()
+        return 35.5 + digest[0] / 640, 139.5 + digest[1] / 640
+
+
+def run_stages(input_file, output_dir):
+    """Étapes à exécuter dans l'ordre : liste de couples (étape, fonction) et état partagé"""
+    pipeline = ZonePipeline(log=lambda message: None)
+    ilotiers = {name: dict(info) for name, info in ILOTIERS.items()}
+    state = {}
+
+    def load():
+        state['families'] = pipeline.load_families_from_csv(input_file)
+
+    return [
+        ('load', load),
+        ('geocode', lambda: pipeline.geocode_families(state['families'], SyntheticGeocoder())),
+        ('balance', lambda: pipeline.apply_balance_algorithm(state['families'], ilotiers)),
+        ('save_json', lambda: pipeline.save_json(state['families'], ilotiers,
+                                                 os.path.join(output_dir, 'zones.json'))),
+        ('save_csv', lambda: pipeline.save_updated_csv(state['families'], input_file,
+                                                       os.path.join(output_dir, 'familles_zones.csv'))),
+        ('save_kml', lambda: pipeline.save_kml(state['families'], ilotiers,
+                                               os.path.join(output_dir, 'zones.kml'))),
+    ], state
+
+
+def measure(input_file, output_dir, memory=True):
+    """Durée (s) et pic de mémoire (Mo) de chaque étape"""
+    results = {}
+    stages, state = run_stages(input_file, output_dir)
+    for stage, function in stages:
+        start = time.perf_counter()
+        function()
+        results[stage] = {'seconds': round(time.perf_counter() - start, 4)}
+    results['families'] = len(state['families'])
+
+    if memory:
+        stages, state = run_stages(input_file, output_dir)
+        tracemalloc.start()
+        for stage, function in stages:
+            tracemalloc.reset_peak()
+            function()
+            results[stage]['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, previous_file):
+    """Afficher le rapport des durées par rapport à un fichier de résultats précédent"""
+    with open(previous_file, 'r', encoding='utf-8') as f:
+        previous = {(run['format'], run['rows']): run for run in json.load(f)['runs']}
+    print(f"\nComparaison avec {previous_file} (durée actuelle / précédente) :")
+    for run in results['runs']:
+        old = previous.get((run['format'], run['rows']))
+        if not old:
+            continue
+        ratios = [f"{stage}={run['stages'][stage]['seconds'] / old['stages'][stage]['seconds']:.2f}x"
+                  for stage in STAGES
+                  if stage in old['stages'] and old['stages'][stage]['seconds'] > 0]
+        print(f"  {run['format']:>4} {run['rows']:>8} : {' '.join(ratios)}")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Banc d'essai de la chaîne de traitement")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--formats', nargs='+', choices=DEFAULT_FORMATS, default=DEFAULT_FORMATS)
+    parser.add_argument('--output', default='bench_pipeline.json', help="Fichier de résultats JSON")
+    parser.add_argument('--compare', metavar='FICHIER', help="Résultats précédents à comparer")
+    parser.add_argument('--no-memory', action='store_true', help="Ne pas mesurer la mémoire")
+    parser.add_argument('--data-dir', help="Dossier des registres générés (réutilisés s'ils existent)")
+    args = parser.parse_args(argv)
+
+    results = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': NUMPY_AVAILABLE,
+        'runs': []
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"{'format':>6} {'lignes':>8} {'familles':>8} " + " ".join(f"{stage:>9}" for stage in STAGES))
+        for file_format in args.formats:
+            for size in args.sizes:
+                input_file = os.path.join(data_dir, f"registre_{size}.{file_format}")
+                if not os.path.exists(input_file):
+                    write_registry(input_file, size)
+                output_dir = os.path.join(tmp, f"sortie_{file_format}_{size}")
+                os.makedirs(output_dir, exist_ok=True)
+
+                stages = measure(input_file, output_dir, memory=not args.no_memory)
+                families = stages.pop('families')
+                results['runs'].append({'format': file_format, 'rows': size, 'families': families,
+                                        'stages': stages})
+                print(f"{file_format:>6} {size:>8} {families:>8} " +
+                      " ".join(f"{stages[stage]['seconds']:>8.3f}s" for stage in STAGES))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\nRésultats écrits dans {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
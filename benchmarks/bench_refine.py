@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai de l'affinage local de la répartition
+
+Compare, après l'affectation équilibrée optimale, la distance totale et le
+trajet le plus long avant et après affinage.
+
+Usage : python benchmarks/bench_refine.py [familles] [ilotiers...]
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carte_ilotier.assignment import balanced_assignment, zone_capacities, zone_minimums
+from carte_ilotier.distances import distance_matrix
+from carte_ilotier.refine import refine_assignment
+
+
+def main(argv):
+    families = int(argv[0]) if argv else 50000
+    zone_counts = [int(value) for value in argv[1:]] or [2, 3, 6, 12]
+    random.seed(42)
+    # Denser neighbourhoods around a few centres, as in a real registry
+    centres = [(35.5 + random.random() * 0.4, 139.5 + random.random() * 0.4) for _ in range(8)]
+    lats, lngs = [], []
+    for _ in range(families):
+        lat, lng = random.choice(centres)
+        lats.append(lat + random.gauss(0, 0.04))
+        lngs.append(lng + random.gauss(0, 0.04))
+
+    print(f"{families} familles")
+    print(f"{'ilotiers':>9} {'total (km)':>22} {'plus long (km)':>16} {'échanges':>9} {'temps':>8}")
+    for zone_count in zone_counts:
+        ilotier_lats = [35.5 + random.random() * 0.4 for _ in range(zone_count)]
+        ilotier_lngs = [139.5 + random.random() * 0.4 for _ in range(zone_count)]
+        matrix = distance_matrix(lats, lngs, ilotier_lats, ilotier_lngs)
+        rows = matrix if isinstance(matrix, list) else matrix.tolist()
+        capacities = zone_capacities(families, [1] * zone_count)
+        minimums = zone_minimums(families, [1] * zone_count)
+        assignment = balanced_assignment(matrix, capacities, minimums=minimums)
+
+        result = refine_assignment(rows, assignment, capacities, minimums=minimums)
+        print(f"{zone_count:>9} {result['total_before']:>10.1f} -> {result['total_after']:>8.1f} "
+              f"{result['max_before']:>6.2f} -> {result['max_after']:>5.2f} "
+              f"{result['swaps'] + result['moves']:>9} {result['seconds']:>7.3f}s")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Banc d'essai du démarrage de l'application
+
+Mesure le temps jusqu'à l'affichage de la première fenêtre pour chaque
+variante : source (python ilotier_zone_mapper.py), onefile et onedir
+(construites par build_app.py, ignorées si absentes). L'application note
+l'heure d'affichage dans le fichier donné par ILOTIER_STARTUP_PROBE puis se
+ferme. La variante imports mesure le seul chargement du module principal
+(sans écran) et indique si des dépendances lourdes ont été chargées.
+
+Usage : python benchmarks/bench_startup.py [--runs 5] [--variants source onefile onedir imports]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from build_app import executable_path
+from ilotier_zone_mapper import STARTUP_PROBE_ENV
+
+VARIANTS = ('source', 'onefile', 'onedir', 'imports')
+HEAVY_MODULES = ('numpy', 'openpyxl', 'googlemaps', 'carte_ilotier.pipeline')
+TIMEOUT = 60  # Secondes
+
+
+def command(variant):
+    """Commande de lancement d'une variante, None si elle n'est pas construite"""
+    if variant == 'source':
+        return [sys.executable, os.path.join(ROOT, 'ilotier_zone_mapper.py')]
+    if variant == 'imports':
+        check = ', '.join(repr(name) for name in HEAVY_MODULES)
+        return [sys.executable, '-c',
+                f"import sys, ilotier_zone_mapper; "
+                f"print(','.join(m for m in ({check},) if m in sys.modules))"]
+    path = os.path.join(ROOT, executable_path(variant))
+    return [path] if os.path.exists(path) else None
+
+
+def time_to_window(cmd):
+    """Durée entre le lancement et l'affichage de la première fenêtre (secondes)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        probe = os.path.join(tmp, 'probe')
+        env = dict(os.environ, **{STARTUP_PROBE_ENV: probe})
+        start = time.time()
+        result = subprocess.run(cmd, env=env, cwd=ROOT, capture_output=True, text=True, timeout=TIMEOUT)
+        if not os.path.exists(probe):
+            raise Exception(result.stderr.strip().splitlines()[-1] if result.stderr.strip()
+                            else f"aucune fenêtre (code {result.returncode})")
+        with open(probe) as f:
+            return float(f.read()) - start
+
+
+def time_imports(cmd):
+    """Durée de chargement du module principal et modules lourds chargés"""
+    start = time.perf_counter()
+    result = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, timeout=TIMEOUT)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise Exception(result.stderr.strip().splitlines()[-1])
+    return elapsed, result.stdout.strip()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Temps de démarrage de l'application")
+    parser.add_argument('--runs', type=int, default=5, help="Lancements par variante")
+    parser.add_argument('--variants', nargs='+', choices=VARIANTS, default=list(VARIANTS))
+    args = parser.parse_args(argv)
+
+    print(f"{'variante':>9} {'médiane':>9} {'min':>8} {'max':>8}  remarque")
+    for variant in args.variants:
+        cmd = command(variant)
+        if cmd is None:
+            print(f"{variant:>9} {'-':>9} {'-':>8} {'-':>8}  non construite (python build_app.py"
+                  f"{' --onedir' if variant == 'onedir' else ''})")
+            continue
+        times = []
+        note = ''
+        try:
+            for _ in range(args.runs):
+                if variant == 'imports':
+                    elapsed, loaded = time_imports(cmd)
+                    note = f"chargés : {loaded}" if loaded else "aucun module lourd chargé"
+                else:
+                    elapsed = time_to_window(cmd)
+                times.append(elapsed)
+        except Exception as e:
+            print(f"{variant:>9} {'-':>9} {'-':>8} {'-':>8}  échec : {e}")
+            continue
+        print(f"{variant:>9} {statistics.median(times):>8.3f}s {min(times):>7.3f}s "
+              f"{max(times):>7.3f}s  {note}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
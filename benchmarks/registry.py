@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Générateur de registres consulaires fictifs pour les bancs d'essai
+
+Les fichiers ont les colonnes de l'export du registre lues par le chargeur
+(Famille, Adresse postale, Personne lien (O/N)...) : familles de 1 à 5
+personnes dont une personne de contact, adresses partagées par quelques
+familles, quelques valeurs manquantes.
+
+Usage : python benchmarks/registry.py LIGNES FICHIER.csv|FICHIER.xlsx
+"""
+
+import csv
+import os
+import random
+import sys
+
+COLUMNS = ['Famille', 'Nom de famille', 'Prénoms', 'Sexe', 'Date de naissance', 'Lieu de naissance',
+           'Nationalité', 'Adresse postale', 'Code postal de résidence', 'Ville de residence',
+           'Pays de résidence', 'Personne lien (O/N)', 'Mobile perso', 'Téléphone perso',
+           'Adresse électronique 1',
+           'Adresse électronique 2 (Usage communication consulaire et vote électronique)',
+           "Date d'inscription", 'Date de fin de validité', 'Situation familiale', 'Profession']
+
+STREETS = ['rue de Rivoli', 'avenue Foch', 'boulevard Haussmann', 'rue de la Paix', 'quai de Seine',
+           'Omotesando', 'Aoyama-dori', 'Meiji-dori', 'Yasukuni-dori', 'Sotobori-dori']
+CITIES = [('75001', 'Paris'), ('75016', 'Paris'), ('69001', 'Lyon'), ('150-0001', 'Shibuya-ku'),
+          ('106-0032', 'Minato-ku'), ('160-0022', 'Shinjuku-ku')]
+FIRST_NAMES = ['Camille', 'Louis', 'Emma', 'Jules', 'Léa', 'Hugo', 'Chloé', 'Arthur', 'Inès', 'Noé']
+LAST_NAMES = ['Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand']
+
+
+def registry_rows(count, seed=42):
+    """Produire `count` lignes du registre (dict colonne -> texte)"""
+    rng = random.Random(seed)
+    family = 1000000
+    remaining = 0
+    address = None
+    for index in range(count):
+        if remaining == 0:
+            family += 1
+            remaining = rng.choice([1, 1, 2, 2, 3, 4, 5])
+            contact = rng.randrange(remaining)
+            # About one address in ten is shared by several families
+            if address is None or rng.random() > 0.1:
+                postal_code, city = rng.choice(CITIES)
+                address = (f"{rng.randint(1, 300)} {rng.choice(STREETS)}", postal_code, city)
+            last_name = rng.choice(LAST_NAMES)
+        remaining -= 1
+
+        street, postal_code, city = address
+        yield {
+            'Famille': str(family),
+            'Nom de famille': last_name,
+            'Prénoms': rng.choice(FIRST_NAMES),
+            'Sexe': rng.choice('MF'),
+            'Date de naissance': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1940, 2020)}",
+            'Lieu de naissance': rng.choice(CITIES)[1],
+            'Nationalité': 'Française',
+            'Adresse postale': street if rng.random() > 0.01 else '',
+            'Code postal de résidence': postal_code,
+            'Ville de residence': city,
+            'Pays de résidence': 'Japon' if '-' in postal_code else 'France',
+            'Personne lien (O/N)': 'O' if remaining == contact else 'N',
+            'Mobile perso': f"06{rng.randint(0, 99999999):08d}" if rng.random() > 0.3 else '',
+            'Téléphone perso': '',
+            'Adresse électronique 1': f"contact{index}@example.org",
+            'Adresse électronique 2 (Usage communication consulaire et vote électronique)': f"vote{index}@example.org",
+            "Date d'inscription": f"01/{rng.randint(1, 12):02d}/{rng.randint(2000, 2024)}",
+            'Date de fin de validité': f"01/{rng.randint(1, 12):02d}/{rng.randint(2025, 2030)}",
+            'Situation familiale': rng.choice(['Célibataire', 'Marié(e)', 'Pacsé(e)']),
+            'Profession': rng.choice(['Ingénieur', 'Enseignant', 'Étudiant', 'Retraité', '']),
+        }
+
+
+def write_csv(filename, count, seed=42):
+    with open(filename, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(registry_rows(count, seed))
+
+
+def write_xlsx(filename, count, seed=42):
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(COLUMNS)
+    for row in registry_rows(count, seed):
+        ws.append([row[column] for column in COLUMNS])
+    wb.save(filename)
+
+
+def write_registry(filename, count, seed=42):
+    """Écrire un registre CSV ou Excel selon l'extension du fichier"""
+    if os.path.splitext(filename)[1].lower() == '.xlsx':
+        write_xlsx(filename, count, seed)
+    else:
+        write_csv(filename, count, seed)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(__doc__.strip().splitlines()[-1])
+    write_registry(sys.argv[2], int(sys.argv[1]))
@@ -2,13 +2,40 @@
 """
 Script de construction de l'application standalone
 Pour Mac, Windows et Linux
+
+Deux modes de construction :
+- onefile (défaut) : un seul exécutable, décompressé à chaque lancement
+- onedir (--onedir) : un dossier, démarrage plus rapide
+
+Mesure du temps de démarrage : python benchmarks/bench_startup.py
 """
 
+import argparse
 import os
 import sys
 import subprocess
 import platform
 
+APP_NAME = "CarteIlotier"
+ONEDIR_DIST = os.path.join('dist', 'onedir')
+
+# Modules pulled in by dependencies but never used by the application: smaller, faster to start
+EXCLUDED_MODULES = [
+    'matplotlib',
+    'scipy',
+    'pandas',
+    'PIL',
+    'IPython',
+    'pytest',
+    'doctest',
+    'pydoc',
+    'lib2to3',
+    'xmlrpc',
+    'tkinter.test',
+    'numpy.f2py',
+    'numpy.distutils',
+]
+
 def install_requirements():
     """Installer les dépendances nécessaires"""
     print("Installation des dépendances...")
@@ -24,22 +51,38 @@ def install_requirements():
     
     print("Dépendances installées !\n")
 
-def build_app():
+def executable_path(mode='onefile', system=None):
+    """Chemin de l'exécutable construit dans le mode donné"""
+    system = system or platform.system()
+    dist = ONEDIR_DIST if mode == 'onedir' else 'dist'
+    if system == 'Darwin':
+        return os.path.join(dist, f"{APP_NAME}.app", 'Contents', 'MacOS', APP_NAME)
+    folder = os.path.join(dist, APP_NAME) if mode == 'onedir' else dist
+    suffix = '.exe' if system == 'Windows' else ''
+    return os.path.join(folder, APP_NAME + suffix)
+
+def build_app(mode='onefile'):
     """Construire l'application avec PyInstaller"""
-    print("Construction de l'application...")
+    print(f"Construction de l'application ({mode})...")
     
     system = platform.system()
-    app_name = "CarteIlotier"
+    app_name = APP_NAME
     
     # PyInstaller command
     cmd = [
         'pyinstaller',
         '--name', app_name,
-        '--onefile',  # Un seul fichier exécutable
         '--windowed',  # Pas de console (GUI seulement)
         '--clean',  # Nettoyer avant de construire
         '--noconfirm',  # Écraser sans demander
     ]
+    if mode == 'onedir':
+        # Un dossier : rien à décompresser au lancement
+        cmd.extend(['--onedir', '--distpath', ONEDIR_DIST])
+    else:
+        cmd.append('--onefile')  # Un seul fichier exécutable
+    for module in EXCLUDED_MODULES:
+        cmd.extend(['--exclude-module', module])
     
     # Icône personnalisée si disponible
     icon_file = 'icon.icns' if system == 'Darwin' else 'icon.ico'
@@ -53,20 +96,28 @@ def build_app():
     result = subprocess.run(cmd)
     
     if result.returncode == 0:
+        dist = ONEDIR_DIST if mode == 'onedir' else 'dist'
         print(f"\n✅ Application construite avec succès !")
-        print(f"📁 L'application se trouve dans : dist/{app_name}")
+        print(f"📁 L'application se trouve dans : {dist}/{app_name}")
         
         if system == 'Darwin':
-            print(f"   Sur Mac : dist/{app_name}.app")
+            print(f"   Sur Mac : {dist}/{app_name}.app")
         elif system == 'Windows':
-            print(f"   Sur Windows : dist/{app_name}.exe")
+            print(f"   Sur Windows : {executable_path(mode, system)}")
         else:
-            print(f"   Sur Linux : dist/{app_name}")
+            print(f"   Sur Linux : {executable_path(mode, system)}")
+        if mode == 'onedir':
+            print("   Distribuez le dossier complet (zip), pas seulement l'exécutable")
     else:
         print("\n❌ Erreur lors de la construction")
         sys.exit(1)
 
 def main():
+    parser = argparse.ArgumentParser(description="Construire l'application standalone")
+    parser.add_argument('--onedir', action='store_true',
+                        help="Construire un dossier plutôt qu'un fichier unique (démarrage plus rapide)")
+    args = parser.parse_args()
+    
     print("="*60)
     print("CONSTRUCTEUR D'APPLICATION ILOTIER ZONE MAPPER")
     print("="*60)
@@ -84,7 +135,7 @@ def main():
         install_requirements()
     
     # Construire l'application
-    build_app()
+    build_app('onedir' if args.onedir else 'onefile')
     
     print("\n" + "="*60)
     print("INSTRUCTIONS POUR DISTRIBUER L'APPLICATION :")
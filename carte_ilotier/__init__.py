@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Composants de traitement du Répartiteur de Zones d'Urgence
+Utilisables sans interface graphique
+"""
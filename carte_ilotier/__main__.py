@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Permet l'appel : python -m carte_ilotier --input ... --ilotier NOM=ADRESSE ..."""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
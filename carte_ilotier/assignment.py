@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+"""
+Affectation équilibrée optimale des familles à K ilotiers
+
+Problème de transport : minimiser la distance totale sous contrainte de
+capacité par zone (un minimum et un maximum de familles). Comme K est petit, le graphe résiduel du flot peut être
+réduit à K zones (+ un nœud « place libre ») : l'arc j -> j' porte le
+surcoût minimal du passage d'une famille de j vers j'. L'affectation est
+optimale si et seulement si ce graphe n'a pas de cycle de coût négatif.
+
+1. Départ : chaque famille chez l'ilotier le plus proche, puis l'excédent
+   des zones trop pleines est déplacé vers les zones ayant de la place et
+   les zones sous leur minimum sont complétées.
+2. Annulation de cycles négatifs : chaque cycle trouvé (Bellman-Ford sur
+   K+1 nœuds) est appliqué en lot, autant de fois que le gain marginal reste
+   négatif, et plusieurs cycles disjoints sont traités par itération.
+
+Chaque itération coûte O(n.K) ; NumPy est utilisé s'il est installé. Avec
+de nombreux ilotiers, les coûts peuvent être limités à quelques zones
+candidates par famille (voir carte_ilotier.spatial) : l'optimum est alors
+celui du problème restreint à ces candidats.
+"""
+
+import math
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+BALANCE_TOLERANCE = 1  # Familles acceptées au-delà ou en deçà de la part exacte de chaque zone
+MAX_ITERATIONS = 10000
+EPSILON = 1e-9
+
+
+def zone_shares(total, weights, capacities=None):
+    """Part entière de `total` revenant à chaque zone
+
+    Les parts sont proportionnelles aux poids (méthode du plus fort reste).
+    Une zone dont la capacité explicite (None = pas de limite) est inférieure
+    à sa part est limitée à sa capacité, et le reste est réparti entre les
+    autres zones selon leurs poids.
+    """
+    if not weights or any(weight < 0 for weight in weights) or sum(weights) <= 0:
+        raise Exception("Poids des ilotiers invalides")
+    limits = [None if not capacities or capacities[j] is None else int(capacities[j])
+              for j in range(len(weights))]
+
+    shares = [0.0] * len(weights)
+    open_zones = [j for j, weight in enumerate(weights) if weight > 0]
+    remaining = total
+    while open_zones:
+        weight_sum = float(sum(weights[j] for j in open_zones))
+        capped = [j for j in open_zones
+                  if limits[j] is not None and remaining * weights[j] / weight_sum > limits[j]]
+        if not capped:
+            for j in open_zones:
+                shares[j] = remaining * weights[j] / weight_sum
+            break
+        # Capped zones take their capacity, the others share what is left
+        for j in capped:
+            shares[j] = limits[j]
+            remaining -= limits[j]
+        open_zones = [j for j in open_zones if j not in capped]
+
+    base = [int(math.floor(share + EPSILON)) for share in shares]
+    if sum(shares) < total - EPSILON:
+        raise Exception(f"Capacités insuffisantes : {sum(base)} places pour {total} familles")
+    by_remainder = sorted(range(len(weights)), key=lambda j: shares[j] - base[j], reverse=True)
+    for j in by_remainder[:total - sum(base)]:
+        base[j] += 1
+    return base
+
+
+def zone_capacities(total, weights, capacities=None, tolerance=BALANCE_TOLERANCE):
+    """Nombre maximal de familles par zone
+
+    Chaque zone reçoit sa part (voir zone_shares) plus `tolerance`, bornée
+    par sa capacité explicite si elle est fournie (None = pas de limite).
+    """
+    shares = zone_shares(total, weights, capacities)
+    result = [share + tolerance if weight > 0 else 0 for share, weight in zip(shares, weights)]
+    if capacities:
+        result = [count if capacity is None else min(count, int(capacity))
+                  for count, capacity in zip(result, capacities)]
+
+    if sum(result) < total:
+        raise Exception(f"Capacités insuffisantes : {sum(result)} places pour {total} familles")
+    return result
+
+
+def zone_minimums(total, weights, capacities=None, tolerance=BALANCE_TOLERANCE):
+    """Nombre minimal de familles par zone : sa part moins `tolerance`
+
+    Avec zone_capacities, chaque zone reste à `tolerance` près de sa part,
+    quel que soit le nombre de zones.
+    """
+    return [max(0, share - tolerance) for share in zone_shares(total, weights, capacities)]
+
+
+def balanced_assignment(costs, capacities, use_numpy=None, minimums=None):
+    """Affecter chaque ligne de `costs` à une zone sans dépasser `capacities`
+
+    `costs` est une matrice n x K (NumPy ou liste de listes), ou une liste
+    de dicts zone -> coût limitée aux zones candidates de chaque ligne.
+    Chaque zone reçoit au moins `minimums` lignes si fourni. Retourne la
+    liste des indices de zone (0 à K-1) minimisant le coût total, ou None
+    si les zones candidates ne permettent pas de respecter les capacités.
+    """
+    if use_numpy is None:
+        use_numpy = NUMPY_AVAILABLE
+    if sum(capacities) < len(costs):
+        raise Exception("Capacités insuffisantes pour toutes les familles")
+    minimums = minimums or [0] * len(capacities)
+    if sum(minimums) > len(costs):
+        raise Exception("Minimums par zone supérieurs au nombre de familles")
+    if len(costs) == 0:
+        return []
+
+    candidates = isinstance(costs, list) and isinstance(costs[0], dict)
+    if use_numpy and candidates:
+        ops = _SparseNumpyOps(costs, len(capacities))
+    elif use_numpy:
+        ops = _NumpyOps(np.asarray(costs, dtype=np.float64))
+    elif candidates:
+        ops = _CandidateOps(costs, len(capacities))
+    else:
+        ops = _PythonOps(costs if isinstance(costs, list) else costs.tolist())
+
+    assign = ops.nearest()
+    if not _make_feasible(ops, assign, capacities, minimums):
+        return None
+    _cancel_negative_cycles(ops, assign, capacities, minimums)
+    return ops.to_list(assign)
+
+
+class _NumpyOps:
+    """Opérations vectorisées sur la matrice des coûts"""
+
+    def __init__(self, costs):
+        self.costs = costs
+        self.zone_count = costs.shape[1]
+
+    def nearest(self):
+        return self.costs.argmin(axis=1)
+
+    def to_list(self, assign):
+        return assign.tolist()
+
+    def members(self, assign):
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(self.zone_count + 1))
+        return [order[bounds[j]:bounds[j + 1]] for j in range(self.zone_count)]
+
+    def best_moves(self, members):
+        """Pour chaque couple (j, j') : surcoût minimal d'un passage de j vers j'"""
+        moves = {}
+        for j, rows in enumerate(members):
+            if not len(rows):
+                continue
+            deltas = self.costs[rows] - self.costs[rows, j][:, None]
+            best = deltas.min(axis=0)
+            for k in range(self.zone_count):
+                # No move towards zones that are not candidates of any family of j
+                if k != j and np.isfinite(best[k]):
+                    moves[(j, k)] = float(best[k])
+        return moves
+
+    def sorted_moves(self, rows, j, k):
+        """Familles de j triées par surcoût croissant d'un passage en k, et surcoûts"""
+        deltas = self.costs[rows, k] - self.costs[rows, j]
+        order = np.argsort(deltas, kind='stable')
+        return rows[order], deltas[order]
+
+    def overflow_moves(self, rows, j, targets):
+        """Couples (famille, zone cible) triés par surcoût croissant, hors coûts infinis"""
+        deltas = self.costs[np.ix_(rows, targets)] - self.costs[rows, j][:, None]
+        flat_deltas = deltas.ravel()
+        for flat in np.argsort(flat_deltas, kind='stable').tolist():
+            if not np.isfinite(flat_deltas[flat]):
+                return
+            row, target = divmod(flat, len(targets))
+            yield int(rows[row]), targets[target]
+
+    def move(self, assign, rows, zone):
+        assign[rows] = zone
+
+
+class _SparseNumpyOps(_NumpyOps):
+    """Coûts limités aux zones candidates, en tableaux n x k : zones et coûts
+
+    Les lignes ayant moins de candidats sont complétées par leur première
+    zone à coût infini, sans effet sur les minimums.
+    """
+
+    def __init__(self, rows, zone_count):
+        width = max(len(row) for row in rows)
+        self.zones = np.empty((len(rows), width), dtype=np.intp)
+        self.costs = np.full((len(rows), width), np.inf)
+        for index, row in enumerate(rows):
+            self.zones[index] = next(iter(row))
+            self.zones[index, :len(row)] = list(row)
+            self.costs[index, :len(row)] = list(row.values())
+        self.zone_count = zone_count
+
+    def cost_at(self, rows, zone):
+        """Coût de chaque ligne de `rows` dans `zone`, infini hors candidats"""
+        return np.where(self.zones[rows] == zone, self.costs[rows], np.inf).min(axis=1)
+
+    def nearest(self):
+        return self.zones[np.arange(len(self.zones)), self.costs.argmin(axis=1)]
+
+    def best_moves(self, members):
+        # All zones at once: one minimum per (zone, candidate zone) pair
+        assign = np.empty(len(self.zones), dtype=np.intp)
+        for j, rows in enumerate(members):
+            assign[rows] = j
+        own = np.where(self.zones == assign[:, None], self.costs, np.inf).min(axis=1)
+        best = np.full(self.zone_count * self.zone_count, np.inf)
+        np.minimum.at(best, (assign[:, None] * self.zone_count + self.zones).ravel(),
+                      (self.costs - own[:, None]).ravel())
+        moves = {}
+        for pair in np.flatnonzero(np.isfinite(best)).tolist():
+            j, k = divmod(pair, self.zone_count)
+            # No move towards zones that are not candidates of any family of j
+            if k != j:
+                moves[(j, k)] = float(best[pair])
+        return moves
+
+    def sorted_moves(self, rows, j, k):
+        deltas = self.cost_at(rows, k) - self.cost_at(rows, j)
+        keep = np.isfinite(deltas)
+        rows, deltas = rows[keep], deltas[keep]
+        order = np.argsort(deltas, kind='stable')
+        return rows[order], deltas[order]
+
+    def overflow_moves(self, rows, j, targets):
+        zones = self.zones[rows]
+        deltas = self.costs[rows] - self.cost_at(rows, j)[:, None]
+        found, column = np.nonzero(np.isin(zones, targets) & np.isfinite(deltas))
+        for pick in np.argsort(deltas[found, column], kind='stable').tolist():
+            yield int(rows[found[pick]]), int(zones[found[pick], column[pick]])
+
+
+class _PythonOps:
+    """Mêmes opérations en Python pur"""
+
+    def __init__(self, costs):
+        self.costs = costs
+        self.zone_count = len(costs[0])
+
+    def nearest(self):
+        zones = range(self.zone_count)
+        return [min(zones, key=row.__getitem__) for row in self.costs]
+
+    def to_list(self, assign):
+        return list(assign)
+
+    def members(self, assign):
+        groups = [[] for _ in range(self.zone_count)]
+        for index, zone in enumerate(assign):
+            groups[zone].append(index)
+        return groups
+
+    def best_moves(self, members):
+        moves = {}
+        for j, rows in enumerate(members):
+            if not rows:
+                continue
+            best = [math.inf] * self.zone_count
+            for index in rows:
+                row = self.costs[index]
+                own = row[j]
+                for k, cost in enumerate(row):
+                    if cost - own < best[k]:
+                        best[k] = cost - own
+            for k in range(self.zone_count):
+                if k != j:
+                    moves[(j, k)] = best[k]
+        return moves
+
+    def sorted_moves(self, rows, j, k):
+        pairs = sorted((self.costs[index][k] - self.costs[index][j], index) for index in rows)
+        return [index for delta, index in pairs], [delta for delta, index in pairs]
+
+    def overflow_moves(self, rows, j, targets):
+        candidates = sorted((self.costs[index][k] - self.costs[index][j], index, k)
+                            for index in rows for k in targets)
+        for delta, index, k in candidates:
+            yield index, k
+
+    def move(self, assign, rows, zone):
+        for index in rows:
+            assign[index] = zone
+
+
+class _CandidateOps(_PythonOps):
+    """Coûts limités aux zones candidates : un dict zone -> coût par ligne"""
+
+    def __init__(self, costs, zone_count):
+        self.costs = costs
+        self.zone_count = zone_count
+
+    def nearest(self):
+        return [min(row, key=row.__getitem__) for row in self.costs]
+
+    def best_moves(self, members):
+        moves = {}
+        for j, rows in enumerate(members):
+            best = [math.inf] * self.zone_count
+            for index in rows:
+                row = self.costs[index]
+                own = row[j]
+                for k, cost in row.items():
+                    if cost - own < best[k]:
+                        best[k] = cost - own
+            for k, delta in enumerate(best):
+                # No move towards zones that are not candidates of any family of j
+                if k != j and delta < math.inf:
+                    moves[(j, k)] = delta
+        return moves
+
+    def sorted_moves(self, rows, j, k):
+        pairs = sorted((self.costs[index][k] - self.costs[index][j], index)
+                       for index in rows if k in self.costs[index])
+        return [index for delta, index in pairs], [delta for delta, index in pairs]
+
+    def overflow_moves(self, rows, j, targets):
+        candidates = sorted((self.costs[index][k] - self.costs[index][j], index, k)
+                            for index in rows for k in targets if k in self.costs[index])
+        for delta, index, k in candidates:
+            yield index, k
+
+
+def _make_feasible(ops, assign, capacities, minimums):
+    """Déplacer l'excédent des zones trop pleines vers les zones ayant de la place
+
+    L'excédent va d'abord directement vers une zone libre ; le reste passe
+    par une chaîne de zones (une famille de j vers j', une de j' vers j''...).
+    Les zones sous leur minimum sont ensuite complétées de la même façon,
+    depuis les zones au-dessus du leur. Retourne False si l'excédent ne
+    peut pas être placé (zones candidates insuffisantes).
+    """
+    members = ops.members(assign)
+    counts = [len(rows) for rows in members]
+    for j in range(ops.zone_count):
+        excess = counts[j] - capacities[j]
+        if excess <= 0:
+            continue
+        targets = [k for k in range(ops.zone_count) if counts[k] < capacities[k]]
+        moved = set()
+        for index, k in ops.overflow_moves(members[j], j, targets):
+            if excess == 0:
+                break
+            if index in moved or counts[k] >= capacities[k]:
+                continue
+            ops.move(assign, [index], k)
+            moved.add(index)
+            counts[k] += 1
+            counts[j] -= 1
+            excess -= 1
+
+    while True:
+        members = ops.members(assign)
+        counts = [len(rows) for rows in members]
+        full = [j for j in range(ops.zone_count) if counts[j] > capacities[j]]
+        short = [j for j in range(ops.zone_count) if counts[j] < minimums[j]]
+        if full:
+            targets = {k for k in range(ops.zone_count) if counts[k] < capacities[k]}
+            path = _zone_path(ops.best_moves(members), [full[0]], targets)
+        elif short:
+            donors = [j for j in range(ops.zone_count) if counts[j] > minimums[j]]
+            path = _zone_path(ops.best_moves(members), donors, {short[0]})
+        else:
+            return True
+        if path is None:
+            return False
+
+        if full:
+            limit = min(counts[path[0]] - capacities[path[0]], capacities[path[-1]] - counts[path[-1]])
+        else:
+            limit = min(counts[path[0]] - minimums[path[0]], minimums[path[-1]] - counts[path[-1]])
+        transfers = []
+        for j, k in zip(path, path[1:]):
+            rows, deltas = ops.sorted_moves(members[j], j, k)
+            transfers.append((k, rows))
+            limit = min(limit, sum(1 for delta in deltas if delta < math.inf))
+        for k, rows in transfers:
+            ops.move(assign, rows[:limit], k)
+
+
+def _zone_path(moves, starts, targets):
+    """Plus courte chaîne de déplacements possibles d'une zone de `starts` vers une zone de `targets`"""
+    previous = {start: None for start in starts}
+    queue = list(starts)
+    for j in queue:
+        if j in targets:
+            path = [j]
+            while previous[path[-1]] is not None:
+                path.append(previous[path[-1]])
+            return path[::-1]
+        for (a, k) in moves:
+            if a == j and k not in previous:
+                previous[k] = j
+                queue.append(k)
+    return None
+
+
+def _cancel_negative_cycles(ops, assign, capacities, minimums):
+    """Appliquer des cycles de déplacements améliorants jusqu'à l'optimum"""
+    zone_count = ops.zone_count
+    free_node = zone_count
+    for _ in range(MAX_ITERATIONS):
+        members = ops.members(assign)
+        counts = [len(rows) for rows in members]
+        moves = ops.best_moves(members)
+
+        # Residual graph: zone moves, plus a virtual node linking zones with
+        # spare capacity (may gain a family) to zones above their minimum (may lose one)
+        edges = [(j, k, delta) for (j, k), delta in moves.items()]
+        edges += [(k, free_node, 0.0) for k in range(zone_count) if counts[k] < capacities[k]]
+        edges += [(free_node, j, 0.0) for j in range(zone_count) if counts[j] > minimums[j]]
+
+        cycle = _find_negative_cycle(zone_count + 1, edges)
+        if cycle is None:
+            return
+        while cycle is not None:
+            _apply_cycle(ops, assign, members, counts, capacities, minimums, cycle)
+            # Moves of the zones left untouched are still valid
+            used = set(cycle)
+            edges = [edge for edge in edges if edge[0] not in used and edge[1] not in used]
+            cycle = _find_negative_cycle(zone_count + 1, edges)
+
+
+def _apply_cycle(ops, assign, members, counts, capacities, minimums, cycle):
+    """Appliquer un cycle en lot tant que le gain marginal reste négatif"""
+    free_node = ops.zone_count
+    limit = len(assign)
+    transfers = []
+    for j, k in zip(cycle, cycle[1:] + cycle[:1]):
+        if k == free_node:
+            limit = min(limit, capacities[j] - counts[j])
+        elif j == free_node:
+            limit = min(limit, counts[k] - minimums[k])
+        else:
+            rows, deltas = ops.sorted_moves(members[j], j, k)
+            transfers.append((k, rows, deltas))
+            limit = min(limit, len(rows))
+
+    # Marginal gains are sorted on every arc, so their sum is non-decreasing
+    count = 0
+    while count < limit and sum(deltas[count] for k, rows, deltas in transfers) < -EPSILON:
+        count += 1
+    count = max(count, 1)
+    for k, rows, deltas in transfers:
+        ops.move(assign, rows[:count], k)
+
+
+def _find_negative_cycle(node_count, edges):
+    """Bellman-Ford depuis une source virtuelle, retourne les nœuds d'un cycle négatif
+
+    Le graphe des prédécesseurs est examiné après chaque passe : un cycle
+    négatif y apparaît en général bien avant la dernière des node_count passes.
+    """
+    weights = None
+    dist = [0.0] * node_count
+    pred = [-1] * node_count
+    for _ in range(node_count):
+        updated = False
+        for u, v, weight in edges:
+            if dist[u] + weight < dist[v] - EPSILON:
+                dist[v] = dist[u] + weight
+                pred[v] = u
+                updated = True
+        if not updated:
+            return None
+
+        cycle = _predecessor_cycle(pred)
+        if cycle is None:
+            continue
+        if weights is None:
+            weights = {(u, v): weight for u, v, weight in edges}
+        if sum(weights[(u, v)] for u, v in zip(cycle, cycle[1:] + cycle[:1])) < -EPSILON:
+            return cycle
+    return _predecessor_cycle(pred)
+
+
+def _predecessor_cycle(pred):
+    """Cycle du graphe des prédécesseurs (dans le sens des arcs), ou None"""
+    seen = [-1] * len(pred)
+    for start in range(len(pred)):
+        node = start
+        while node != -1 and seen[node] == -1:
+            seen[node] = start
+            node = pred[node]
+        if node != -1 and seen[node] == start:
+            # Walked into a node of this same walk: it lies on a cycle
+            cycle = [node]
+            current = pred[node]
+            while current != node:
+                cycle.append(current)
+                current = pred[current]
+            cycle.reverse()
+            return cycle
+    return None
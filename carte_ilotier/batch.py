@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Traitement par lots de plusieurs postes consulaires
+
+Un manifeste JSON décrit chaque poste (fichier du registre, ilotiers,
+dossier de sortie) :
+
+    {
+      "output_dir": "sorties",
+      "posts": [
+        {
+          "name": "Tokyo",
+          "input": "registres/tokyo.xlsx",
+          "output_dir": "sorties/tokyo",
+          "ilotiers": [
+            {"name": "Ilotier 1", "address": "1 rue ...", "weight": 1},
+            {"name": "Ilotier 2", "address": "10 avenue ...", "capacity": 150}
+          ]
+        }
+      ]
+    }
+
+Les chemins relatifs partent du dossier du manifeste. Les postes sont traités
+en parallèle dans des processus séparés, qui partagent le cache de géocodage
+(base SQLite) et une seule limite de débit de l'API. Une synthèse (équilibre,
+distance et durées par poste) est écrite dans synthese.json.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from .geocode_cache import GeocodeCache
+from .geocoders import create_geocoder
+from .geocoding import DEFAULT_BURST, DEFAULT_REQUESTS_PER_SECOND, SharedTokenBucket
+from .kml import LAYER_LIMIT
+from .pipeline import ZonePipeline, print_log
+from .travel import TravelTimeCache, create_travel_service
+
+SUMMARY_FILE = "synthese.json"
+
+# Rate limiter of the worker process, set by _init_worker
+_limiter = None
+
+
+def load_manifest(filename):
+    """Charger et vérifier un manifeste
+
+    Retourne un dict : 'posts' (postes, chemins absolus) et 'output_dir'
+    (dossier de la synthèse : celui du manifeste par défaut).
+    """
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise Exception(f"Manifeste illisible ({os.path.basename(filename)}) : {str(e)}")
+
+    base = os.path.dirname(os.path.abspath(filename))
+    default_output = manifest.get('output_dir')
+    posts = []
+    names = set()
+    for number, post in enumerate(manifest.get('posts') or [], start=1):
+        name = str(post.get('name') or f"poste{number}")
+        if name in names:
+            raise Exception(f"Poste en double dans le manifeste : {name}")
+        names.add(name)
+        if not post.get('input'):
+            raise Exception(f"Poste {name} : fichier du registre manquant ('input')")
+        ilotiers = post.get('ilotiers') or []
+        if len(ilotiers) < 2:
+            raise Exception(f"Poste {name} : au moins deux ilotiers sont nécessaires")
+        if any(not ilotier.get('name') or not ilotier.get('address') for ilotier in ilotiers):
+            raise Exception(f"Poste {name} : chaque ilotier doit avoir un nom ('name') et une adresse ('address')")
+
+        input_file = os.path.join(base, os.path.expanduser(post['input']))
+        if post.get('output_dir'):
+            output_dir = os.path.join(base, os.path.expanduser(post['output_dir']))
+        elif default_output:
+            output_dir = os.path.join(base, os.path.expanduser(default_output), name)
+        else:
+            output_dir = os.path.dirname(input_file)
+        posts.append({
+            'name': name,
+            'input': input_file,
+            'output_dir': output_dir,
+            'ilotiers': [(ilotier['name'], ilotier['address']) for ilotier in ilotiers],
+            'weights': {ilotier['name']: float(ilotier['weight'])
+                        for ilotier in ilotiers if ilotier.get('weight') is not None},
+            'capacities': {ilotier['name']: int(ilotier['capacity'])
+                           for ilotier in ilotiers if ilotier.get('capacity') is not None},
+            'incremental': post.get('incremental')
+        })
+    if not posts:
+        raise Exception("Aucun poste dans le manifeste ('posts')")
+    return {
+        'posts': posts,
+        'output_dir': os.path.join(base, os.path.expanduser(default_output)) if default_output else base
+    }
+
+
+def _init_worker(limiter):
+    global _limiter
+    _limiter = limiter
+
+
+def run_post(post, options):
+    """Traiter un poste (dans un processus de travail), retourne sa synthèse"""
+    name = post['name']
+
+    def log(message):
+        print_log(f"[{name}] {message}")
+
+    summary = {'name': name, 'input': post['input'], 'output_dir': post['output_dir']}
+    start = time.perf_counter()
+    cache = None
+    travel_cache = None
+    try:
+        geocoder = create_geocoder(options['backend'], api_key=options.get('api_key'),
+                                   gazetteer=options.get('gazetteer'))
+        if options.get('cache_file'):
+            cache = GeocodeCache(options['cache_file'])
+        travel_service = None
+        if options.get('travel_time'):
+            travel_service = create_travel_service(options['travel_time'], options.get('api_key'),
+                                                   options.get('travel_mode', 'driving'))
+            if travel_service.cacheable and options.get('travel_cache_file'):
+                travel_cache = TravelTimeCache(options['travel_cache_file'])
+        pipeline = ZonePipeline(log=log, geocoding_settings=options.get('geocoding'),
+                                profile=options.get('profile'), limiter=_limiter,
+                                zones_format=options.get('zones_format', 'json'),
+                                map_format=options.get('map_format', 'kml'),
+                                layer_limit=options.get('layer_limit', LAYER_LIMIT),
+                                boundaries=options.get('boundaries', True),
+                                travel_service=travel_service, travel_cache=travel_cache,
+                                refine_time=options.get('refine_time'))
+        incremental = post['incremental'] if post['incremental'] is not None else options.get('incremental')
+        result = pipeline.run(post['input'], post['ilotiers'], geocoder, post['output_dir'], cache,
+                              weights=post['weights'], capacities=post['capacities'],
+                              incremental=bool(incremental), resume=options.get('resume', True))
+        summary.update(post_summary(result, pipeline.metrics.report()))
+        summary['status'] = 'ok'
+        log("Traitement terminé avec succès !")
+    except Exception as e:
+        summary['status'] = 'erreur'
+        summary['error'] = str(e)
+        log(f"ERREUR : {str(e)}")
+    finally:
+        if cache is not None:
+            cache.close()
+        if travel_cache is not None:
+            travel_cache.close()
+    summary['seconds'] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def post_summary(result, report):
+    """Équilibre, distance et mesures d'un poste traité"""
+    families = result['families']
+    located = [family for family in families if family.zone is not None]
+    zones = {name: 0 for name in result['ilotiers']}
+    for family in located:
+        zones[family.ilotier] += 1
+    summary = {
+        'families': len(families),
+        'not_geocoded': len(families) - len(located),
+        'zones': zones,
+        'balance': {name: round(count / len(located) * 100, 1) if located else 0.0
+                    for name, count in zones.items()},
+        'total_distance_km': round(sum(family.distance for family in located), 1),
+        'stages': {stage['name']: stage['seconds'] for stage in report['stages']},
+        'counters': report['counters']
+    }
+    if located and located[0].travel_time is not None:
+        summary['total_travel_minutes'] = round(sum(family.travel_time for family in located))
+    return summary
+
+
+def run_batch(manifest_file, options, processes=None, log=print_log):
+    """Traiter tous les postes d'un manifeste, retourne la synthèse consolidée
+
+    `options` : backend, api_key, gazetteer, cache_file (None = sans cache),
+    geocoding (réglages de débit, partagés par tous les processus),
+    incremental, resume, profile, zones_format, map_format, layer_limit,
+    boundaries, travel_time, travel_mode, travel_cache_file (None = sans
+    cache) et refine_time. La synthèse est aussi écrite dans SUMMARY_FILE ('file' de la
+    synthèse retournée).
+    """
+    manifest = load_manifest(manifest_file)
+    posts = manifest['posts']
+    processes = max(1, min(processes or os.cpu_count() or 1, len(posts)))
+    settings = options.get('geocoding') or {}
+    limiter = SharedTokenBucket(settings.get('requests_per_second', DEFAULT_REQUESTS_PER_SECOND),
+                                settings.get('burst', DEFAULT_BURST))
+    log(f"Traitement de {len(posts)} postes sur {processes} processus "
+        f"(débit global : {limiter.rate:g} requêtes/s)")
+
+    started = datetime.now()
+    start = time.perf_counter()
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                             initargs=(limiter,)) as pool:
+        futures = {pool.submit(run_post, post, options): post['name'] for post in posts}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                summaries[name] = future.result()
+            except Exception as e:
+                # Worker process died (memory, killed...)
+                summaries[name] = {'name': name, 'status': 'erreur', 'error': str(e)}
+
+    summary = {
+        'started': started.isoformat(timespec='seconds'),
+        'total_seconds': round(time.perf_counter() - start, 2),
+        'processes': processes,
+        'posts': [summaries[post['name']] for post in posts]
+    }
+    summary['failures'] = sum(1 for post in summary['posts'] if post['status'] != 'ok')
+    for line in format_summary(summary):
+        log(line)
+    summary['file'] = save_summary(summary, manifest['output_dir'])
+    log(f"Synthèse sauvegardée : {summary['file']}")
+    return summary
+
+
+def format_summary(summary):
+    """Lignes de la synthèse consolidée pour le journal"""
+    lines = ["Synthèse par poste :"]
+    for post in summary['posts']:
+        if post['status'] != 'ok':
+            lines.append(f"  {post['name']} : ERREUR - {post.get('error', '')}")
+            continue
+        balance = ' / '.join(f"{percent:.1f}%" for percent in post['balance'].values())
+        lines.append(f"  {post['name']} : {post['families']} familles, équilibre {balance}, "
+                     f"{post['total_distance_km']:.1f} km, {post['seconds']:.1f} s")
+    done = len(summary['posts']) - summary['failures']
+    lines.append(f"{done}/{len(summary['posts'])} postes traités en {summary['total_seconds']:.1f} s")
+    return lines
+
+
+def save_summary(summary, output_dir):
+    """Écrire la synthèse consolidée, retourne le chemin du fichier"""
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, SUMMARY_FILE)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return filename
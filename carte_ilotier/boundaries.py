@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Contours des zones calculés à partir de la répartition finale
+
+Chaque zone est représentée par l'enveloppe convexe de ses familles,
+calculée sur (longitude, latitude) par l'algorithme de la chaîne monotone
+en O(n log n). Seules les familles les plus proches de leur ilotier (part
+HULL_COVERAGE de la zone) sont prises en compte : une famille isolée,
+transférée pour l'équilibre, n'étire pas le contour sur toute la carte.
+
+Les contours sont écrits en GeoJSON et ajoutés à la carte KML/KMZ : à
+petite échelle, quelques polygones remplacent des milliers de points.
+"""
+
+import json
+import math
+
+HULL_COVERAGE = 0.95  # Share of each zone's families, nearest to their ilotier first
+BOUNDARIES_FILE = "zones_contours.geojson"
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def convex_hull(points):
+    """Enveloppe convexe de points (x, y), sommets dans le sens trigonométrique"""
+    points = sorted(set(points))
+    if len(points) < 3:
+        return points
+
+    lower = []
+    for point in points:
+        while len(lower) >= 2 and _cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    upper = []
+    for point in reversed(points):
+        while len(upper) >= 2 and _cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    # Last point of each chain is the first of the other
+    return lower[:-1] + upper[:-1]
+
+
+def zone_boundaries(families, ilotier_coords, coverage=HULL_COVERAGE):
+    """Contour de chaque zone
+
+    Retourne une liste de dicts, un par zone d'au moins trois familles non
+    alignées : zone, ilotier, families (familles de la zone), covered
+    (familles prises en compte) et ring (anneau fermé de (lng, lat)).
+    """
+    names = {info['zone']: name for name, info in ilotier_coords.items()}
+    by_zone = {}
+    for family in families:
+        if family.zone is not None and family.lat is not None:
+            by_zone.setdefault(family.zone, []).append((family.distance or 0, family.lng, family.lat))
+
+    boundaries = []
+    for zone in sorted(by_zone):
+        members = sorted(by_zone[zone])
+        kept = members[:max(3, math.ceil(len(members) * coverage))]
+        hull = convex_hull([(lng, lat) for distance, lng, lat in kept])
+        if len(hull) < 3:
+            continue
+        boundaries.append({
+            'zone': zone,
+            'ilotier': names.get(zone),
+            'families': len(members),
+            'covered': len(kept),
+            'ring': hull + hull[:1]
+        })
+    return boundaries
+
+
+def write_geojson(boundaries, output_file):
+    """Écrire les contours en GeoJSON : un polygone par zone"""
+    features = [{
+        'type': 'Feature',
+        'properties': {
+            'zone': boundary['zone'],
+            'ilotier': boundary['ilotier'],
+            'families': boundary['families'],
+            'covered': boundary['covered']
+        },
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [[[lng, lat] for lng, lat in boundary['ring']]]
+        }
+    } for boundary in boundaries]
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f, ensure_ascii=False)
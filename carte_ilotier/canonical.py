@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Forme canonique des adresses : une clé stable par adresse
+
+Le registre écrit souvent la même adresse de plusieurs façons (majuscules,
+accents, ponctuation, « Av. » ou « avenue », « 12bis » ou « 12 bis »,
+« 75 001 » ou « 75001 »). La clé canonique efface ces différences pour que
+chaque adresse ne soit géocodée qu'une fois et retrouvée dans le cache :
+- pliage Unicode : formes de compatibilité (chiffres pleine chasse...),
+  accents des lettres latines, casse
+- ponctuation remplacée par des espaces, espaces multiples réduits
+- codes postaux français (« 75 001 ») et japonais (« 150-0001 ») sans séparateur
+- types de voie et mots courants abrégés ramenés à leur forme complète
+- indices de répétition (« 12b », « 12 ter ») écrits « 12 bis », « 12 ter »
+
+Les parties séparées par des virgules (adresse, code postal, ville) sont
+conservées, la clé reste lisible. AddressVariants compte les écritures
+différentes regroupées sous chaque clé.
+"""
+
+import csv
+import re
+import unicodedata
+
+# Abbreviations -> full word, accents already removed
+STREET_TYPES = {
+    'av': 'avenue', 'ave': 'avenue', 'avn': 'avenue',
+    'bd': 'boulevard', 'bld': 'boulevard', 'blvd': 'boulevard', 'boul': 'boulevard',
+    'pl': 'place',
+    'ch': 'chemin', 'chem': 'chemin',
+    'imp': 'impasse',
+    'all': 'allee',
+    'rte': 'route',
+    'fg': 'faubourg', 'fbg': 'faubourg',
+    'sq': 'square',
+    'crs': 'cours',
+    'res': 'residence', 'resid': 'residence',
+    'bat': 'batiment', 'bt': 'batiment',
+    'app': 'appartement', 'appt': 'appartement', 'apt': 'appartement',
+    'st': 'saint', 'ste': 'sainte',
+}
+
+# Repetition index after a street number: 12b, 12 bis, 12t...
+REPETITIONS = {'b': 'bis', 'bis': 'bis', 't': 'ter', 'ter': 'ter', 'q': 'quater', 'quater': 'quater'}
+REPETITION_PATTERN = re.compile(r'\b(\d+) ?(bis|ter|quater|b|t|q)\b')
+
+# Postal codes split by a space or a dash: 75 001 (France), 150-0001 (Japan)
+POSTAL_CODE_PATTERN = re.compile(r'^(\d{2}) (\d{3})$|^(\d{3}) (\d{4})$')
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s,]|_")
+LATIN_LIMIT = 0x250  # Marks are only removed from Latin letters, not from kana
+
+
+def fold(text):
+    """Pliage Unicode : formes de compatibilité, accents des lettres latines, casse"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    kept = []
+    for char in decomposed:
+        if unicodedata.combining(char) and kept and ord(kept[-1]) < LATIN_LIMIT:
+            continue
+        kept.append(char)
+    # Recompose what is left (Japanese voiced kana)
+    return unicodedata.normalize('NFC', ''.join(kept)).casefold()
+
+
+def canonical_part(part):
+    """Forme canonique d'une partie de l'adresse (entre deux virgules)"""
+    part = ' '.join(PUNCTUATION_PATTERN.sub(' ', part).split())
+    match = POSTAL_CODE_PATTERN.match(part)
+    if match:
+        return ''.join(group for group in match.groups() if group)
+    part = REPETITION_PATTERN.sub(lambda m: f"{m.group(1)} {REPETITIONS[m.group(2)]}", part)
+    return ' '.join(STREET_TYPES.get(token, token) for token in part.split())
+
+
+def canonical_address(address):
+    """Clé canonique d'une adresse (texte), identique pour toutes ses écritures"""
+    parts = (canonical_part(part) for part in fold(address or '').split(','))
+    return ', '.join(part for part in parts if part)
+
+
+class AddressVariants:
+    """Écritures distinctes regroupées sous chaque clé canonique
+
+    Seule la première écriture de chaque clé est conservée, plus l'ensemble
+    des écritures pour les clés qui en ont plusieurs.
+    """
+
+    def __init__(self):
+        self.first = {}
+        self.collapsed = {}
+
+    def add(self, address):
+        """Enregistrer une écriture, retourne sa clé canonique"""
+        key = canonical_address(address)
+        raw = (address or '').strip()
+        first = self.first.setdefault(key, raw)
+        if raw != first:
+            self.collapsed.setdefault(key, {first}).add(raw)
+        return key
+
+    def counts(self):
+        """Nombre d'écritures distinctes par clé, pour les clés en ayant plusieurs"""
+        return {key: len(variants) for key, variants in self.collapsed.items()}
+
+    def merged(self):
+        """Nombre d'écritures regroupées avec une autre (recherches économisées)"""
+        return sum(len(variants) - 1 for variants in self.collapsed.values())
+
+    def write_csv(self, filename):
+        """Écrire le rapport : clé, nombre d'écritures et écritures, les plus regroupées d'abord"""
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Adresse canonique', 'Écritures', 'Variantes'])
+            for key, variants in sorted(self.collapsed.items(), key=lambda item: (-len(item[1]), item[0])):
+                writer.writerow([key, len(variants), ' | '.join(sorted(variants))])
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Point de reprise du géocodage
+
+Les coordonnées obtenues sont sauvegardées régulièrement dans un fichier
+JSON propre au fichier d'entrée (nommé d'après l'empreinte SHA-256 de son
+contenu). Après une interruption (plantage, mise en veille, quota épuisé),
+un nouveau traitement du même fichier reprend ces résultats et ne géocode
+que les adresses restantes. Le point de reprise est supprimé une fois le
+traitement terminé.
+
+Les empreintes calculées sont notées dans un index (HASH_INDEX_FILE) avec la
+taille et la date de modification du fichier : tant qu'elles n'ont pas
+changé, le fichier n'est pas relu. pending_checkpoint ne lit donc pas le
+fichier d'entrée, sauf si un point de reprise peut lui correspondre.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from .geocode_cache import normalize_address
+
+CHECKPOINT_DIR = os.path.expanduser("~/.ilotier_reprise")
+HASH_INDEX_FILE = "empreintes.json"
+SAVE_EVERY = 50  # Results between two saves
+SAVE_INTERVAL = 30  # Seconds between two saves
+
+
+def file_hash(filename):
+    """Empreinte SHA-256 du contenu d'un fichier"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_hash_index(directory):
+    try:
+        with open(os.path.join(directory, HASH_INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        return index if isinstance(index, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _same_file(entry, stat):
+    return isinstance(entry, dict) and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns
+
+
+def input_hash(input_file, directory=CHECKPOINT_DIR):
+    """Empreinte de `input_file`, reprise de l'index si sa taille et sa date de modification n'ont pas changé"""
+    stat = os.stat(input_file)
+    key = os.path.abspath(input_file)
+    index = _load_hash_index(directory)
+    if _same_file(index.get(key), stat):
+        return index[key]['hash']
+
+    digest = file_hash(input_file)
+    # Keep only the files that still have a checkpoint, plus this one
+    index = {path: entry for path, entry in index.items()
+             if isinstance(entry, dict) and os.path.exists(os.path.join(directory, f"{entry.get('hash')}.json"))}
+    index[key] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest}
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Concurrent runs may overwrite each other's entries: it only costs a new hash
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(temp_path, os.path.join(directory, HASH_INDEX_FILE))
+    except OSError:
+        pass
+    return digest
+
+
+def checkpoint_path(input_file, directory=CHECKPOINT_DIR):
+    """Fichier de reprise associé au contenu de `input_file`"""
+    return os.path.join(directory, f"{input_hash(input_file, directory)}.json")
+
+
+def pending_checkpoint(input_file, directory=CHECKPOINT_DIR):
+    """Nombre d'adresses déjà géocodées par un traitement interrompu de ce fichier (0 si aucun)
+
+    Le fichier n'est lu pour calculer son empreinte que si un point de
+    reprise de même taille existe : l'appel reste immédiat sur un gros fichier.
+    """
+    try:
+        stat = os.stat(input_file)
+        pending = {name[:-len('.json')] for name in os.listdir(directory)
+                   if name.endswith('.json') and name != HASH_INDEX_FILE}
+    except OSError:
+        return 0
+    if not pending:
+        return 0
+
+    index = _load_hash_index(directory)
+    entry = index.get(os.path.abspath(input_file))
+    if _same_file(entry, stat):
+        digest = entry['hash']
+    elif any(isinstance(other, dict) and other.get('size') == stat.st_size and other.get('hash') in pending
+             for other in index.values()):
+        # Same size as an interrupted file: maybe a copy or a modified version, check its content
+        digest = input_hash(input_file, directory)
+    else:
+        return 0
+    try:
+        with open(os.path.join(directory, f"{digest}.json"), 'r', encoding='utf-8') as f:
+            return len(json.load(f).get('results', {}))
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class GeocodeCheckpoint:
+    """Résultats de géocodage d'un fichier, sauvegardés de façon atomique"""
+
+    def __init__(self, path, geocoder_name, resume=True, input_name=''):
+        self.path = path
+        self.geocoder_name = geocoder_name
+        self.input_name = input_name
+        self.results = {}
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+        if resume:
+            self.load()
+
+    def __len__(self):
+        return len(self.results)
+
+    def load(self):
+        """Reprendre les résultats sauvegardés (ignorés s'ils sont illisibles ou d'un autre service)"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('geocoder') != self.geocoder_name:
+                return
+            self.results = {key: (lat, lng) for key, (lat, lng) in data['results'].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            self.results = {}
+
+    def get(self, address):
+        """Coordonnées déjà obtenues pour cette adresse, sinon None"""
+        return self.results.get(normalize_address(address))
+
+    def add(self, address, lat, lng):
+        """Enregistrer un résultat ; le fichier est réécrit toutes les SAVE_EVERY adresses ou SAVE_INTERVAL s"""
+        self.results[normalize_address(address)] = (lat, lng)
+        self._unsaved += 1
+        if self._unsaved >= SAVE_EVERY or time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        """Écrire les résultats non encore sauvegardés"""
+        if not self._unsaved:
+            return
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            'input_file': self.input_name,
+            'geocoder': self.geocoder_name,
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'results': self.results
+        }
+        # Write a temporary file then rename it: an interruption never leaves a truncated checkpoint
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+
+    def remove(self):
+        """Supprimer le point de reprise (traitement terminé)"""
+        self.results = {}
+        self._unsaved = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
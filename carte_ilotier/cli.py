@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Interface en ligne de commande (sans Tk)
+
+Exemple :
+    python -m carte_ilotier --input "registres/*.xlsx" \\
+        --ilotier "Ilotier 1=1 rue de Rivoli, Paris" \\
+        --ilotier "Ilotier 2=10 avenue Foch, Paris"
+
+Plusieurs postes en parallèle (voir carte_ilotier.batch) :
+    python -m carte_ilotier --manifest postes.json --processes 4
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+from .config import load_config
+from .batch import run_batch
+from .canonical import canonical_address
+from .geocode_cache import DEFAULT_CACHE_FILE, GeocodeCache
+from .geocoders import BACKENDS, create_geocoder
+from .logs import open_log_file
+from .metrics import PROFILE_MODES
+from .kml import LAYER_LIMIT
+from .pipeline import MAP_FORMATS, ZonePipeline, print_log
+from .refine import TIME_BUDGET
+from .travel import (DEFAULT_TRAVEL_CACHE_FILE, TRAVEL_BACKENDS, TRAVEL_MODES, TravelTimeCache,
+                     create_travel_service)
+from .zonefile import FORMATS
+
+
+def parse_ilotier(value):
+    """Analyser un argument NOM=ADRESSE"""
+    name, sep, address = value.partition('=')
+    if not sep or not name.strip() or not address.strip():
+        raise argparse.ArgumentTypeError(f"Format attendu NOM=ADRESSE : {value}")
+    return name.strip(), address.strip()
+
+
+def parse_number_option(value):
+    """Analyser un argument NOM=NOMBRE"""
+    name, sep, number = value.rpartition('=')
+    try:
+        return name.strip(), float(number)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Format attendu NOM=NOMBRE : {value}")
+
+
+def expand_inputs(patterns):
+    """Développer les motifs de fichiers, sans doublons et dans l'ordre"""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.expanduser(pattern)))
+        if not matches:
+            raise FileNotFoundError(f"Aucun fichier ne correspond à : {pattern}")
+        for match in matches:
+            if match not in files:
+                files.append(match)
+    return files
+
+
+def output_dir_for(input_file, output_dir, several):
+    """Dossier de sortie d'un fichier : un sous-dossier par fichier si plusieurs entrées"""
+    base = output_dir if output_dir else os.path.dirname(input_file)
+    if several:
+        base = os.path.join(base, os.path.splitext(os.path.basename(input_file))[0])
+    return base
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m carte_ilotier',
+        description="Répartir les familles du registre consulaire entre ilotiers")
+    parser.add_argument('--input', '-i', action='append', metavar='FICHIER',
+                        help="Fichier Excel/CSV (motifs glob acceptés, option répétable)")
+    parser.add_argument('--ilotier', action='append', type=parse_ilotier,
+                        metavar='NOM=ADRESSE', help="Ilotier et son adresse (option répétable)")
+    parser.add_argument('--manifest', metavar='FICHIER',
+                        help="Manifeste JSON de plusieurs postes (fichier, ilotiers, dossier de sortie), "
+                             "traités en parallèle à la place de --input/--ilotier")
+    parser.add_argument('--processes', type=int, metavar='N',
+                        help="Nombre de postes traités en parallèle avec --manifest (défaut : nombre de cœurs)")
+    parser.add_argument('--weight', action='append', default=[], type=parse_number_option,
+                        metavar='NOM=POIDS', help="Part relative de familles d'un ilotier (défaut : 1)")
+    parser.add_argument('--capacity', action='append', default=[], type=parse_number_option,
+                        metavar='NOM=MAX', help="Nombre maximal de familles d'un ilotier")
+    parser.add_argument('--output-dir', '-o', help="Dossier de sortie (défaut : dossier du fichier)")
+    parser.add_argument('--geocoder', choices=BACKENDS,
+                        help="Service de géocodage (défaut : offline si --gazetteer, sinon google)")
+    parser.add_argument('--gazetteer', metavar='FICHIER',
+                        help="Référentiel CSV hors ligne (adresse/code postal/ville -> lat/lng)")
+    parser.add_argument('--api-key', help="Clé API Google Maps (défaut : $GOOGLE_MAPS_API_KEY "
+                                          "ou ~/.ilotier_config.json)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Ne pas utiliser les caches de géocodage et de temps de trajet")
+    parser.add_argument('--clear-cache', action='store_true',
+                        help="Vider le cache de géocodage avant le traitement (seul, sans --input : "
+                             "vider le cache et quitter)")
+    parser.add_argument('--forget-address', action='append', default=[], metavar='ADRESSE',
+                        help="Retirer une adresse mal géocodée du cache (option répétable)")
+    parser.add_argument('--travel-time', choices=TRAVEL_BACKENDS,
+                        help="Équilibrer sur le temps de trajet plutôt que la distance à vol d'oiseau "
+                             "(google : API Distance Matrix, estimate : estimation hors ligne)")
+    parser.add_argument('--travel-mode', choices=TRAVEL_MODES, default='driving',
+                        help="Mode de déplacement avec --travel-time google (défaut : driving)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Réutiliser le zones.json du dossier de sortie : seules les familles "
+                             "nouvelles ou ayant déménagé sont géocodées")
+    parser.add_argument('--zones-format', choices=FORMATS, default='json',
+                        help="Fichier de zones : zones.json complet (défaut) ou fichier compact "
+                             "sans données personnelles, une famille par ligne (ndjson, ndjson.gz)")
+    parser.add_argument('--map-format', choices=MAP_FORMATS, default='kml',
+                        help="Carte : zones.kml (défaut) ou zones.kmz compressé et découpé en calques")
+    parser.add_argument('--layer-limit', type=int, default=LAYER_LIMIT, metavar='N',
+                        help=f"Familles par calque du KMZ (défaut : {LAYER_LIMIT}, limite de Google My Maps)")
+    parser.add_argument('--refine', nargs='?', type=float, const=TIME_BUDGET, metavar='SECONDES',
+                        help="Affiner la répartition pour raccourcir les trajets les plus longs "
+                             f"(échanges de familles, distance totale +1 %% au plus ; "
+                             f"durée maximale {TIME_BUDGET:g} s par défaut)")
+    parser.add_argument('--no-boundaries', action='store_true',
+                        help="Ne pas calculer les contours des zones (zones_contours.geojson et calque de la carte)")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Ignorer le point de reprise d'un traitement interrompu du même fichier")
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help="Profiler le traitement (cprofile : temps par fonction, "
+                             "tracemalloc : mémoire par étape), résultat dans metriques.json")
+    parser.add_argument('--log-file', metavar='FICHIER',
+                        help="Copier le journal dans un fichier (avec rotation)")
+    return parser
+
+
+def run(args, log=print_log):
+    """Traiter tous les fichiers, retourne le nombre d'échecs"""
+    if args.clear_cache or args.forget_address:
+        clear_geocode_cache(args, log)
+        if not (args.input or args.ilotier or args.manifest):
+            return 0
+    config = load_config()
+    backend = args.geocoder or ('offline' if args.gazetteer else 'google')
+    api_key = args.api_key or os.environ.get('GOOGLE_MAPS_API_KEY') or config.get('api_key')
+    if (backend == 'google' or args.travel_time == 'google') and not api_key:
+        raise Exception("Aucune clé API Google Maps (--api-key, GOOGLE_MAPS_API_KEY ou ~/.ilotier_config.json)")
+    if args.manifest:
+        return run_manifest(args, config, backend, api_key, log)
+    if not args.input or not args.ilotier:
+        raise Exception("Indiquer --input et --ilotier, ou --manifest")
+    if len(args.ilotier) < 2:
+        raise Exception("Au moins deux ilotiers sont nécessaires")
+    names = [name for name, address in args.ilotier]
+    for name, value in args.weight + args.capacity:
+        if name not in names:
+            raise Exception(f"Ilotier inconnu : {name}")
+    weights = dict(args.weight)
+    capacities = {name: int(value) for name, value in args.capacity}
+
+    input_files = expand_inputs(args.input)
+    geocoder = create_geocoder(backend, api_key=api_key, gazetteer=args.gazetteer)
+    cache = None if args.no_cache else GeocodeCache()
+    travel_service = None
+    travel_cache = None
+    if args.travel_time:
+        travel_service = create_travel_service(args.travel_time, api_key, args.travel_mode)
+        if travel_service.cacheable and not args.no_cache:
+            travel_cache = TravelTimeCache()
+    pipeline = ZonePipeline(log=log, geocoding_settings=config.get('geocoding'), profile=args.profile,
+                            zones_format=args.zones_format, map_format=args.map_format,
+                            layer_limit=args.layer_limit, boundaries=not args.no_boundaries,
+                            travel_service=travel_service, travel_cache=travel_cache,
+                            refine_time=args.refine)
+
+    failures = 0
+    several = len(input_files) > 1
+    try:
+        for input_file in input_files:
+            try:
+                pipeline.run(input_file, args.ilotier, geocoder,
+                             output_dir_for(input_file, args.output_dir, several), cache,
+                             weights=weights, capacities=capacities, incremental=args.incremental,
+                             resume=not args.no_resume)
+                log("Traitement terminé avec succès !")
+            except Exception as e:
+                failures += 1
+                log(f"ERREUR ({os.path.basename(input_file)}) : {str(e)}")
+    finally:
+        if cache is not None:
+            cache.close()
+        if travel_cache is not None:
+            travel_cache.close()
+
+    if several:
+        log(f"{len(input_files) - failures}/{len(input_files)} fichiers traités")
+    return failures
+
+
+def clear_geocode_cache(args, log=print_log):
+    """Vider le cache de géocodage (--clear-cache) ou en retirer des adresses (--forget-address)"""
+    cache = GeocodeCache()
+    try:
+        if args.clear_cache:
+            cache.clear()
+            log("Cache de géocodage vidé")
+        for address in args.forget_address:
+            # Entries are stored under the canonical form of the address
+            if cache.invalidate(canonical_address(address)):
+                log(f"Adresse retirée du cache : {address}")
+            else:
+                log(f"Adresse absente du cache : {address}")
+    finally:
+        cache.close()
+
+
+def run_manifest(args, config, backend, api_key, log=print_log):
+    """Traiter les postes d'un manifeste en parallèle, retourne le nombre d'échecs"""
+    if args.input or args.ilotier or args.weight or args.capacity:
+        raise Exception("--manifest remplace --input, --ilotier, --weight et --capacity")
+    options = {
+        'backend': backend,
+        'api_key': api_key,
+        'gazetteer': args.gazetteer,
+        'cache_file': None if args.no_cache else DEFAULT_CACHE_FILE,
+        'geocoding': config.get('geocoding'),
+        'incremental': args.incremental,
+        'resume': not args.no_resume,
+        'profile': args.profile,
+        'zones_format': args.zones_format,
+        'map_format': args.map_format,
+        'layer_limit': args.layer_limit,
+        'boundaries': not args.no_boundaries,
+        'refine_time': args.refine,
+        'travel_time': args.travel_time,
+        'travel_mode': args.travel_mode,
+        'travel_cache_file': None if args.no_cache else DEFAULT_TRAVEL_CACHE_FILE
+    }
+    summary = run_batch(args.manifest, options, args.processes, log)
+    return summary['failures']
+
+
+def main(argv=None):
+    """Point d'entrée en ligne de commande"""
+    args = build_parser().parse_args(argv)
+    log = print_log
+    if args.log_file:
+        file_logger = open_log_file(args.log_file)
+        
+        def log(message):
+            print_log(message)
+            file_logger.info(message)
+            
+    try:
+        failures = run(args, log)
+    except Exception as e:
+        log(f"ERREUR : {str(e)}")
+        return 2
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration utilisateur (~/.ilotier_config.json)
+"""
+
+import json
+import os
+
+CONFIG_FILE = os.path.expanduser("~/.ilotier_config.json")
+
+
+def load_config():
+    """Charger la configuration, retourne un dict vide si absente ou illisible"""
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def save_config(config):
+    """Sauvegarder la configuration"""
+    with open(CONFIG_FILE, 'w') as f:
+        json.dump(config, f)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Calcul des distances (formule Haversine)
+Version vectorisée avec NumPy si disponible, sinon en Python pur
+"""
+
+import math
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+EARTH_RADIUS_KM = 6371  # Rayon de la Terre en km
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Calculer la distance en km entre deux points"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    delta_phi = math.radians(lat2 - lat1)
+    delta_lambda = math.radians(lng2 - lng1)
+
+    a = math.sin(delta_phi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+
+    return EARTH_RADIUS_KM * c
+
+
+def distance_matrix(lats, lngs, target_lats, target_lngs, use_numpy=None):
+    """Distances en km de chaque point (lats, lngs) vers chaque cible
+
+    Retourne une matrice n x k : un tableau NumPy si disponible, sinon une
+    liste de listes. `use_numpy=False` force le calcul en Python pur.
+    """
+    if use_numpy is None:
+        use_numpy = NUMPY_AVAILABLE
+    if use_numpy:
+        return _distance_matrix_numpy(lats, lngs, target_lats, target_lngs)
+    return _distance_matrix_python(lats, lngs, target_lats, target_lngs)
+
+
+def haversine_array(lat1, lng1, lat2, lng2):
+    """Distances en km entre tableaux NumPy de degrés (diffusion des dimensions)"""
+    phi1, lam1, phi2, lam2 = (np.radians(np.asarray(value, dtype=np.float64))
+                              for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin((lam2 - lam1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _distance_matrix_numpy(lats, lngs, target_lats, target_lngs):
+    return haversine_array(
+        np.asarray(lats, dtype=np.float64)[:, None],
+        np.asarray(lngs, dtype=np.float64)[:, None],
+        np.asarray(target_lats, dtype=np.float64)[None, :],
+        np.asarray(target_lngs, dtype=np.float64)[None, :]
+    )
+
+
+def _distance_matrix_python(lats, lngs, target_lats, target_lngs):
+    # Target terms are computed once instead of once per pair
+    targets = [(math.radians(lat), math.radians(lng), math.cos(math.radians(lat)))
+               for lat, lng in zip(target_lats, target_lngs)]
+    sin, sqrt, atan2 = math.sin, math.sqrt, math.atan2
+    rows = []
+    for lat, lng in zip(lats, lngs):
+        phi1 = math.radians(lat)
+        lam1 = math.radians(lng)
+        cos_phi1 = math.cos(phi1)
+        row = []
+        for phi2, lam2, cos_phi2 in targets:
+            a = sin((phi2 - phi1) / 2) ** 2 + cos_phi1 * cos_phi2 * sin((lam2 - lam1) / 2) ** 2
+            row.append(EARTH_RADIUS_KM * 2 * atan2(sqrt(a), sqrt(1 - a)))
+        rows.append(row)
+    return rows
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Représentation compacte d'une famille du registre
+
+Un objet à __slots__ par famille, sans copie de la ligne source : seule sa
+position dans le fichier (`row_index`) est conservée, le fichier étant relu
+en flux pour l'export CSV.
+"""
+
+
+class Family:
+    """Famille : contact, coordonnées et résultat de la répartition"""
+
+    __slots__ = ('family_code', 'address', 'contact_name', 'mobile', 'phone', 'email', 'row_index',
+                 'lat', 'lng', 'distances', 'natural_zone', 'zone', 'ilotier', 'distance',
+                 'travel_time', 'previous_zone')
+
+    def __init__(self, family_code, address, contact_name='', mobile='', phone='', email='',
+                 row_index=None):
+        self.family_code = family_code
+        self.address = address
+        self.contact_name = contact_name
+        self.mobile = mobile
+        self.phone = phone
+        self.email = email
+        self.row_index = row_index  # Row of the contact person in the source file
+
+        self.lat = None
+        self.lng = None
+        self.distances = None  # Distance to each ilotier in zone order, None if not computed
+        self.natural_zone = None
+        self.zone = None
+        self.ilotier = None
+        self.distance = None
+        self.travel_time = None  # Minutes to the assigned ilotier, travel-time balancing only
+        self.previous_zone = None
+
+    def __repr__(self):
+        return f"Family({self.family_code!r}, zone={self.zone})"
+
+    def to_dict(self):
+        """Enregistrement pour zones.json"""
+        data = {
+            'family_code': self.family_code,
+            'address': self.address,
+            'contact_name': self.contact_name,
+            'mobile': self.mobile,
+            'phone': self.phone,
+            'email': self.email,
+            'row_index': self.row_index,
+            'lat': self.lat,
+            'lng': self.lng
+        }
+        if self.distances is not None:
+            for zone, dist in enumerate(self.distances, start=1):
+                if dist is not None:
+                    data[f'dist_ilotier{zone}'] = dist
+            data['natural_zone'] = self.natural_zone
+        if self.zone is not None:
+            data['zone'] = self.zone
+            data['ilotier'] = self.ilotier
+            data['distance'] = self.distance
+            if self.travel_time is not None:
+                data['travel_time'] = self.travel_time
+        if self.previous_zone is not None:
+            data['previous_zone'] = self.previous_zone
+        return data
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Cache persistant des résultats de géocodage
+Base SQLite stockée à côté de ~/.ilotier_config.json
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_CACHE_FILE = os.path.expanduser("~/.ilotier_geocode_cache.sqlite")
+DEFAULT_TTL = 180 * 24 * 3600  # 180 jours
+DEFAULT_MAX_ENTRIES = 100000
+EVICT_EVERY = 1000  # Vérifier la taille du cache toutes les N insertions
+
+
+def normalize_address(address):
+    """Normaliser une adresse pour servir de clé de cache"""
+    text = unicodedata.normalize('NFKC', address or '').lower()
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*,\s*', ', ', text)
+    return text.strip(' ,')
+
+
+def address_hash(address):
+    """Empreinte courte de l'adresse normalisée"""
+    return hashlib.sha1(normalize_address(address or '').encode('utf-8')).hexdigest()[:16]
+
+
+class GeocodeCache:
+    """Cache adresse -> coordonnées avec expiration (TTL) et taille maximale (LRU)"""
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS geocode (
+            key TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS geocode_accessed ON geocode(accessed_at)')
+        self._conn.commit()
+        self.purge_expired()
+        with self._lock:
+            self._evict()
+            self._conn.commit()
+
+    def get(self, address):
+        """Retourner (lat, lng) si l'adresse est en cache et valide, sinon None"""
+        key = normalize_address(address)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT lat, lng, created_at FROM geocode WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if self.ttl and now - row[2] > self.ttl:
+                self._conn.execute('DELETE FROM geocode WHERE key = ?', (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE geocode SET accessed_at = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0], row[1]
+
+    def put(self, address, lat, lng):
+        """Enregistrer les coordonnées d'une adresse"""
+        key = normalize_address(address)
+        if not key:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO geocode (key, lat, lng, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, lat, lng, now, now))
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict()
+            self._conn.commit()
+
+    def invalidate(self, address):
+        """Supprimer une adresse du cache, retourne True si elle était présente"""
+        key = normalize_address(address)
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM geocode WHERE key = ?', (key,))
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def clear(self):
+        """Vider entièrement le cache"""
+        with self._lock:
+            self._conn.execute('DELETE FROM geocode')
+            self._conn.commit()
+
+    def purge_expired(self):
+        """Supprimer les entrées expirées, retourne le nombre supprimé"""
+        if not self.ttl:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM geocode WHERE created_at < ?', (time.time() - self.ttl,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+
+    def __bool__(self):
+        # An open cache is usable even when empty (__len__ alone would make it falsy)
+        return True
+
+    def stats_message(self):
+        """Résumé des succès/échecs du cache pour le journal"""
+        return f"Cache géocodage : {self.hits} trouvés, {self.misses} absents"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        """Supprimer les entrées les moins récemment utilisées au-delà de max_entries"""
+        if not self.max_entries:
+            return
+        count = self._conn.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                'DELETE FROM geocode WHERE key IN (SELECT key FROM geocode ORDER BY accessed_at LIMIT ?)',
+                (excess,))
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Services de géocodage interchangeables
+
+- GoogleGeocoder : Google Maps Geocoding API (clé API, réseau)
+- GazetteerGeocoder : référentiel local hors ligne (CSV adresse/code postal/ville -> coordonnées)
+"""
+
+import csv
+import importlib.util
+import re
+
+# googlemaps (and requests) is only imported when a Google service is created: faster startup
+GOOGLEMAPS_AVAILABLE = importlib.util.find_spec('googlemaps') is not None
+
+from .canonical import canonical_address
+
+BACKENDS = ('google', 'offline')
+
+# Accepted column names in a gazetteer file
+ADDRESS_COLUMNS = ('address', 'adresse')
+POSTAL_CODE_COLUMNS = ('postal_code', 'code_postal', 'postcode', 'zip')
+CITY_COLUMNS = ('city', 'ville', 'commune')
+LAT_COLUMNS = ('lat', 'latitude')
+LNG_COLUMNS = ('lng', 'lon', 'long', 'longitude')
+
+
+class Geocoder:
+    """Interface commune : geocode(adresse) -> (lat, lng) ou None si introuvable"""
+
+    name = ''
+    # Whether calls cost quota and must go through the rate limiter
+    rate_limited = False
+    # Whether results may be stored in the persistent geocode cache
+    cacheable = False
+
+    def geocode(self, address):
+        raise NotImplementedError
+
+
+class GoogleGeocoder(Geocoder):
+    """Géocodage par l'API Google Maps"""
+
+    name = 'google'
+    rate_limited = True
+    cacheable = True
+
+    def __init__(self, api_key=None, client=None):
+        if client is None:
+            if not GOOGLEMAPS_AVAILABLE:
+                raise Exception("Le module 'googlemaps' n'est pas installé. Installez-le avec : pip install googlemaps")
+            import googlemaps
+            client = googlemaps.Client(key=api_key)
+        self.client = client
+
+    def geocode(self, address):
+        result = self.client.geocode(address)
+        if result:
+            location = result[0]['geometry']['location']
+            return location['lat'], location['lng']
+        return None
+
+
+def normalize_postal_code(value):
+    """Normaliser un code postal (majuscules, sans espaces)"""
+    return re.sub(r'\s+', '', (value or '').upper())
+
+
+def _find_column(fieldnames, candidates):
+    lowered = {name.strip().lower(): name for name in fieldnames if name}
+    for candidate in candidates:
+        if candidate in lowered:
+            return lowered[candidate]
+    return None
+
+
+class GazetteerGeocoder(Geocoder):
+    """Géocodage hors ligne à partir d'un référentiel CSV chargé en mémoire
+
+    Le fichier contient des colonnes lat/lng et au moins une colonne parmi
+    adresse, code postal ou ville. Chaque adresse est résolue par recherche
+    directe dans des index : adresse exacte (adresse, code postal et ville,
+    forme canonique), puis centre du code postal, puis centre de la ville.
+    Le centre d'un code postal ou d'une ville est donné par les lignes sans
+    adresse, à défaut par la moyenne des adresses connues. Les adresses
+    placées sur un centre sont notées dans `approximate`.
+    """
+
+    name = 'offline'
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.by_address = {}
+        self.by_postal_code = {}
+        self.by_city = {}
+        self.approximate = {}
+        self.load(filename)
+
+    def load(self, filename):
+        """Construire les index depuis le fichier CSV"""
+        with open(filename, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames or []
+            address_col = _find_column(fieldnames, ADDRESS_COLUMNS)
+            postal_col = _find_column(fieldnames, POSTAL_CODE_COLUMNS)
+            city_col = _find_column(fieldnames, CITY_COLUMNS)
+            lat_col = _find_column(fieldnames, LAT_COLUMNS)
+            lng_col = _find_column(fieldnames, LNG_COLUMNS)
+            if not lat_col or not lng_col or not (address_col or postal_col or city_col):
+                raise Exception(f"Référentiel invalide : colonnes lat/lng et adresse, "
+                                f"code postal ou ville attendues ({filename})")
+
+            # Centroids averaged from street addresses, when no row gives them
+            postal_sums = {}
+            city_sums = {}
+            for row in reader:
+                try:
+                    coords = (float(row[lat_col]), float(row[lng_col]))
+                except (TypeError, ValueError):
+                    continue
+                street = (row.get(address_col) or '').strip() if address_col else ''
+                postal = (row.get(postal_col) or '').strip() if postal_col else ''
+                city = (row.get(city_col) or '').strip() if city_col else ''
+                if street:
+                    # Same layout as the addresses built from the registry: street, postal code, city
+                    full_address = ', '.join(part for part in (street, postal, city) if part)
+                    self.by_address[canonical_address(full_address)] = coords
+                    targets = (postal_sums, city_sums)
+                else:
+                    targets = (self.by_postal_code, self.by_city)
+                if postal:
+                    _add_coords(targets[0], postal_key(postal), coords, street)
+                if city:
+                    _add_coords(targets[1], canonical_address(city), coords, street)
+
+            for index, sums in ((self.by_postal_code, postal_sums), (self.by_city, city_sums)):
+                for key, (lat, lng, count) in sums.items():
+                    index.setdefault(key, (lat / count, lng / count))
+
+    def geocode(self, address):
+        key = canonical_address(address)
+        coords = self.by_address.get(key)
+        if coords:
+            return coords
+
+        parts = [part for part in key.split(', ') if part]
+        if self.by_postal_code:
+            for part in parts:
+                coords = self.by_postal_code.get(postal_key(part))
+                if coords:
+                    self.approximate[key] = 'code postal'
+                    return coords
+            for token in key.replace(',', ' ').split():
+                if any(char.isdigit() for char in token):
+                    coords = self.by_postal_code.get(postal_key(token))
+                    if coords:
+                        self.approximate[key] = 'code postal'
+                        return coords
+        for part in reversed(parts):
+            coords = self.by_city.get(part)
+            if coords:
+                self.approximate[key] = 'ville'
+                return coords
+        return None
+
+
+def postal_key(value):
+    """Clé d'un code postal : forme canonique (« 75 001 » -> 75001) sans espaces"""
+    return normalize_postal_code(canonical_address(value))
+
+
+def _add_coords(index, key, coords, street):
+    if not street:
+        index[key] = coords
+        return
+    lat, lng, count = index.get(key, (0.0, 0.0, 0))
+    index[key] = (lat + coords[0], lng + coords[1], count + 1)
+
+
+def create_geocoder(backend='google', api_key=None, gazetteer=None):
+    """Créer le service de géocodage demandé"""
+    if backend == 'google':
+        return GoogleGeocoder(api_key)
+    if backend == 'offline':
+        if not gazetteer:
+            raise Exception("Le géocodage hors ligne nécessite un fichier de référentiel")
+        return GazetteerGeocoder(gazetteer)
+    raise Exception(f"Service de géocodage inconnu : {backend}")
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Géocodage concurrent avec limitation de débit (seau à jetons)
+et nouvelles tentatives avec attente exponentielle
+"""
+
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .canonical import canonical_address
+
+# Google Geocoding API : quota standard de 50 requêtes/s
+DEFAULT_REQUESTS_PER_SECOND = 40
+DEFAULT_BURST = 10
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_BACKOFF = 0.5  # Secondes, doublé à chaque tentative
+PENDING_PER_WORKER = 4  # Lookups submitted ahead of each worker
+
+RETRYABLE_STATUSES = {'OVER_QUERY_LIMIT', 'UNKNOWN_ERROR', 'RESOURCE_EXHAUSTED'}
+TRANSIENT_ERRORS = {'Timeout', 'TransportError', 'HTTPError'}
+
+
+class TokenBucket:
+    """Limiteur de débit partagé entre threads : `rate` jetons/s, au plus `burst` d'avance"""
+
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST):
+        if rate <= 0:
+            raise ValueError("Le débit doit être strictement positif")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Attendre qu'un jeton soit disponible puis le consommer"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedTokenBucket:
+    """Seau à jetons partagé entre processus (traitement par lots)
+
+    L'état est en mémoire partagée : l'objet doit être transmis aux processus
+    à leur création (par exemple `initargs` d'un ProcessPoolExecutor).
+    """
+
+    def __init__(self, rate=DEFAULT_REQUESTS_PER_SECOND, burst=DEFAULT_BURST, context=None):
+        if rate <= 0:
+            raise ValueError("Le débit doit être strictement positif")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        # Available tokens and time of the last refill
+        self._state = (context or multiprocessing).Array('d', [self.capacity, time.monotonic()])
+
+    def acquire(self):
+        """Attendre qu'un jeton soit disponible puis le consommer"""
+        while True:
+            with self._state.get_lock():
+                now = time.monotonic()
+                tokens = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+                self._state[1] = now
+                if tokens >= 1:
+                    self._state[0] = tokens - 1
+                    return
+                self._state[0] = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+def group_by_address(families, variants=None):
+    """Regrouper les familles partageant la même adresse canonique
+
+    Retourne un dict clé -> liste de familles, dans l'ordre de première
+    apparition. Les écritures de chaque adresse sont comptées dans
+    `variants` (AddressVariants) si fourni.
+    """
+    groups = {}
+    for family in families:
+        key = variants.add(family.address) if variants is not None else canonical_address(family.address)
+        groups.setdefault(key, []).append(family)
+    return groups
+
+
+def is_transient_error(error):
+    """Indiquer si une erreur de l'API mérite une nouvelle tentative"""
+    if getattr(error, 'status', None) in RETRYABLE_STATUSES:
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return type(error).__name__ in TRANSIENT_ERRORS
+
+
+def geocode_address(geocoder, address, limiter=None, max_retries=DEFAULT_MAX_RETRIES,
+                    backoff=DEFAULT_BACKOFF, metrics=None):
+    """Géocoder une adresse, retourne (lat, lng) ou None si introuvable
+
+    Les erreurs transitoires (quota dépassé, réseau) sont retentées avec une
+    attente exponentielle ; les autres erreurs sont propagées. Les appels et
+    nouvelles tentatives sont comptés dans `metrics` (RunMetrics) si fourni.
+    """
+    return call_with_retries(lambda: geocoder.geocode(address), limiter, max_retries, backoff, metrics)
+
+
+def call_with_retries(call, limiter=None, max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF,
+                      metrics=None):
+    """Appeler une API (`call` sans argument) sous la limite de débit, avec nouvelles tentatives"""
+    attempt = 0
+    while True:
+        if limiter:
+            limiter.acquire()
+        try:
+            if metrics:
+                metrics.count('api_calls')
+            return call()
+        except Exception as e:
+            if attempt >= max_retries or not is_transient_error(e):
+                raise
+            if metrics:
+                metrics.count('retries')
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random() * 0.25))
+            attempt += 1
+
+
+def iter_geocode(geocoder, addresses, limiter=None, workers=DEFAULT_WORKERS, **retry_options):
+    """Géocoder des adresses en parallèle
+
+    Produit des tuples (index, coordonnées, erreur) dans l'ordre d'achèvement,
+    où coordonnées vaut None si l'adresse est introuvable ou en erreur.
+    `addresses` peut être un itérable quelconque (par exemple alimenté
+    pendant la lecture du fichier) : il n'est parcouru qu'au rythme des
+    réponses, au plus PENDING_PER_WORKER adresses d'avance par thread.
+    """
+    if workers <= 1:
+        for index, address in enumerate(addresses):
+            try:
+                yield index, geocode_address(geocoder, address, limiter, **retry_options), None
+            except Exception as e:
+                yield index, None, e
+        return
+
+    items = enumerate(addresses)
+    futures = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            # Bounded look-ahead: the source is only read as fast as lookups complete
+            for index, address in items:
+                futures[pool.submit(geocode_address, geocoder, address, limiter, **retry_options)] = index
+                if len(futures) >= workers * PENDING_PER_WORKER:
+                    break
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures.pop(future)
+                try:
+                    yield index, future.result(), None
+                except Exception as e:
+                    yield index, None, e
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Mise à jour incrémentale à partir du fichier de zones d'un traitement précédent
+(zones.json ou fichier compact, voir carte_ilotier.zonefile)
+
+Les familles sont comparées par code famille et empreinte de l'adresse
+normalisée : seules les familles nouvelles ou ayant déménagé sont géocodées,
+et les autres conservent si possible leur zone précédente.
+"""
+
+import os
+
+from .geocode_cache import address_hash, normalize_address
+from .zonefile import load_zones
+
+
+def load_previous(filename):
+    """Charger un fichier de zones précédent (zones.json ou compact), retourne None s'il n'existe pas"""
+    if not filename or not os.path.exists(filename):
+        return None
+    try:
+        data = load_zones(filename)
+        return {
+            'ilotiers': data['ilotiers'],
+            'families': {family['family_code']: family for family in data['families']}
+        }
+    except (OSError, ValueError, KeyError, TypeError, EOFError) as e:
+        raise Exception(f"Fichier précédent illisible ({os.path.basename(filename)}) : {str(e)}")
+
+
+def same_ilotiers(ilotier_coords, previous_ilotiers):
+    """Indiquer si les ilotiers (noms, adresses et zones) sont inchangés"""
+    if list(ilotier_coords) != list(previous_ilotiers):
+        return False
+    return all(
+        previous_ilotiers[name].get('zone') == info['zone']
+        and normalize_address(previous_ilotiers[name].get('address', '')) == normalize_address(info['address'])
+        for name, info in ilotier_coords.items()
+    )
+
+
+def reuse_ilotier_coords(ilotier_coords, previous_ilotiers):
+    """Reprendre les coordonnées des ilotiers dont l'adresse n'a pas changé"""
+    for name, info in ilotier_coords.items():
+        previous = previous_ilotiers.get(name)
+        if (previous and previous.get('lat') is not None
+                and normalize_address(previous.get('address', '')) == normalize_address(info['address'])):
+            info['lat'], info['lng'] = previous['lat'], previous['lng']
+
+
+def same_address(family, old):
+    """Indiquer si la famille habite toujours à l'adresse de son enregistrement précédent `old`"""
+    # Compact zone files only keep the hash of the address
+    return (old.get('address_hash') or address_hash(old.get('address'))) == address_hash(family.address)
+
+
+def apply_previous(families, previous):
+    """Reprendre coordonnées et zone des familles inchangées
+
+    Retourne un dict de comptes : added, removed, moved, unchanged. Les
+    familles inchangées reçoivent lat, lng et previous_zone.
+    """
+    report = {'added': 0, 'removed': 0, 'moved': 0, 'unchanged': 0}
+    previous_families = previous['families']
+    seen = set()
+    for family in families:
+        code = family.family_code
+        old = previous_families.get(code)
+        if old is None:
+            report['added'] += 1
+            continue
+        seen.add(code)
+        if not same_address(family, old):
+            report['moved'] += 1
+            continue
+        report['unchanged'] += 1
+        if old.get('lat') is not None:
+            family.lat, family.lng = old['lat'], old['lng']
+            if old.get('zone'):
+                family.previous_zone = old['zone']
+    report['removed'] = len(set(previous_families) - seen)
+    return report
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+Écriture du fichier KML pour Google My Maps
+
+Le document est écrit directement dans le fichier : les familles sont
+parcourues une seule fois et réparties dans un tampon par zone (fichier
+temporaire au-delà de SPOOL_SIZE octets), recopiés ensuite dans l'ordre des
+zones. La mémoire utilisée ne dépend pas de la taille du registre.
+
+Variante KMZ (write_kmz) : KML compact compressé en zip, chaque zone
+découpée en calques d'au plus LAYER_LIMIT familles. Google My Maps n'importe
+qu'un calque par fichier et limite le nombre de points par calque : au-delà
+de cette limite, chaque calque est aussi écrit dans son propre fichier KMZ
+(dossier LAYER_DIR).
+
+Les contours des zones (voir boundaries.py), s'ils sont fournis, forment un
+dossier de polygones placé avant les familles.
+"""
+
+import glob
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+# KML icon per zone (color as aabbggrr, paddle icon), cycled beyond the list
+ZONE_STYLES = [
+    ('ffff0000', 'blu-circle.png'),
+    ('ff0000ff', 'red-circle.png'),
+    ('ff00ffff', 'ylw-circle.png'),
+    ('ff800080', 'purple-circle.png'),
+    ('ff0080ff', 'orange-circle.png'),
+    ('ffffff00', 'ltblu-circle.png'),
+    ('ffff80ff', 'pink-circle.png'),
+    ('ffffffff', 'wht-circle.png'),
+]
+
+SPOOL_SIZE = 1024 * 1024  # Octets gardés en mémoire par zone avant passage sur disque
+LAYER_LIMIT = 2000  # Familles par calque (limite d'import de Google My Maps)
+LAYER_DIR = "zones_calques"
+BOUNDARY_LAYER = "Contours des zones"
+
+HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<kml xmlns="http://www.opengis.net/kml/2.2">
+    <Document>
+        <name>Zones d'urgence</name>
+        <description>Répartition des familles entre ilotiers</description>
+
+'''
+
+ZONE_STYLE = '''        <!-- Style Zone {zone} -->
+        <Style id="zone{zone}">
+            <IconStyle>
+                <color>{color}</color>
+                <scale>0.8</scale>
+                <Icon>
+                    <href>http://maps.google.com/mapfiles/kml/paddle/{icon}</href>
+                </Icon>
+            </IconStyle>
+        </Style>
+
+'''
+
+ILOTIER_STYLE = '''        <!-- Style Ilotier -->
+        <Style id="ilotier">
+            <IconStyle>
+                <color>ff00ff00</color>
+                <scale>1.2</scale>
+                <Icon>
+                    <href>http://maps.google.com/mapfiles/kml/paddle/grn-stars.png</href>
+                </Icon>
+            </IconStyle>
+        </Style>
+
+        <!-- Ilotiers -->
+        <Folder>
+            <name>Ilotiers</name>
+'''
+
+ILOTIER_PLACEMARK = '''            <Placemark>
+                <name>{name}</name>
+                <description>Ilotier Zone {zone}</description>
+                <styleUrl>#ilotier</styleUrl>
+                <Point>
+                    <coordinates>{lng},{lat},0</coordinates>
+                </Point>
+            </Placemark>
+'''
+
+FAMILY_PLACEMARK = '''            <Placemark>
+                <name>{name}</name>
+                <description>{address}
+Distance : {distance:.2f} km</description>
+                <styleUrl>#zone{zone}</styleUrl>
+                <Point>
+                    <coordinates>{lng},{lat},0</coordinates>
+                </Point>
+            </Placemark>
+'''
+
+ZONE_FOLDER = '''
+        <!-- Familles Zone {zone} -->
+        <Folder>
+            <name>Zone {zone}</name>
+'''
+
+FOLDER_END = '''        </Folder>
+'''
+
+BOUNDARY_STYLE = '''        <!-- Style Contour Zone {zone} -->
+        <Style id="contour{zone}">
+            <LineStyle>
+                <color>{color}</color>
+                <width>2</width>
+            </LineStyle>
+            <PolyStyle>
+                <color>{fill}</color>
+            </PolyStyle>
+        </Style>
+
+'''
+
+BOUNDARY_FOLDER = '''
+        <!-- Contours des zones -->
+        <Folder>
+            <name>{name}</name>
+'''
+
+BOUNDARY_PLACEMARK = '''            <Placemark>
+                <name>Zone {zone}</name>
+                <description>{ilotier} - {families} familles</description>
+                <styleUrl>#contour{zone}</styleUrl>
+                <Polygon>
+                    <outerBoundaryIs>
+                        <LinearRing>
+                            <coordinates>{coordinates}</coordinates>
+                        </LinearRing>
+                    </outerBoundaryIs>
+                </Polygon>
+            </Placemark>
+'''
+
+FOOTER = '''    </Document>
+</kml>'''
+
+# Compact templates for KMZ: one line per placemark, styles shared through styleUrl
+COMPACT_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>{name}</name>\n')
+COMPACT_ZONE_STYLE = ('<Style id="zone{zone}"><IconStyle><color>{color}</color><scale>0.8</scale>'
+                      '<Icon><href>http://maps.google.com/mapfiles/kml/paddle/{icon}</href></Icon>'
+                      '</IconStyle></Style>\n')
+COMPACT_ILOTIER_STYLE = ('<Style id="ilotier"><IconStyle><color>ff00ff00</color><scale>1.2</scale>'
+                         '<Icon><href>http://maps.google.com/mapfiles/kml/paddle/grn-stars.png</href></Icon>'
+                         '</IconStyle></Style>\n')
+COMPACT_ILOTIER_PLACEMARK = ('<Placemark><name>{name}</name><description>Ilotier Zone {zone}</description>'
+                             '<styleUrl>#ilotier</styleUrl><Point><coordinates>{lng},{lat}</coordinates>'
+                             '</Point></Placemark>\n')
+COMPACT_FAMILY_PLACEMARK = ('<Placemark><name>{name}</name><description>{address}&#10;Distance : '
+                            '{distance:.2f} km</description><styleUrl>#zone{zone}</styleUrl><Point>'
+                            '<coordinates>{lng:.6f},{lat:.6f}</coordinates></Point></Placemark>\n')
+COMPACT_BOUNDARY_STYLE = ('<Style id="contour{zone}"><LineStyle><color>{color}</color><width>2</width>'
+                          '</LineStyle><PolyStyle><color>{fill}</color></PolyStyle></Style>\n')
+COMPACT_BOUNDARY_PLACEMARK = ('<Placemark><name>Zone {zone}</name><description>{ilotier} - {families} familles'
+                              '</description><styleUrl>#contour{zone}</styleUrl><Polygon><outerBoundaryIs>'
+                              '<LinearRing><coordinates>{coordinates}</coordinates></LinearRing>'
+                              '</outerBoundaryIs></Polygon></Placemark>\n')
+COMPACT_FOLDER = '<Folder><name>{name}</name>\n'
+COMPACT_FOLDER_END = '</Folder>\n'
+COMPACT_FOOTER = '</Document></kml>\n'
+
+
+def zone_style(zone):
+    """Couleur et icône d'une zone"""
+    return ZONE_STYLES[(zone - 1) % len(ZONE_STYLES)]
+
+
+def boundary_fill(zone):
+    """Couleur de remplissage d'un contour : couleur de la zone, semi-transparente"""
+    return '55' + zone_style(zone)[0][2:]
+
+
+def boundary_placemarks(boundaries, template):
+    """Polygones des contours (voir boundaries.zone_boundaries)"""
+    return [template.format(
+        zone=boundary['zone'],
+        ilotier=escape(boundary['ilotier'] or ''),
+        families=boundary['families'],
+        coordinates=' '.join(f"{lng:.6f},{lat:.6f}" for lng, lat in boundary['ring']))
+        for boundary in boundaries]
+
+
+class _ByteCounter:
+    """Fichier texte factice : compte les octets UTF-8 écrits"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text.encode('utf-8'))
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+
+def family_placemark(family):
+    """Placemark d'une famille dans le KML détaillé (write_kml)"""
+    return FAMILY_PLACEMARK.format(
+        name=escape(str(family.family_code)),
+        address=escape(family.address or ''),
+        distance=family.distance or 0,
+        zone=family.zone,
+        lng=family.lng,
+        lat=family.lat)
+
+
+def write_kml(families, ilotier_coords, output_file, boundaries=None):
+    """Écrire le fichier KML : styles, ilotiers, contours des zones puis un dossier de familles par zone"""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        _write_kml(f, families, ilotier_coords, boundaries)
+
+
+def _write_kml(f, families, ilotier_coords, boundaries=None):
+    zones = sorted(info['zone'] for info in ilotier_coords.values())
+
+    buffers = {zone: tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', encoding='utf-8')
+               for zone in zones}
+    try:
+        # Single pass over the families, each placemark goes to its zone buffer
+        for family in families:
+            buffer = buffers.get(family.zone)
+            if buffer is None or not family.lat:
+                continue
+            buffer.write(family_placemark(family))
+
+        f.write(HEADER)
+        for zone in zones:
+            color, icon = zone_style(zone)
+            f.write(ZONE_STYLE.format(zone=zone, color=color, icon=icon))
+            if boundaries:
+                f.write(BOUNDARY_STYLE.format(zone=zone, color=color, fill=boundary_fill(zone)))
+        f.write(ILOTIER_STYLE)
+        for name, coords in ilotier_coords.items():
+            f.write(ILOTIER_PLACEMARK.format(name=escape(name), zone=coords['zone'],
+                                             lng=coords['lng'], lat=coords['lat']))
+        f.write(FOLDER_END)
+
+        if boundaries:
+            f.write(BOUNDARY_FOLDER.format(name=BOUNDARY_LAYER))
+            f.writelines(boundary_placemarks(boundaries, BOUNDARY_PLACEMARK))
+            f.write(FOLDER_END)
+
+        for zone in zones:
+            f.write(ZONE_FOLDER.format(zone=zone))
+            buffer = buffers[zone]
+            buffer.seek(0)
+            shutil.copyfileobj(buffer, f)
+            f.write(FOLDER_END)
+        f.write(FOOTER)
+    finally:
+        for buffer in buffers.values():
+            buffer.close()
+
+
+def layer_name(zone, part, parts):
+    """Nom d'un calque : « Zone 1 », ou « Zone 1 (2/3) » si la zone est découpée"""
+    return f"Zone {zone}" if parts == 1 else f"Zone {zone} ({part}/{parts})"
+
+
+def write_kmz(families, ilotier_coords, output_file, layer_limit=LAYER_LIMIT, boundaries=None):
+    """Écrire le fichier KMZ, zones découpées en calques d'au plus `layer_limit` familles
+
+    Retourne un dict : layers (noms des calques), layer_files (un KMZ par
+    calque, écrits seulement si le nombre de familles dépasse `layer_limit`,
+    plus un calque des contours des zones), kml_bytes (taille du KML compact
+    non compressé), verbose_kml_bytes (taille du fichier qu'aurait écrit
+    write_kml, pour mesurer le gain du KMZ) et kmz_bytes.
+    """
+    if layer_limit < 1:
+        raise Exception("La limite de familles par calque doit être d'au moins 1")
+    zones = sorted(info['zone'] for info in ilotier_coords.values())
+    counts = dict.fromkeys(zones, 0)
+    buffers = {zone: tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', encoding='utf-8')
+               for zone in zones}
+    # Size of write_kml's output: its document without families, plus their placemarks
+    verbose = _ByteCounter()
+    _write_kml(verbose, [], ilotier_coords, boundaries)
+    try:
+        # Single pass over the families, one line per placemark in its zone buffer
+        for family in families:
+            buffer = buffers.get(family.zone)
+            if buffer is None or not family.lat:
+                continue
+            buffer.write(COMPACT_FAMILY_PLACEMARK.format(
+                name=escape(str(family.family_code)),
+                address=escape(' '.join((family.address or '').split())),
+                distance=family.distance or 0,
+                zone=family.zone,
+                lng=family.lng,
+                lat=family.lat))
+            verbose.write(family_placemark(family))
+            counts[family.zone] += 1
+
+        styles = COMPACT_ILOTIER_STYLE + ''.join(
+            COMPACT_ZONE_STYLE.format(zone=zone, color=zone_style(zone)[0], icon=zone_style(zone)[1])
+            for zone in zones)
+        if boundaries:
+            styles += ''.join(
+                COMPACT_BOUNDARY_STYLE.format(zone=zone, color=zone_style(zone)[0], fill=boundary_fill(zone))
+                for zone in zones)
+        ilotiers = {zone: [] for zone in zones}
+        for name, coords in ilotier_coords.items():
+            ilotiers[coords['zone']].append(COMPACT_ILOTIER_PLACEMARK.format(
+                name=escape(name), zone=coords['zone'], lng=coords['lng'], lat=coords['lat']))
+
+        # Layers left by a previous, larger run would be imported by mistake,
+        # even when this run writes none
+        layer_dir = os.path.join(os.path.dirname(output_file), LAYER_DIR)
+        for old_file in glob.glob(os.path.join(layer_dir, '*.kmz')):
+            os.remove(old_file)
+        if sum(counts.values()) > layer_limit:
+            os.makedirs(layer_dir, exist_ok=True)
+        else:
+            layer_dir = None
+
+        result = {'layers': [], 'layer_files': []}
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as kmz:
+            with kmz.open('doc.kml', 'w') as raw:
+                f = io.TextIOWrapper(raw, encoding='utf-8')
+                f.write(COMPACT_HEADER.format(name="Zones d'urgence"))
+                f.write(styles)
+                f.write(COMPACT_FOLDER.format(name="Ilotiers"))
+                for zone in zones:
+                    f.writelines(ilotiers[zone])
+                f.write(COMPACT_FOLDER_END)
+
+                if boundaries:
+                    contours = boundary_placemarks(boundaries, COMPACT_BOUNDARY_PLACEMARK)
+                    f.write(COMPACT_FOLDER.format(name=BOUNDARY_LAYER))
+                    f.writelines(contours)
+                    f.write(COMPACT_FOLDER_END)
+                    result['layers'].append(BOUNDARY_LAYER)
+                    if layer_dir:
+                        layer_file = os.path.join(layer_dir, "contours.kmz")
+                        _write_layer(layer_file, BOUNDARY_LAYER, styles, [], contours)
+                        result['layer_files'].append(layer_file)
+
+                for zone in zones:
+                    parts = max(1, -(-counts[zone] // layer_limit))
+                    buffer = buffers[zone]
+                    buffer.seek(0)
+                    for part in range(1, parts + 1):
+                        name = layer_name(zone, part, parts)
+                        placemarks = list(itertools.islice(buffer, layer_limit))
+                        f.write(COMPACT_FOLDER.format(name=escape(name)))
+                        f.writelines(placemarks)
+                        f.write(COMPACT_FOLDER_END)
+                        result['layers'].append(name)
+                        if layer_dir:
+                            layer_file = os.path.join(layer_dir, f"zone{zone}_{part:0{len(str(parts))}d}.kmz")
+                            _write_layer(layer_file, name, styles, ilotiers[zone], placemarks)
+                            result['layer_files'].append(layer_file)
+                f.write(COMPACT_FOOTER)
+                f.flush()
+                f.detach()
+            result['kml_bytes'] = kmz.getinfo('doc.kml').file_size
+        result['kmz_bytes'] = os.path.getsize(output_file)
+        result['verbose_kml_bytes'] = verbose.size
+        return result
+    finally:
+        for buffer in buffers.values():
+            buffer.close()
+
+
+def _write_layer(filename, name, styles, ilotiers, placemarks):
+    """KMZ d'un seul calque : styles, ilotier de la zone et familles"""
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as kmz:
+        kmz.writestr('doc.kml', ''.join(
+            [COMPACT_HEADER.format(name=escape(name)), styles] + ilotiers + placemarks + [COMPACT_FOOTER]))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Journal d'exécution partagé entre threads
+
+Les messages sont déposés dans une file par n'importe quel thread et lus par
+lots par l'interface. Le journal complet peut aussi être écrit dans un
+fichier avec rotation.
+"""
+
+import logging
+import os
+import queue
+from collections import namedtuple
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+LOG_BATCH_SIZE = 5000  # Messages lus au plus par lot
+
+LogRecord = namedtuple('LogRecord', ['created', 'level', 'message'])
+
+
+def format_record(record):
+    """Ligne affichée pour un message : [HH:MM:SS] message"""
+    return f"[{record.created.strftime('%H:%M:%S')}] {record.message}"
+
+
+def open_log_file(filename, max_bytes=LOG_FILE_MAX_BYTES, backups=LOG_FILE_BACKUPS):
+    """Journal écrit dans `filename`, remplacé par un nouveau fichier au-delà de `max_bytes`"""
+    filename = os.path.abspath(os.path.expanduser(filename))
+    logger = logging.getLogger(f"carte_ilotier.journal.{filename}")
+    if not logger.handlers:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class LogQueue:
+    """File de messages alimentée par les threads de traitement
+
+    S'utilise comme fonction de journal : log_queue(message[, niveau]).
+    """
+
+    def __init__(self, log_file=None):
+        self.records = queue.SimpleQueue()
+        self.file_logger = open_log_file(log_file) if log_file else None
+
+    def __call__(self, message, level=logging.INFO):
+        self.records.put(LogRecord(datetime.now(), level, message))
+        if self.file_logger:
+            self.file_logger.log(level, message)
+
+    def drain(self, limit=LOG_BATCH_SIZE):
+        """Retirer et retourner les messages en attente (au plus `limit`)"""
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.records.get_nowait())
+            except queue.Empty:
+                break
+        return batch
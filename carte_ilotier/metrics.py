@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Mesures d'un traitement : durée de chaque étape et compteurs
+
+Le rapport est écrit en JSON à côté des fichiers de sortie. Deux modes de
+capture optionnels permettent d'aller plus loin sur un traitement lent :
+- 'cprofile' : profil complet des appels (fichier .pstats + fonctions les plus coûteuses)
+- 'tracemalloc' : pic de mémoire par étape et principales allocations
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+PROFILE_TOP = 20  # Functions or allocation sites listed in the report
+
+
+class RunMetrics:
+    """Durées des étapes et compteurs d'un traitement (compteurs partagés entre threads)"""
+
+    def __init__(self, profile=None):
+        if profile not in (None,) + PROFILE_MODES:
+            raise Exception(f"Mode de profilage inconnu : {profile}")
+        self.profile = profile
+        self.started = datetime.now()
+        self.stages = []
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._profiler = None
+        self._allocations = None
+
+    def count(self, name, value=1):
+        """Incrémenter un compteur"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def stage(self, name):
+        """Mesurer une étape ; le dict produit peut recevoir des valeurs propres à l'étape"""
+        record = {'name': name}
+        if self.profile == 'tracemalloc' and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 4)
+            if self.profile == 'tracemalloc' and tracemalloc.is_tracing():
+                record['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            self.stages.append(record)
+
+    def start_profile(self):
+        """Démarrer la capture demandée (à appeler avant la première étape)"""
+        if self.profile == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif self.profile == 'tracemalloc' and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop_profile(self, output_dir=None):
+        """Arrêter la capture ; le profil cProfile est écrit dans `output_dir`"""
+        if self._profiler:
+            self._profiler.disable()
+            if output_dir is not None:
+                self._profiler.dump_stats(os.path.join(output_dir, 'profil.pstats'))
+        elif self.profile == 'tracemalloc' and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self._allocations = [
+                {'site': str(stat.traceback[0]), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:PROFILE_TOP]
+            ]
+
+    def report(self):
+        """Rapport sous forme de dict sérialisable en JSON"""
+        report = {
+            'started': self.started.isoformat(timespec='seconds'),
+            'total_seconds': round(time.perf_counter() - self._start, 4),
+            'stages': self.stages,
+            'counters': dict(self.counters)
+        }
+        if self._profiler:
+            stream = io.StringIO()
+            pstats.Stats(self._profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            report['cprofile'] = stream.getvalue().splitlines()
+        if self._allocations is not None:
+            report['tracemalloc'] = self._allocations
+        return report
+
+    def save(self, filename):
+        """Écrire le rapport JSON"""
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
@@ -0,0 +1,933 @@
+# -*- coding: utf-8 -*-
+"""
+Chaîne de traitement sans interface graphique :
+chargement -> géocodage -> équilibrage -> sauvegarde
+"""
+
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from .assignment import balanced_assignment, zone_capacities, zone_minimums
+from .boundaries import BOUNDARIES_FILE, write_geojson, zone_boundaries
+from .canonical import AddressVariants, canonical_address
+from .checkpoint import GeocodeCheckpoint, checkpoint_path
+from .distances import distance_matrix, haversine
+from .geocoding import (TokenBucket, geocode_address, group_by_address, iter_geocode,
+                        DEFAULT_REQUESTS_PER_SECOND, DEFAULT_BURST, DEFAULT_WORKERS)
+from .families import Family
+from .incremental import apply_previous, load_previous, reuse_ilotier_coords, same_address, same_ilotiers
+from .kml import LAYER_LIMIT, write_kml, write_kmz
+from .metrics import RunMetrics
+from .refine import refine_assignment
+from .sources import iter_rows, read_headers
+from .spatial import IlotierIndex
+from .travel import travel_times
+from .zonefile import latest_zones_file, write_zones, zones_filename
+
+METRICS_FILE = "metriques.json"
+ADDRESS_REPORT_FILE = "adresses_regroupees.csv"
+MAP_FORMATS = ('kml', 'kmz')
+
+# Beyond this many ilotiers, only the nearest ones are considered for each family
+DENSE_MAX_ILOTIERS = 16
+NEAREST_CANDIDATES = 12  # Doubled while the balance cannot be met within them
+
+UNREACHABLE_FACTOR = 10  # A pair without route costs this many times the longest travel time
+
+STREAM_QUEUE_SIZE = 1000  # Addresses read ahead of geocoding, the reader waits beyond
+
+
+def print_log(message):
+    """Journal par défaut : affichage horodaté sur la sortie standard"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] {message}", flush=True)
+
+
+class ZonePipeline:
+    """Traitement complet d'un fichier du registre consulaire"""
+
+    def __init__(self, log=None, geocoding_settings=None, profile=None, limiter=None, zones_format='json',
+                 map_format='kml', layer_limit=LAYER_LIMIT, boundaries=True, travel_service=None,
+                 travel_cache=None, refine_time=None, overlap=True):
+        self.log = log or print_log
+        
+        # Zone file written: zones.json or a compact file, see carte_ilotier.zonefile
+        zones_filename(zones_format)  # Unknown formats fail before any work
+        self.zones_format = zones_format
+        
+        # Map written: zones.kml, or zones.kmz split into layers of layer_limit families
+        if map_format not in MAP_FORMATS:
+            raise Exception(f"Format de carte inconnu : {map_format}")
+        self.map_format = map_format
+        self.layer_limit = layer_limit
+        
+        # Zone boundary polygons: GeoJSON file and map layer, see carte_ilotier.boundaries
+        self.boundaries = boundaries
+        
+        # Stage timings and counters of the current run, see carte_ilotier.metrics
+        self.profile = profile
+        self.metrics = RunMetrics()
+        
+        # Geocoding throughput
+        self.geocoding_settings = {
+            'requests_per_second': DEFAULT_REQUESTS_PER_SECOND,
+            'burst': DEFAULT_BURST,
+            'workers': DEFAULT_WORKERS
+        }
+        self.geocoding_settings.update(geocoding_settings or {})
+        
+        # Rate limiter shared with other pipelines (batch mode), None = one per run
+        self.limiter = limiter
+        
+        # Balance on travel time instead of distance, see carte_ilotier.travel
+        self.travel_service = travel_service
+        self.travel_cache = travel_cache
+        
+        # Local search shortening the longest trips, time budget in seconds (None = off)
+        self.refine_time = refine_time
+        
+        # Geocode families while the file is being read, see load_and_geocode_families
+        self.overlap = overlap
+        
+        # Spellings of each geocoded address, see carte_ilotier.canonical
+        self.address_variants = AddressVariants()
+        
+    def run(self, input_file, ilotiers, geocoder, output_dir=None, cache=None,
+            weights=None, capacities=None, incremental=False, resume=True):
+        """Exécuter toutes les étapes sur un fichier
+
+        `geocoder` est un service de carte_ilotier.geocoders ; `weights` et
+        `capacities` (par nom d'ilotier) règlent l'équilibrage. Avec
+        `incremental`, le fichier de zones du dossier de sortie est réutilisé. Avec
+        `resume`, le géocodage reprend le point de reprise laissé par un
+        traitement interrompu du même fichier (voir carte_ilotier.checkpoint).
+        Retourne un dict avec les familles, les ilotiers géocodés et la liste
+        des fichiers générés.
+        """
+        self.log(f"Début du traitement : {os.path.basename(input_file)}")
+        if output_dir is None:
+            output_dir = os.path.dirname(input_file)
+        
+        # Only paid lookups are worth caching
+        if not geocoder.cacheable:
+            cache = None
+            
+        # Paid lookups are checkpointed until the run completes
+        checkpoint = None
+        if geocoder.cacheable:
+            checkpoint = GeocodeCheckpoint(checkpoint_path(input_file), geocoder.name, resume,
+                                           os.path.basename(input_file))
+            if len(checkpoint):
+                self.log(f"Reprise d'un traitement interrompu : {len(checkpoint)} adresses déjà géocodées")
+        
+        self.metrics = RunMetrics(self.profile)
+        self.metrics.start_profile()
+        self.address_variants = AddressVariants()
+        try:
+            # Previous run, if any
+            previous = None
+            if incremental:
+                previous = load_previous(latest_zones_file(output_dir))
+                if previous is None:
+                    self.log("Aucun traitement précédent dans le dossier de sortie : traitement complet")
+            
+            # Geocode ilotiers
+            with self.metrics.stage('geocode_ilotiers'):
+                ilotier_coords = self.geocode_ilotiers(geocoder, ilotiers, cache,
+                                                       previous['ilotiers'] if previous else None)
+            
+            if self.overlap:
+                # Load and geocode families at the same time (only new or moved ones after a previous run)
+                with self.metrics.stage('load_geocode') as stage:
+                    families, results = self.load_and_geocode_families(input_file, geocoder, cache,
+                                                                       checkpoint, previous, stage)
+                self.log(f"Chargé {len(families)} familles du CSV")
+                if previous:
+                    self.apply_previous_run(families, ilotier_coords, previous)
+                errors = self.apply_geocode_results(
+                    [family for family in families if family.lat is None], results)
+            else:
+                # Load and process data
+                with self.metrics.stage('load'):
+                    families = self.load_families_from_csv(input_file)
+                self.log(f"Chargé {len(families)} familles du CSV")
+                
+                if previous:
+                    self.apply_previous_run(families, ilotier_coords, previous)
+                
+                # Geocode families (only new or moved ones after a previous run)
+                with self.metrics.stage('geocode_families'):
+                    errors = self.geocode_families([family for family in families if family.lat is None],
+                                                   geocoder, cache, checkpoint)
+            if cache is not None:
+                self.log(f"  {cache.stats_message()}")
+            self.report_approximate(families, geocoder)
+            
+            # Apply balance algorithm
+            with self.metrics.stage('balance'):
+                self.apply_balance_algorithm(families, ilotier_coords, weights, capacities)
+            
+            # Save outputs
+            output_files = self.save_outputs(families, ilotier_coords, input_file, output_dir)
+        except Exception:
+            self.metrics.stop_profile()
+            raise
+            
+        if checkpoint is not None and errors:
+            self.log(f"Point de reprise conservé : relancer le traitement pour géocoder "
+                     f"les {errors} adresses en erreur")
+        elif checkpoint is not None:
+            checkpoint.remove()
+            
+        # Metrics report next to the outputs
+        self.metrics.stop_profile(output_dir)
+        metrics_file = os.path.join(output_dir, METRICS_FILE)
+        self.metrics.save(metrics_file)
+        output_files.append(metrics_file)
+        self.log(f"Rapport de mesures sauvegardé : {METRICS_FILE}")
+        
+        return {
+            'families': families,
+            'ilotiers': ilotier_coords,
+            'output_files': output_files
+        }
+        
+    def load_families_from_csv(self, filename):
+        """Charger les familles depuis le fichier CSV ou Excel"""
+        families_dict = {}
+        
+        rows_read = 0
+        for row_index, row in enumerate(iter_rows(filename)):
+            self.process_family_row(row, families_dict, row_index)
+            rows_read += 1
+        self.metrics.count('rows_read', rows_read)
+        self.metrics.count('families', len(families_dict))
+                    
+        return list(families_dict.values())
+        
+    def process_family_row(self, row, families_dict, row_index=None):
+        """Traiter une ligne de données famille
+
+        Retourne la famille si la ligne est celle de sa personne de contact
+        (la famille est alors complète), sinon None.
+        """
+        family_code = row.get('Famille', '').strip()
+        if not family_code or family_code == 'None':
+            return
+            
+        # Skip invalid family codes (example for German families)
+        # You can customize this list based on your needs
+        if family_code in ['2165915', '2192050']:
+            return
+            
+        # Build address
+        address_parts = []
+        if row.get('Adresse postale') and row.get('Adresse postale') != 'None':
+            address_parts.append(row['Adresse postale'].strip())
+        if row.get('Code postal de résidence') and row.get('Code postal de résidence') != 'None':
+            address_parts.append(row['Code postal de résidence'].strip())
+        if row.get('Ville de residence') and row.get('Ville de residence') != 'None':
+            address_parts.append(row['Ville de residence'].strip())
+            
+        address = ', '.join(address_parts)
+        
+        # Get contact info
+        is_main = row.get('Personne lien (O/N)', '') == 'O'
+        
+        # Store or update family
+        if family_code not in families_dict or is_main:
+            prenom = row.get('Prénoms', '')
+            nom = row.get('Nom de famille', '')
+            if prenom == 'None': prenom = ''
+            if nom == 'None': nom = ''
+            
+            families_dict[family_code] = Family(
+                family_code,
+                address,
+                contact_name=f"{prenom} {nom}".strip(),
+                mobile=row.get('Mobile perso', '').strip() if row.get('Mobile perso') != 'None' else '',
+                phone=row.get('Téléphone perso', '').strip() if row.get('Téléphone perso') != 'None' else '',
+                email=row.get('Adresse électronique 2 (Usage communication consulaire et vote électronique)', '').strip() if row.get('Adresse électronique 2 (Usage communication consulaire et vote électronique)') != 'None' else '',
+                row_index=row_index
+            )
+        return families_dict[family_code] if is_main else None
+        
+    def apply_previous_run(self, families, ilotier_coords, previous):
+        """Reprendre les résultats du traitement précédent pour les familles inchangées"""
+        report = apply_previous(families, previous)
+        self.log(f"Mise à jour incrémentale : {report['added']} nouvelles familles, "
+                 f"{report['removed']} retirées, {report['moved']} ont déménagé, "
+                 f"{report['unchanged']} inchangées")
+        
+        # Previous zones are only meaningful with the same ilotiers
+        if not same_ilotiers(ilotier_coords, previous['ilotiers']):
+            self.log("  Ilotiers modifiés : toutes les zones sont recalculées")
+            for family in families:
+                family.previous_zone = None
+        return report
+        
+    def geocode_ilotiers(self, geocoder, ilotiers, cache=None, previous_ilotiers=None):
+        """Géocoder les adresses des ilotiers
+
+        `ilotiers` est une liste de couples (nom, adresse), la zone de chaque
+        ilotier correspondant à sa position dans la liste. Les coordonnées de
+        `previous_ilotiers` sont reprises si l'adresse n'a pas changé.
+        """
+        self.log("Géocodage des ilotiers...")
+        
+        ilotier_coords = {}
+        for zone, (name, address) in enumerate(ilotiers, start=1):
+            if name in ilotier_coords:
+                raise Exception(f"Nom d'ilotier en double : {name}")
+            ilotier_coords[name] = {
+                'address': address,
+                'zone': zone
+            }
+        
+        if previous_ilotiers:
+            reuse_ilotier_coords(ilotier_coords, previous_ilotiers)
+        
+        for name, info in ilotier_coords.items():
+            if info.get('lat') is not None:
+                self.log(f"  {name} : {info['lat']:.6f}, {info['lng']:.6f} (traitement précédent)")
+                continue
+            key = canonical_address(info['address'])
+            cached = cache.get(key) if cache is not None else None
+            if cached:
+                info['lat'], info['lng'] = cached
+                self.metrics.count('cache_hits')
+                self.log(f"  {name} : {info['lat']:.6f}, {info['lng']:.6f} (cache)")
+                continue
+            if cache is not None:
+                self.metrics.count('cache_misses')
+                
+            try:
+                coords = geocode_address(geocoder, info['address'],
+                                         self.limiter if geocoder.rate_limited else None,
+                                         metrics=self.metrics)
+                if coords:
+                    info['lat'], info['lng'] = coords
+                    if cache is not None:
+                        cache.put(key, info['lat'], info['lng'])
+                    self.log(f"  {name} : {info['lat']:.6f}, {info['lng']:.6f}")
+                else:
+                    raise Exception(f"Impossible de géocoder l'adresse de {name}")
+            except Exception as e:
+                raise Exception(f"Erreur lors du géocodage de {name}: {str(e)}")
+                
+        return ilotier_coords
+        
+    def geocode_families(self, families, geocoder, cache=None, checkpoint=None):
+        """Géocoder les adresses des familles
+
+        Les adresses présentes dans `checkpoint` ne sont pas géocodées à
+        nouveau, et chaque nouveau résultat y est enregistré. Retourne le
+        nombre d'adresses en erreur (quota épuisé, réseau...).
+        """
+        self.log(f"Géocodage de {len(families)} familles...")
+        
+        # One lookup per distinct address (canonical key)
+        groups = list(group_by_address(families, self.address_variants).items())
+        saved = len(families) - len(groups)
+        self.metrics.count('distinct_addresses', len(groups))
+        if saved:
+            self.log(f"  {len(groups)} adresses distinctes ({saved} appels API économisés)")
+        self.report_address_variants()
+        
+        # Resolve from the checkpoint and the cache first
+        pending = []
+        resumed = 0
+        for key, members in groups:
+            cached = checkpoint.get(key) if checkpoint is not None else None
+            if cached:
+                resumed += 1
+            elif cache is not None:
+                cached = cache.get(key)
+            if cached:
+                for family in members:
+                    family.lat, family.lng = cached
+            else:
+                pending.append((key, members))
+        if resumed:
+            self.metrics.count('resumed', resumed)
+            self.log(f"  {resumed} adresses reprises du point de reprise")
+        if cache is not None:
+            self.metrics.count('cache_hits', len(groups) - len(pending) - resumed)
+            self.metrics.count('cache_misses', len(pending))
+                
+        # Rate limit and parallelize only remote services
+        settings = self.geocoding_settings
+        if geocoder.rate_limited:
+            limiter = self.limiter or TokenBucket(settings['requests_per_second'], settings['burst'])
+            workers = settings['workers']
+        else:
+            limiter = None
+            workers = 1
+        addresses = [members[0].address for key, members in pending]
+        errors = 0
+        
+        try:
+            for done, (index, coords, error) in enumerate(
+                    iter_geocode(geocoder, addresses, limiter, workers, metrics=self.metrics), start=1):
+                key, members = pending[index]
+                if coords and cache is not None:
+                    cache.put(key, coords[0], coords[1])
+                if coords and checkpoint is not None:
+                    checkpoint.add(key, coords[0], coords[1])
+                if error:
+                    errors += 1
+                self.set_family_coords(members, coords, error)
+                        
+                if done % 50 == 0:
+                    self.log(f"  Progression : {done}/{len(pending)}")
+                
+        finally:
+            # Keep what was resolved even if geocoding stops halfway
+            if checkpoint is not None:
+                checkpoint.save()
+            
+        self.log(f"  Géocodage terminé")
+        return errors
+        
+    def set_family_coords(self, members, coords, error=None):
+        """Reporter le résultat du géocodage d'une adresse sur les familles qui la partagent"""
+        if not coords:
+            self.metrics.count('failures', len(members))
+        for family in members:
+            if coords:
+                family.lat, family.lng = coords
+            else:
+                family.lat = None
+                family.lng = None
+                if error:
+                    self.log(f"  ⚠ Erreur pour {family.family_code}: {str(error)}")
+                else:
+                    self.log(f"  ⚠ Impossible de géocoder : {family.family_code}")
+        
+    def load_and_geocode_families(self, filename, geocoder, cache=None, checkpoint=None, previous=None,
+                                  stage=None):
+        """Charger les familles et géocoder leurs adresses pendant la lecture
+
+        Un thread lit le fichier et place l'adresse de chaque famille complète
+        (dès la ligne de sa personne de contact, les autres en fin de fichier)
+        dans une file bornée à STREAM_QUEUE_SIZE adresses : le géocodage
+        commence sans attendre la fin de la lecture, et la lecture attend si
+        le géocodage prend du retard. Les familles inchangées depuis
+        `previous` ne sont pas géocodées. Retourne la liste des familles et un
+        dict adresse normalisée -> (coordonnées, erreur), à appliquer avec
+        apply_geocode_results. La durée de lecture est notée dans `stage`.
+        """
+        self.log("Lecture du fichier et géocodage des familles...")
+        addresses = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        stop = threading.Event()
+        loaded = {'families': [], 'error': None}
+        previous_families = previous['families'] if previous else {}
+        
+        def put(address):
+            # Wait while the queue is full, unless geocoding has stopped
+            while not stop.is_set():
+                try:
+                    addresses.put(address, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+        
+        def read():
+            start = time.perf_counter()
+            submitted = set()
+            
+            def submit(family):
+                old = previous_families.get(family.family_code)
+                if old and old.get('lat') is not None and same_address(family, old):
+                    return
+                key = self.address_variants.add(family.address)
+                if key not in submitted:
+                    submitted.add(key)
+                    put((key, family.address))
+            
+            try:
+                families_dict = {}
+                complete = set()
+                rows_read = 0
+                for row_index, row in enumerate(iter_rows(filename)):
+                    if stop.is_set():
+                        return
+                    family = self.process_family_row(row, families_dict, row_index)
+                    if family is not None:
+                        complete.add(family.family_code)
+                        submit(family)
+                    rows_read += 1
+                # Families without a contact person are complete at the end of the file
+                for code, family in families_dict.items():
+                    if code not in complete:
+                        submit(family)
+                self.metrics.count('rows_read', rows_read)
+                self.metrics.count('families', len(families_dict))
+                self.metrics.count('distinct_addresses', len(submitted))
+                loaded['families'] = list(families_dict.values())
+            except Exception as e:
+                loaded['error'] = e
+            finally:
+                if stage is not None:
+                    stage['load_seconds'] = round(time.perf_counter() - start, 4)
+                put(None)
+        
+        # Addresses to look up, in reading order: checkpoint and cache first
+        pending = []
+        found = {'resumed': 0, 'cached': 0}
+        results = {}
+        
+        def lookups():
+            while True:
+                item = addresses.get()
+                if item is None:
+                    return
+                key, address = item
+                cached = checkpoint.get(key) if checkpoint is not None else None
+                if cached:
+                    found['resumed'] += 1
+                elif cache is not None:
+                    cached = cache.get(key)
+                    if cached:
+                        found['cached'] += 1
+                if cached:
+                    results[key] = (cached, None)
+                    continue
+                pending.append(item)
+                yield address
+        
+        # Rate limit and parallelize only remote services
+        settings = self.geocoding_settings
+        if geocoder.rate_limited:
+            limiter = self.limiter or TokenBucket(settings['requests_per_second'], settings['burst'])
+            workers = settings['workers']
+        else:
+            limiter = None
+            workers = 1
+        
+        reader = threading.Thread(target=read, daemon=True)
+        reader.start()
+        try:
+            for done, (index, coords, error) in enumerate(
+                    iter_geocode(geocoder, lookups(), limiter, workers, metrics=self.metrics), start=1):
+                key, address = pending[index]
+                if coords and cache is not None:
+                    cache.put(key, coords[0], coords[1])
+                if coords and checkpoint is not None:
+                    checkpoint.add(key, coords[0], coords[1])
+                results[key] = (coords, error)
+                if done % 50 == 0:
+                    self.log(f"  Progression : {done} adresses géocodées")
+        finally:
+            # Keep what was resolved even if geocoding stops halfway
+            stop.set()
+            reader.join()
+            if checkpoint is not None:
+                checkpoint.save()
+        if loaded['error']:
+            raise loaded['error']
+        
+        if found['resumed']:
+            self.metrics.count('resumed', found['resumed'])
+            self.log(f"  {found['resumed']} adresses reprises du point de reprise")
+        if cache is not None:
+            self.metrics.count('cache_hits', found['cached'])
+            self.metrics.count('cache_misses', len(pending))
+        self.log(f"  {len(results)} adresses distinctes, {len(pending)} géocodées")
+        self.report_address_variants()
+        return loaded['families'], results
+        
+    def report_address_variants(self):
+        """Compter et signaler les écritures différentes regroupées sous une même adresse"""
+        merged = self.address_variants.merged()
+        if merged:
+            self.metrics.count('address_variants_merged', merged)
+            self.log(f"  {merged} écritures différentes d'une même adresse regroupées "
+                     f"({len(self.address_variants.collapsed)} adresses, voir {ADDRESS_REPORT_FILE})")
+        
+    def report_approximate(self, families, geocoder):
+        """Signaler les familles placées au centre de leur code postal ou de leur ville (référentiel hors ligne)"""
+        approximate = getattr(geocoder, 'approximate', None)
+        if not approximate:
+            return
+        placed = 0
+        for family in families:
+            level = approximate.get(canonical_address(family.address))
+            if level and family.lat is not None:
+                placed += 1
+                self.log(f"  ⚠ Adresse introuvable, placée au centre ({level}) : {family.family_code}")
+        if placed:
+            self.metrics.count('approximate', placed)
+            self.log(f"  {placed} familles placées au centre de leur code postal ou de leur ville")
+        
+    def apply_geocode_results(self, families, results):
+        """Reporter les résultats de load_and_geocode_families sur les familles
+
+        Retourne le nombre d'adresses en erreur (quota épuisé, réseau...).
+        """
+        errors = 0
+        for key, members in group_by_address(families).items():
+            coords, error = results.get(key, (None, None))
+            if error:
+                errors += 1
+            self.set_family_coords(members, coords, error)
+        self.log(f"  Géocodage terminé")
+        return errors
+        
+    def calculate_distance(self, lat1, lng1, lat2, lng2):
+        """Calculer la distance entre deux points (formule Haversine)"""
+        return haversine(lat1, lng1, lat2, lng2)
+        
+    def apply_balance_algorithm(self, families, ilotier_coords, weights=None, capacities=None):
+        """Appliquer l'algorithme d'équilibrage des zones
+
+        Affectation de distance totale minimale, chaque ilotier recevant une
+        part proportionnelle à son poids (1 par défaut), bornée par sa
+        capacité éventuelle. `weights` et `capacities` sont indexés par nom.
+        Les familles ayant une zone précédente (previous_zone) y restent autant que possible.
+        Avec un service de temps de trajet, c'est le temps de trajet total qui
+        est minimisé ; les distances restent calculées pour les fichiers de sortie.
+        """
+        self.log("Application de l'algorithme d'équilibrage...")
+        
+        ilotier_names = list(ilotier_coords.keys())
+        weights = weights or {}
+        capacities = capacities or {}
+        
+        valid_families = [family for family in families if family.lat is not None]
+        total = len(valid_families)
+        if not total:
+            self.log("  Aucune famille géocodée")
+            return
+            
+        ilotier_lats = [ilotier_coords[name]['lat'] for name in ilotier_names]
+        ilotier_lngs = [ilotier_coords[name]['lng'] for name in ilotier_names]
+        candidates = NEAREST_CANDIDATES if len(ilotier_names) > DENSE_MAX_ILOTIERS else None
+        matrix, rows = self.distance_rows(valid_families, ilotier_lats, ilotier_lngs, candidates)
+        costs = rows
+        if self.travel_service:
+            costs = self.travel_time_rows(valid_families, ilotier_lats, ilotier_lngs, rows)
+            matrix = costs
+        
+        # Natural assignment (nearest ilotier)
+        natural_counts = [0] * len(ilotier_names)
+        for family, row in zip(valid_families, costs):
+            nearest = min(self.zones_of(row), key=row.__getitem__)
+            family.natural_zone = nearest + 1
+            natural_counts[nearest] += 1
+            
+        self.log(f"  Répartition naturelle : {self.format_zone_counts(natural_counts)}")
+        
+        # Optimal assignment under the balance constraints
+        zone_weights = [weights.get(name, 1) for name in ilotier_names]
+        zone_limits = [capacities.get(name) for name in ilotier_names]
+        zone_caps = zone_capacities(total, zone_weights, zone_limits)
+        zone_mins = zone_minimums(total, zone_weights, zone_limits)
+        assignment = balanced_assignment(self.churn_costs(valid_families, matrix, costs), zone_caps,
+                                         minimums=zone_mins)
+        while assignment is None:
+            # Balance needs moves beyond the nearest ilotiers: widen the candidates
+            candidates *= 2
+            if candidates >= len(ilotier_names):
+                candidates = None
+            self.log(f"  Ilotiers proches insuffisants : calcul sur {candidates or 'tous les'} ilotiers")
+            matrix, rows = self.distance_rows(valid_families, ilotier_lats, ilotier_lngs, candidates)
+            costs = rows
+            if self.travel_service:
+                costs = self.travel_time_rows(valid_families, ilotier_lats, ilotier_lngs, rows)
+                matrix = costs
+            assignment = balanced_assignment(self.churn_costs(valid_families, matrix, costs), zone_caps,
+                                             minimums=zone_mins)
+        
+        if self.refine_time:
+            self.refine_balance(valid_families, costs, assignment, zone_caps, zone_mins)
+        
+        final_counts = [0] * len(ilotier_names)
+        transferred = 0
+        changed = 0
+        total_distance = 0.0
+        total_time = 0.0
+        for family, row, cost_row, index in zip(valid_families, rows, costs, assignment):
+            if candidates:
+                family.distances = [row.get(zone) for zone in range(len(ilotier_names))]
+            else:
+                family.distances = row
+            family.zone = index + 1
+            family.ilotier = ilotier_names[index]
+            family.distance = row[index]
+            if self.travel_service:
+                family.travel_time = cost_row[index]
+                total_time += cost_row[index]
+            final_counts[index] += 1
+            total_distance += row[index]
+            if family.zone != family.natural_zone:
+                transferred += 1
+            if family.previous_zone and family.zone != family.previous_zone:
+                changed += 1
+                
+        if transferred:
+            self.log(f"  {transferred} familles transférées pour l'équilibrage")
+        if any(family.previous_zone for family in valid_families):
+            self.log(f"  {changed} familles déjà réparties changent de zone")
+        self.log(f"  Répartition finale : {self.format_zone_counts(final_counts)}")
+        self.log(f"  Équilibre : {' / '.join(f'{count/total*100:.1f}%' for count in final_counts)}")
+        self.log(f"  Distance totale : {total_distance:.1f} km")
+        if self.travel_service:
+            self.log(f"  Temps de trajet total : {total_time:.0f} min "
+                     f"(moyenne {total_time / total:.1f} min par famille)")
+        
+    def refine_balance(self, families, costs, assignment, zone_caps, zone_mins=None):
+        """Affiner la répartition par recherche locale (voir carte_ilotier.refine)
+
+        Les familles restées dans leur zone précédente ne sont pas déplacées.
+        """
+        fixed = {index for index, (family, zone) in enumerate(zip(families, assignment))
+                 if family.previous_zone == zone + 1}
+        result = refine_assignment(costs, assignment, zone_caps, fixed, time_budget=self.refine_time,
+                                   minimums=zone_mins)
+        self.metrics.count('refine_swaps', result['swaps'])
+        self.metrics.count('refine_moves', result['moves'])
+        
+        unit = 'min' if self.travel_service else 'km'
+        change = ((result['total_after'] / result['total_before'] - 1) * 100
+                  if result['total_before'] else 0.0)
+        self.log(f"  Affinage local : {result['swaps']} échanges, {result['moves']} déplacements "
+                 f"en {result['seconds']:.2f} s" + (" (durée maximale atteinte)" if result['timed_out'] else ""))
+        self.log(f"    Total : {result['total_before']:.1f} -> {result['total_after']:.1f} {unit} "
+                 f"({change:+.2f}%), trajet le plus long : {result['max_before']:.1f} -> "
+                 f"{result['max_after']:.1f} {unit}")
+        
+    def distance_rows(self, families, ilotier_lats, ilotier_lngs, candidates=None):
+        """Distances des familles aux ilotiers, retourne (coûts, lignes)
+
+        Toutes les distances sont calculées en un seul lot (matrice NumPy ou
+        liste de listes). Avec `candidates`, un index spatial donne les
+        `candidates` ilotiers les plus proches de chaque famille, plus
+        sa zone précédente : chaque ligne est alors un dict zone -> distance.
+        """
+        lats = [family.lat for family in families]
+        lngs = [family.lng for family in families]
+        if not candidates:
+            matrix = distance_matrix(lats, lngs, ilotier_lats, ilotier_lngs)
+            return matrix, matrix if isinstance(matrix, list) else matrix.tolist()
+            
+        index = IlotierIndex(ilotier_lats, ilotier_lngs)
+        zones, dists = index.query(lats, lngs, candidates)
+        rows = [dict(zip(zone_row, dist_row)) for zone_row, dist_row in zip(zones, dists)]
+        for family, row in zip(families, rows):
+            zone = (family.previous_zone or 0) - 1
+            if 0 <= zone < len(ilotier_lats) and zone not in row:
+                row[zone] = haversine(family.lat, family.lng, ilotier_lats[zone], ilotier_lngs[zone])
+        return rows, rows
+        
+    def travel_time_rows(self, families, ilotier_lats, ilotier_lngs, rows):
+        """Temps de trajet en minutes, de même forme que les lignes de distances `rows`
+
+        Seuls les couples famille/ilotier présents dans `rows` sont demandés,
+        par requêtes matricielles, en passant par le cache de temps de trajet.
+        Un couple sans itinéraire coûte UNREACHABLE_FACTOR fois le plus long
+        trajet connu.
+        """
+        service = self.travel_service
+        self.log(f"Calcul des temps de trajet ({service.name})...")
+        limiter = None
+        if service.rate_limited:
+            limiter = self.limiter or TokenBucket(self.geocoding_settings['requests_per_second'],
+                                                  self.geocoding_settings['burst'])
+        candidates = isinstance(rows[0], dict)
+        requests = self.metrics.counters.get('travel_requests', 0)
+        times = travel_times(service, [(family.lat, family.lng) for family in families],
+                             list(zip(ilotier_lats, ilotier_lngs)),
+                             [list(row) for row in rows] if candidates else None,
+                             self.travel_cache, limiter, self.geocoding_settings['workers'], self.metrics)
+        self.log(f"  {self.metrics.counters.get('travel_requests', 0) - requests} requêtes matricielles")
+        if self.travel_cache is not None and service.cacheable:
+            self.log(f"  {self.travel_cache.stats_message()}")
+        
+        longest = max((minutes for found in times for minutes in found.values() if minutes is not None),
+                      default=1)
+        unreachable = 0
+        result = []
+        for found in times:
+            row = {}
+            for zone, minutes in found.items():
+                if minutes is None:
+                    unreachable += 1
+                    minutes = longest * UNREACHABLE_FACTOR
+                row[zone] = minutes
+            result.append(row if candidates else [row[zone] for zone in range(len(ilotier_lats))])
+        if unreachable:
+            self.log(f"  {unreachable} trajets famille/ilotier sans itinéraire")
+        return result
+        
+    def churn_costs(self, families, matrix, rows):
+        """Coûts d'affectation favorisant la zone précédente des familles
+
+        Rester dans sa zone précédente rapporte plus que tout gain de distance
+        d'un changement de zone : seules les contraintes d'équilibre déplacent
+        une famille déjà répartie.
+        """
+        kept = [(index, family.previous_zone - 1) for index, family in enumerate(families)
+                if family.previous_zone and family.previous_zone - 1 in self.zones_of(rows[index])]
+        if not kept:
+            return matrix
+            
+        if isinstance(rows[0], dict):
+            bonus = max(max(row.values()) - min(row.values()) for row in rows) + 1
+            costs = [dict(row) for row in rows]
+        else:
+            bonus = max(max(row) - min(row) for row in rows) + 1
+            costs = [list(row) for row in rows] if isinstance(matrix, list) else matrix.copy()
+        for index, zone in kept:
+            costs[index][zone] -= bonus
+        return costs
+        
+    def zones_of(self, row):
+        """Zones (indices à partir de 0) présentes dans une ligne de distances"""
+        return row.keys() if isinstance(row, dict) else range(len(row))
+        
+    def format_zone_counts(self, counts):
+        """Formater les effectifs par zone pour le journal"""
+        return ", ".join(f"Zone {zone}={count}" for zone, count in enumerate(counts, start=1))
+        
+    def save_outputs(self, families, ilotier_coords, source_file, output_dir=None):
+        """Sauvegarder les fichiers de sortie, retourne la liste des fichiers écrits"""
+        if output_dir is None:
+            output_dir = os.path.dirname(source_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        # Save zones (JSON or compact records)
+        zones_name = zones_filename(self.zones_format)
+        json_file = os.path.join(output_dir, zones_name)
+        if self.zones_format == 'json':
+            with self.metrics.stage('save_json') as stage:
+                self.save_json(families, ilotier_coords, json_file)
+                self.count_bytes(stage, json_file)
+            self.log(f"Fichier JSON sauvegardé : {zones_name}")
+        else:
+            with self.metrics.stage('save_zones') as stage:
+                write_zones(families, ilotier_coords, json_file)
+                self.count_bytes(stage, json_file)
+            self.log(f"Fichier de zones compact sauvegardé : {zones_name}")
+        
+        # Save updated CSV
+        csv_file = os.path.join(output_dir, "familles_zones.csv")
+        with self.metrics.stage('save_csv') as stage:
+            self.save_updated_csv(families, source_file, csv_file)
+            self.count_bytes(stage, csv_file)
+        self.log(f"Fichier CSV sauvegardé : familles_zones.csv")
+        
+        output_files = [json_file, csv_file]
+        
+        # Addresses written several ways in the source file
+        if self.address_variants.collapsed:
+            report_file = os.path.join(output_dir, ADDRESS_REPORT_FILE)
+            self.address_variants.write_csv(report_file)
+            output_files.append(report_file)
+            self.log(f"Adresses regroupées sauvegardées : {ADDRESS_REPORT_FILE}")
+        
+        # Save zone boundaries
+        boundaries = None
+        if self.boundaries:
+            boundaries_file = os.path.join(output_dir, BOUNDARIES_FILE)
+            with self.metrics.stage('save_boundaries') as stage:
+                boundaries = self.save_boundaries(families, ilotier_coords, boundaries_file)
+                self.count_bytes(stage, boundaries_file)
+            output_files.append(boundaries_file)
+        
+        # Save KML or KMZ
+        if self.map_format == 'kmz':
+            kmz_file = os.path.join(output_dir, "zones.kmz")
+            with self.metrics.stage('save_kmz') as stage:
+                layer_files = self.save_kmz(families, ilotier_coords, kmz_file, boundaries)
+                self.count_bytes(stage, kmz_file)
+            return output_files + [kmz_file] + layer_files
+            
+        kml_file = os.path.join(output_dir, "zones.kml")
+        with self.metrics.stage('save_kml') as stage:
+            self.save_kml(families, ilotier_coords, kml_file, boundaries)
+            self.count_bytes(stage, kml_file)
+        self.log(f"Fichier KML sauvegardé : zones.kml")
+        
+        return output_files + [kml_file]
+        
+    def count_bytes(self, stage, filename):
+        """Ajouter la taille d'un fichier écrit à l'étape et au total"""
+        size = os.path.getsize(filename)
+        stage['bytes'] = size
+        self.metrics.count('bytes_written', size)
+        
+    def save_json(self, families, ilotier_coords, output_file):
+        """Sauvegarder les ilotiers et les familles au format JSON"""
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'ilotiers': ilotier_coords,
+                'families': [family.to_dict() for family in families]
+            }, f, ensure_ascii=False, indent=2)
+            
+    def save_updated_csv(self, families, source_file, output_file):
+        """Sauvegarder le CSV mis à jour
+
+        Le fichier source (CSV ou Excel) est relu en flux et chaque ligne est
+        écrite aussitôt, complétée des colonnes de zone de sa famille.
+        """
+        new_fieldnames = read_headers(source_file) + ['Ilotier', 'Zone', 'Distance (km)', 'Lien Google Maps']
+        if self.travel_service:
+            new_fieldnames.insert(-1, 'Trajet (min)')
+        
+        # Create family lookup
+        family_lookup = {f.family_code: f for f in families if f.zone is not None}
+        
+        with open(output_file, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=new_fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            for row in iter_rows(source_file):
+                family = family_lookup.get(row.get('Famille', '').strip())
+                if family:
+                    row['Ilotier'] = family.ilotier
+                    row['Zone'] = str(family.zone)
+                    row['Distance (km)'] = f"{family.distance:.2f}"
+                    if family.travel_time is not None:
+                        row['Trajet (min)'] = f"{family.travel_time:.0f}"
+                    row['Lien Google Maps'] = f"https://www.google.com/maps/search/?api=1&query={family.lat},{family.lng}"
+                else:
+                    row['Ilotier'] = ''
+                    row['Zone'] = ''
+                    row['Distance (km)'] = ''
+                    row['Trajet (min)'] = ''
+                    row['Lien Google Maps'] = ''
+                writer.writerow(row)
+            
+    def save_boundaries(self, families, ilotier_coords, output_file):
+        """Calculer les contours des zones et les sauvegarder en GeoJSON, retourne les contours"""
+        boundaries = zone_boundaries(families, ilotier_coords)
+        write_geojson(boundaries, output_file)
+        self.log(f"Contours des zones sauvegardés : {os.path.basename(output_file)} "
+                 f"({len(boundaries)} zones)")
+        self.metrics.count('boundary_vertices', sum(len(boundary['ring']) - 1 for boundary in boundaries))
+        return boundaries
+        
+    def save_kml(self, families, ilotier_coords, output_file, boundaries=None):
+        """Générer le fichier KML pour Google My Maps"""
+        write_kml(families, ilotier_coords, output_file, boundaries)
+        
+    def save_kmz(self, families, ilotier_coords, output_file, boundaries=None):
+        """Générer le fichier KMZ découpé en calques, retourne les fichiers KMZ par calque"""
+        result = write_kmz(families, ilotier_coords, output_file, self.layer_limit, boundaries)
+        verbose = result['verbose_kml_bytes']
+        reduction = (1 - result['kmz_bytes'] / verbose) * 100 if verbose else 0
+        self.log(f"Fichier KMZ sauvegardé : {os.path.basename(output_file)} "
+                 f"({len(result['layers'])} calques, {result['kmz_bytes'] / 1024:.0f} Ko "
+                 f"contre {verbose / 1024:.0f} Ko en KML, -{reduction:.0f}%)")
+        if result['layer_files']:
+            self.log(f"  {len(result['layer_files'])} calques de {self.layer_limit} familles au plus "
+                     f"à importer un par un dans Google My Maps : "
+                     f"{os.path.basename(os.path.dirname(result['layer_files'][0]))}/")
+        self.metrics.count('map_layers', len(result['layers']))
+        return result['layer_files']
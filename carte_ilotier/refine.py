@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Affinage local de la répartition : raccourcir les trajets les plus longs
+
+L'affectation de carte_ilotier.assignment minimise exactement le coût total
+(distance ou temps de trajet) : aucun échange ni déplacement ne peut le
+réduire. Elle peut en revanche laisser quelques familles très loin de leur
+ilotier alors qu'une répartition à peine plus longue au total les en
+rapprocherait. L'affinage minimise la somme des carrés des coûts, qui
+pénalise les longs trajets, par recherche locale :
+- déplacement d'une famille vers une zone ayant encore de la place
+- échange de deux familles entre deux zones
+sans sortir des capacités (minimum et maximum par zone) et sans allonger le coût total de plus de
+`max_increase`.
+
+Les familles sont parcourues de la plus lointaine à la plus proche, en
+n'essayant que leurs NEIGHBOURS zones les plus proches. Pour chaque couple
+de zones (k, j), un tas donne la famille de k dont le passage en j est le
+plus avantageux : le meilleur partenaire d'échange s'obtient sans parcourir
+la zone, et l'effet d'un mouvement sur les deux objectifs se calcule en
+O(1). Le calcul s'arrête au bout de `time_budget` secondes.
+"""
+
+import heapq
+import time
+
+NEIGHBOURS = 4  # Nearest zones tried for each family
+MAX_INCREASE = 0.01  # Share of the total cost the refinement may add
+TIME_BUDGET = 2.0  # Secondes
+CHECK_EVERY = 256  # Families between two checks of the time budget
+EPSILON = 1e-9
+
+
+def _zones(row):
+    return row.keys() if isinstance(row, dict) else range(len(row))
+
+
+def refine_assignment(costs, assign, capacities, fixed=None, max_increase=MAX_INCREASE,
+                      time_budget=TIME_BUDGET, minimums=None):
+    """Affiner une affectation (liste d'indices de zone, modifiée sur place)
+
+    `costs` est une liste de listes, ou de dicts zone -> coût limités aux
+    zones candidates, comme pour balanced_assignment. Les lignes dont
+    l'indice est dans `fixed` ne changent pas de zone ; aucune zone ne passe
+    sous son minimum (`minimums`, 0 par défaut). Retourne un dict :
+    moves, swaps, seconds, timed_out, total_before, total_after, max_before
+    et max_after.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget
+    fixed = fixed or set()
+    minimums = minimums or [0] * len(capacities)
+    counts = [0] * len(capacities)
+    for zone in assign:
+        counts[zone] += 1
+
+    current = [row[zone] for row, zone in zip(costs, assign)]
+    total = sum(current)
+    result = {
+        'moves': 0,
+        'swaps': 0,
+        'timed_out': False,
+        'total_before': total,
+        'max_before': max(current, default=0.0)
+    }
+    limit = total * (1 + max_increase)
+
+    # Nearest zones of each family that may move
+    movable = [index for index in range(len(assign)) if index not in fixed]
+    neighbours = {}
+    for index in movable:
+        row = costs[index]
+        neighbours[index] = sorted(_zones(row), key=row.__getitem__)[:NEIGHBOURS]
+
+    # heaps[(k, j)]: families of k by change of squared cost if moved to j
+    heaps = {}
+
+    def entries(index):
+        row = costs[index]
+        zone = assign[index]
+        for target in neighbours[index]:
+            if target != zone:
+                yield (zone, target), (row[target] ** 2 - row[zone] ** 2, index)
+
+    for index in movable:
+        for pair, entry in entries(index):
+            heaps.setdefault(pair, []).append(entry)
+    for heap in heaps.values():
+        heapq.heapify(heap)
+
+    # Zone pairs (k, j) whose best partner or free room improved since the last pass
+    changed = set()
+
+    def push(index):
+        for pair, entry in entries(index):
+            heap = heaps.setdefault(pair, [])
+            if not heap or entry < heap[0]:
+                changed.add(pair)
+            heapq.heappush(heap, entry)
+
+    # Farthest families first; later passes only revisit families with a changed option
+    movable.sort(key=lambda index: costs[index][assign[index]], reverse=True)
+    zone_count = len(capacities)
+    improved = True
+    first = True
+    while improved and not result['timed_out']:
+        improved = False
+        previous, changed = changed, set()
+        for step, a in enumerate(movable):
+            if step % CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                result['timed_out'] = True
+                break
+            j = assign[a]
+            if not first and not any((k, j) in previous for k in neighbours[a]):
+                continue
+            row_a = costs[a]
+            cost_a = row_a[j]
+            for k in neighbours[a]:
+                if row_a[k] >= cost_a:
+                    break  # Neighbours are sorted: no nearer zone left
+
+                # Move to a zone with room left: both objectives decrease
+                if counts[k] < capacities[k] and counts[j] > minimums[j]:
+                    assign[a] = k
+                    counts[j] -= 1
+                    counts[k] += 1
+                    total += row_a[k] - cost_a
+                    # j has room again, and k may now give a family above its minimum
+                    changed.update((j, zone) for zone in range(zone_count))
+                    changed.update((zone, k) for zone in range(zone_count))
+                    push(a)
+                    result['moves'] += 1
+                    improved = True
+                    break
+
+                # Swap with the family of k best suited to j (entries of moved families are stale)
+                heap = heaps.get((k, j))
+                while heap and assign[heap[0][1]] != k:
+                    heapq.heappop(heap)
+                if not heap:
+                    continue
+                square, b = heap[0]
+                if row_a[k] ** 2 - cost_a ** 2 + square >= -EPSILON:
+                    continue
+                row_b = costs[b]
+                change = row_a[k] - cost_a + row_b[j] - row_b[k]
+                if total + change > limit:
+                    continue
+                assign[a] = k
+                assign[b] = j
+                total += change
+                push(a)
+                push(b)
+                result['swaps'] += 1
+                improved = True
+                break
+        first = False
+
+    result['total_after'] = sum(row[zone] for row, zone in zip(costs, assign))
+    result['max_after'] = max((row[zone] for row, zone in zip(costs, assign)), default=0.0)
+    result['seconds'] = time.perf_counter() - start
+    return result
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Lecture en flux des fichiers du registre consulaire (CSV ou Excel)
+
+Les lignes sont produites une à une sous forme de dict en-tête -> texte, de
+sorte que le fichier peut être relu pour l'export sans être gardé en mémoire.
+"""
+
+import csv
+import importlib.util
+import os
+
+# openpyxl is only imported when an Excel file is read: faster startup
+OPENPYXL_AVAILABLE = importlib.util.find_spec('openpyxl') is not None
+
+EXCEL_EXTENSIONS = ['.xlsx', '.xls']
+
+
+def is_excel(filename):
+    return os.path.splitext(filename)[1].lower() in EXCEL_EXTENSIONS
+
+
+def iter_source(filename):
+    """Produire la liste des en-têtes, puis chaque ligne du fichier (dict)"""
+    if is_excel(filename):
+        if not OPENPYXL_AVAILABLE:
+            raise Exception("Le module 'openpyxl' n'est pas installé. Installez-le avec : pip install openpyxl")
+        import openpyxl
+
+        wb = openpyxl.load_workbook(filename, read_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            headers = [value if value else '' for value in next(rows, ())]
+            yield headers
+            for row in rows:
+                # Cells beyond the header row are ignored
+                yield {headers[col_idx]: str(value) if value is not None else ''
+                       for col_idx, value in enumerate(row[:len(headers)])}
+        finally:
+            wb.close()
+    else:
+        with open(filename, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            yield reader.fieldnames or []
+            yield from reader
+
+
+def read_headers(filename):
+    """En-têtes du fichier"""
+    source = iter_source(filename)
+    try:
+        return next(source)
+    finally:
+        source.close()
+
+
+def iter_rows(filename):
+    """Lignes du fichier, sans l'en-tête"""
+    source = iter_source(filename)
+    next(source)
+    return source
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Index spatial des ilotiers pour la recherche des plus proches voisins
+
+Les points sont projetés sur la sphère unité (x, y, z) : la distance en
+ligne droite y varie comme la distance Haversine, le classement des voisins
+est donc exact. L'index, un arbre k-d en 3 dimensions, est construit une
+fois sur les ilotiers : chaque recherche ne parcourt que les branches
+proches du point, sans calculer toutes les distances famille/ilotier.
+Seules les distances des k candidats retenus sont calculées en Haversine,
+avec NumPy s'il est installé.
+"""
+
+import heapq
+import math
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from .distances import haversine
+
+if NUMPY_AVAILABLE:
+    from .distances import haversine_array
+
+
+def unit_vector(lat, lng):
+    """Coordonnées 3D d'un point sur la sphère unité"""
+    phi = math.radians(lat)
+    lam = math.radians(lng)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+class _KDNode:
+    __slots__ = ('index', 'point', 'axis', 'left', 'right')
+
+    def __init__(self, index, point, axis, left, right):
+        self.index = index
+        self.point = point
+        self.axis = axis
+        self.left = left
+        self.right = right
+
+
+def _build(items, depth=0):
+    if not items:
+        return None
+    axis = depth % 3
+    items.sort(key=lambda item: item[1][axis])
+    middle = len(items) // 2
+    index, point = items[middle]
+    return _KDNode(index, point, axis,
+                   _build(items[:middle], depth + 1), _build(items[middle + 1:], depth + 1))
+
+
+class IlotierIndex:
+    """Index des ilotiers : k plus proches ilotiers d'un point, avec distance Haversine"""
+
+    def __init__(self, lats, lngs, use_numpy=None):
+        if use_numpy is None:
+            use_numpy = NUMPY_AVAILABLE
+        self.lats = list(lats)
+        self.lngs = list(lngs)
+        self.use_numpy = use_numpy
+        points = [unit_vector(lat, lng) for lat, lng in zip(self.lats, self.lngs)]
+        self.root = _build(list(enumerate(points)))
+
+    def __len__(self):
+        return len(self.lats)
+
+    def nearest(self, lat, lng, k=1):
+        """Les k ilotiers les plus proches : liste de (indice, distance en km), du plus proche au plus loin"""
+        zones, dists = self.query([lat], [lng], k)
+        return list(zip(zones[0], dists[0]))
+
+    def query(self, lats, lngs, k=1):
+        """k plus proches ilotiers de chaque point
+
+        Retourne deux listes de listes : indices des ilotiers et distances
+        Haversine en km, du plus proche au plus loin.
+        """
+        k = min(k, len(self))
+        zones = [self._query_tree(unit_vector(lat, lng), k) for lat, lng in zip(lats, lngs)]
+        if self.use_numpy:
+            zones = np.array(zones, dtype=np.intp).reshape(len(zones), k)
+            dists = haversine_array(
+                np.asarray(lats, dtype=np.float64)[:, None],
+                np.asarray(lngs, dtype=np.float64)[:, None],
+                np.asarray(self.lats, dtype=np.float64)[zones],
+                np.asarray(self.lngs, dtype=np.float64)[zones]
+            )
+            return zones.tolist(), dists.tolist()
+
+        dists = [[haversine(lat, lng, self.lats[zone], self.lngs[zone]) for zone in row]
+                 for lat, lng, row in zip(lats, lngs, zones)]
+        return zones, dists
+
+    def _query_tree(self, point, k):
+        x, y, z = point
+        # Max-heap of (-squared distance, index) holding the k best so far
+        best = []
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            # Skip subtrees beyond the splitting plane of a farther point than the k best
+            if node is None or (len(best) == k and bound >= -best[0][0]):
+                continue
+            nx, ny, nz = node.point
+            d2 = (x - nx) ** 2 + (y - ny) ** 2 + (z - nz) ** 2
+            if len(best) < k:
+                heapq.heappush(best, (-d2, node.index))
+            elif d2 < -best[0][0]:
+                heapq.heapreplace(best, (-d2, node.index))
+
+            diff = point[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            # Near side first: the far side is checked again once it is popped
+            stack.append((far, diff * diff))
+            stack.append((near, 0.0))
+        return [index for d2, index in sorted(best, key=lambda item: (-item[0], item[1]))]
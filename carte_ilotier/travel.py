@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Temps de trajet entre familles et ilotiers
+
+Services interchangeables, comme les services de géocodage :
+- GoogleTravelTime : Google Distance Matrix API, plusieurs origines et
+  destinations par requête (au plus 25 x 25 et 100 couples)
+- EstimatedTravelTime : estimation locale hors ligne (distance à vol
+  d'oiseau allongée d'un facteur de détour, vitesse moyenne), pour les essais
+
+Les durées obtenues sont conservées dans un cache SQLite (TravelTimeCache) :
+seuls les couples origine/destination absents sont demandés au service.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .distances import haversine
+from .geocoders import GOOGLEMAPS_AVAILABLE
+from .geocoding import DEFAULT_WORKERS, call_with_retries
+
+TRAVEL_BACKENDS = ('google', 'estimate')
+TRAVEL_MODES = ('driving', 'walking', 'bicycling', 'transit')
+
+DEFAULT_TRAVEL_CACHE_FILE = os.path.expanduser("~/.ilotier_travel_cache.sqlite")
+DEFAULT_TTL = 90 * 24 * 3600  # 90 jours : les réseaux de transport évoluent
+COORD_DIGITS = 5  # About 1 m, closer points share their travel times
+
+DETOUR_FACTOR = 1.3  # Road distance / straight-line distance, estimate only
+DEFAULT_SPEED_KMH = 30
+
+
+class TravelTimeService:
+    """Interface commune : durations(origines, destinations) -> minutes
+
+    Origines et destinations sont des listes de couples (lat, lng) ; le
+    résultat est une ligne par origine, None pour un couple sans itinéraire.
+    Les attributs max_* bornent la taille d'une requête (None = sans limite).
+    """
+
+    name = ''
+    rate_limited = False
+    cacheable = False
+    max_origins = None
+    max_destinations = None
+    max_elements = None
+
+    def durations(self, origins, destinations):
+        raise NotImplementedError
+
+
+class GoogleTravelTime(TravelTimeService):
+    """Temps de trajet par l'API Google Distance Matrix"""
+
+    rate_limited = True
+    cacheable = True
+    max_origins = 25
+    max_destinations = 25
+    max_elements = 100
+
+    def __init__(self, api_key=None, client=None, mode='driving'):
+        if mode not in TRAVEL_MODES:
+            raise Exception(f"Mode de déplacement inconnu : {mode}")
+        if client is None:
+            if not GOOGLEMAPS_AVAILABLE:
+                raise Exception("Le module 'googlemaps' n'est pas installé. Installez-le avec : pip install googlemaps")
+            import googlemaps
+            client = googlemaps.Client(key=api_key)
+        self.client = client
+        self.mode = mode
+        # Durations depend on the mode: each one has its own cache entries
+        self.name = f"google-{mode}"
+
+    def durations(self, origins, destinations):
+        result = self.client.distance_matrix(origins, destinations, mode=self.mode)
+        return [[element['duration']['value'] / 60 if element.get('status') == 'OK' else None
+                 for element in row['elements']]
+                for row in result['rows']]
+
+
+class EstimatedTravelTime(TravelTimeService):
+    """Temps de trajet estimé hors ligne : distance à vol d'oiseau x détour / vitesse"""
+
+    name = 'estimate'
+
+    def __init__(self, speed_kmh=DEFAULT_SPEED_KMH, detour=DETOUR_FACTOR):
+        self.speed_kmh = speed_kmh
+        self.detour = detour
+
+    def durations(self, origins, destinations):
+        factor = self.detour / self.speed_kmh * 60
+        return [[haversine(lat, lng, target_lat, target_lng) * factor
+                 for target_lat, target_lng in destinations]
+                for lat, lng in origins]
+
+
+def create_travel_service(backend='google', api_key=None, mode='driving'):
+    """Créer le service de temps de trajet demandé"""
+    if backend == 'google':
+        return GoogleTravelTime(api_key, mode=mode)
+    if backend == 'estimate':
+        return EstimatedTravelTime()
+    raise Exception(f"Service de temps de trajet inconnu : {backend}")
+
+
+def point_key(lat, lng):
+    """Clé d'un point arrondie à COORD_DIGITS décimales"""
+    return f"{lat:.{COORD_DIGITS}f},{lng:.{COORD_DIGITS}f}"
+
+
+class TravelTimeCache:
+    """Cache (service, origine, destination) -> minutes avec expiration (TTL)"""
+
+    def __init__(self, path=DEFAULT_TRAVEL_CACHE_FILE, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS travel_time (
+            service TEXT NOT NULL,
+            origin TEXT NOT NULL,
+            destination TEXT NOT NULL,
+            minutes REAL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (service, origin, destination)
+        )''')
+        self._conn.commit()
+        self.purge_expired()
+
+    def get_origin(self, service, origin, destinations):
+        """Durées en cache depuis `origin` vers les clés `destinations` : dict destination -> minutes"""
+        oldest = time.time() - self.ttl if self.ttl else 0
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT destination, minutes FROM travel_time '
+                'WHERE service = ? AND origin = ? AND created_at >= ?',
+                (service, origin, oldest)).fetchall()
+        found = {destination: minutes for destination, minutes in rows if destination in destinations}
+        self.hits += len(found)
+        self.misses += len(destinations) - len(found)
+        return found
+
+    def put_many(self, service, entries):
+        """Enregistrer des durées : itérable de (origine, destination, minutes)"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO travel_time (service, origin, destination, minutes, created_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((service, origin, destination, minutes, now) for origin, destination, minutes in entries))
+            self._conn.commit()
+
+    def clear(self):
+        """Vider entièrement le cache"""
+        with self._lock:
+            self._conn.execute('DELETE FROM travel_time')
+            self._conn.commit()
+
+    def purge_expired(self):
+        """Supprimer les entrées expirées, retourne le nombre supprimé"""
+        if not self.ttl:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM travel_time WHERE created_at < ?', (time.time() - self.ttl,))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM travel_time').fetchone()[0]
+
+    def stats_message(self):
+        """Résumé des succès/échecs du cache pour le journal"""
+        return f"Cache temps de trajet : {self.hits} trouvés, {self.misses} absents"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def plan_requests(missing, service):
+    """Regrouper les couples à demander en requêtes matricielles
+
+    `missing` associe chaque origine à la liste triée des destinations
+    (indices) à demander. Les origines ayant les mêmes destinations partagent
+    leurs requêtes, découpées selon les limites du service. Retourne une
+    liste de couples (origines, destinations).
+    """
+    by_targets = {}
+    for origin, targets in missing.items():
+        if targets:
+            by_targets.setdefault(tuple(targets), []).append(origin)
+
+    requests = []
+    for targets, origins in by_targets.items():
+        target_step = service.max_destinations or len(targets)
+        for start in range(0, len(targets), target_step):
+            chunk = targets[start:start + target_step]
+            origin_step = len(origins)
+            if service.max_origins:
+                origin_step = min(origin_step, service.max_origins)
+            if service.max_elements:
+                origin_step = min(origin_step, max(1, service.max_elements // len(chunk)))
+            for first in range(0, len(origins), origin_step):
+                requests.append((origins[first:first + origin_step], list(chunk)))
+    return requests
+
+
+def travel_times(service, origins, destinations, wanted=None, cache=None, limiter=None,
+                 workers=DEFAULT_WORKERS, metrics=None):
+    """Durées en minutes de chaque origine vers ses destinations
+
+    `origins` et `destinations` sont des listes de couples (lat, lng) ;
+    `wanted` donne pour chaque origine les indices des destinations utiles
+    (toutes par défaut). Les origines identiques (à COORD_DIGITS décimales
+    près) ne sont demandées qu'une fois, les couples en cache jamais.
+    Retourne une liste de dicts indice de destination -> minutes (None sans
+    itinéraire), une par origine.
+    """
+    every = range(len(destinations))
+    destination_keys = [point_key(lat, lng) for lat, lng in destinations]
+    origin_keys = [point_key(lat, lng) for lat, lng in origins]
+
+    # Distinct origins and the destinations needed from each
+    points = {}
+    needed = {}
+    for index, key in enumerate(origin_keys):
+        if key not in points:
+            points[key] = origins[index]
+            needed[key] = set()
+        needed[key].update(every if wanted is None else wanted[index])
+
+    known = {}
+    use_cache = cache is not None and service.cacheable
+    missing = {}
+    for key, targets in needed.items():
+        found = {}
+        if use_cache:
+            cached = cache.get_origin(service.name, key, {destination_keys[j] for j in targets})
+            found = {j: cached[destination_keys[j]] for j in targets if destination_keys[j] in cached}
+        known[key] = found
+        missing[key] = sorted(j for j in targets if j not in found)
+
+    requests = plan_requests(missing, service)
+    if metrics:
+        metrics.count('travel_requests', len(requests))
+        metrics.count('travel_pairs', sum(len(request_origins) * len(targets)
+                                          for request_origins, targets in requests))
+
+    def fetch(request):
+        request_origins, targets = request
+        return call_with_retries(
+            lambda: service.durations([points[key] for key in request_origins],
+                                      [destinations[j] for j in targets]),
+            limiter if service.rate_limited else None, metrics=metrics)
+
+    # Results are stored as they arrive: an interrupted run keeps the pairs already paid for
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for (request_origins, targets), rows in zip(requests, pool.map(fetch, requests)):
+            entries = []
+            for key, row in zip(request_origins, rows):
+                for j, minutes in zip(targets, row):
+                    known[key][j] = minutes
+                    entries.append((key, destination_keys[j], minutes))
+            if use_cache:
+                cache.put_many(service.name, entries)
+
+    return [{j: known[key].get(j) for j in (every if wanted is None else wanted[index])}
+            for index, key in enumerate(origin_keys)]
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Fichier de zones compact : un enregistrement JSON par ligne (NDJSON)
+
+Alternative à zones.json pour les outils qui n'exploitent que le résultat
+de la répartition. Le fichier est écrit famille par famille, compressé en
+gzip si son nom se termine par .gz, et ne contient aucune donnée
+personnelle :
+- première ligne : en-tête (format, version, ilotiers)
+- puis une ligne par famille : code, empreinte de l'adresse, coordonnées,
+  zone naturelle, zone, ilotier, distance (et temps de trajet s'il est
+  calculé)
+
+Exemple de lecture :
+    for family in iter_zones("zones.ndjson.gz"):
+        print(family['family_code'], family['zone'])
+"""
+
+import gzip
+import json
+import os
+
+from .geocode_cache import address_hash
+
+FORMATS = {
+    'json': "zones.json",
+    'ndjson': "zones.ndjson",
+    'ndjson.gz': "zones.ndjson.gz",
+}
+FORMAT_NAME = "carte-ilotier-zones"
+FORMAT_VERSION = 1
+
+COORD_DIGITS = 7  # About 1 cm
+DISTANCE_DIGITS = 4  # Kilometers, 0.1 m
+TIME_DIGITS = 2  # Minutes
+
+
+def zones_filename(zones_format):
+    """Nom du fichier de zones d'un format"""
+    if zones_format not in FORMATS:
+        raise Exception(f"Format de fichier de zones inconnu : {zones_format}")
+    return FORMATS[zones_format]
+
+
+def _open(filename, mode):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 't', encoding='utf-8', compresslevel=6)
+    return open(filename, mode, encoding='utf-8')
+
+
+def _round(value, digits):
+    return None if value is None else round(value, digits)
+
+
+def family_record(family):
+    """Enregistrement compact d'une famille (sans donnée personnelle)"""
+    record = {
+        'family_code': family.family_code,
+        'address_hash': address_hash(family.address),
+        'lat': _round(family.lat, COORD_DIGITS),
+        'lng': _round(family.lng, COORD_DIGITS),
+        'natural_zone': family.natural_zone,
+        'zone': family.zone,
+        'ilotier': family.ilotier,
+        'distance': _round(family.distance, DISTANCE_DIGITS)
+    }
+    if family.travel_time is not None:
+        record['travel_time'] = _round(family.travel_time, TIME_DIGITS)
+    return record
+
+
+def write_zones(families, ilotier_coords, output_file):
+    """Écrire le fichier de zones compact, une famille à la fois"""
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    with _open(output_file, 'w') as f:
+        f.write(dumps({'format': FORMAT_NAME, 'version': FORMAT_VERSION, 'ilotiers': ilotier_coords}))
+        f.write('\n')
+        for family in families:
+            f.write(dumps(family_record(family)))
+            f.write('\n')
+
+
+def read_header(filename):
+    """En-tête du fichier : format, version et ilotiers"""
+    with _open(filename, 'r') as f:
+        return _check_header(f.readline(), filename)
+
+
+def iter_zones(filename):
+    """Lire les familles en flux : un dict par famille"""
+    with _open(filename, 'r') as f:
+        _check_header(f.readline(), filename)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_zones(filename):
+    """Charger un fichier de zones compact ou zones.json
+
+    Retourne un dict : 'ilotiers' (nom -> adresse, zone, lat, lng) et
+    'families' (liste de dicts).
+    """
+    if not filename.endswith(('.ndjson', '.ndjson.gz')):
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {'ilotiers': data.get('ilotiers', {}), 'families': data.get('families', [])}
+    with _open(filename, 'r') as f:
+        header = _check_header(f.readline(), filename)
+        return {'ilotiers': header['ilotiers'], 'families': [json.loads(line) for line in f if line.strip()]}
+
+
+def latest_zones_file(directory):
+    """Fichier de zones le plus récent d'un dossier (tous formats), ou None"""
+    existing = [os.path.join(directory, name) for name in FORMATS.values()
+                if os.path.exists(os.path.join(directory, name))]
+    return max(existing, key=os.path.getmtime) if existing else None
+
+
+def _check_header(line, filename):
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('format') != FORMAT_NAME:
+        raise Exception(f"Fichier de zones non reconnu : {os.path.basename(filename)}")
+    if header.get('version', 0) > FORMAT_VERSION:
+        raise Exception(f"Version du fichier de zones non prise en charge : {header.get('version')}")
+    return header
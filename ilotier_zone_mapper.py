@@ -2,34 +2,33 @@
 # -*- coding: utf-8 -*-
 """
 Répartiteur de Zones d'Urgence - Ilotiers
-Application pour répartir équitablement les familles entre deux ilotiers
+Application pour répartir équitablement les familles entre plusieurs ilotiers
 Version 1.0 - 2025
 """
 
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import csv
-import json
+import logging
+import multiprocessing
 import os
 import sys
-import time
 import threading
-from datetime import datetime
-from typing import List, Dict, Tuple
-import math
-
-# Try to import required libraries
-try:
-    import googlemaps
-    GOOGLEMAPS_AVAILABLE = True
-except ImportError:
-    GOOGLEMAPS_AVAILABLE = False
-
-try:
-    import openpyxl
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    OPENPYXL_AVAILABLE = False
+import time
+from collections import deque
+
+from carte_ilotier.checkpoint import pending_checkpoint
+from carte_ilotier.config import load_config, save_config
+from carte_ilotier.geocode_cache import GeocodeCache
+from carte_ilotier.geocoders import GOOGLEMAPS_AVAILABLE, create_geocoder
+from carte_ilotier.refine import TIME_BUDGET
+from carte_ilotier.kml import LAYER_LIMIT
+from carte_ilotier.logs import LogQueue, format_record
+from carte_ilotier.zonefile import zones_filename
+
+LOG_POLL_MS = 100  # Journal refresh interval
+# File receiving the time the first window is shown (benchmarks/bench_startup.py)
+STARTUP_PROBE_ENV = 'ILOTIER_STARTUP_PROBE'
+MAX_LOG_LINES = 2000  # Lines kept on screen, the log file keeps everything
 
 class IlotierZoneMapper:
     def __init__(self, root):
@@ -40,17 +39,35 @@ class IlotierZoneMapper:
         # Variables
         self.csv_file = tk.StringVar()
         self.api_key = tk.StringVar()
-        self.ilotier1_name = tk.StringVar(value="Ilotier 1")
-        self.ilotier1_address = tk.StringVar()
-        self.ilotier2_name = tk.StringVar(value="Ilotier 2")
-        self.ilotier2_address = tk.StringVar()
+        self.gazetteer_file = tk.StringVar()
+        self.incremental = tk.BooleanVar(value=False)
+        self.ilotiers = []  # One dict of Tk variables and frame per ilotier
         self.processing = False
+        self.worker = None
+        self.worker_error = None
+        self.resume = True
+        
+        # Geocoding throughput overrides from ~/.ilotier_config.json
+        self.geocoding_settings = {}
+        self.log_file = None
+        self.profile = None
+        self.zones_format = 'json'
+        self.map_format = 'kml'
+        self.layer_limit = LAYER_LIMIT
+        self.boundaries = True
+        self.travel_time = None
+        self.travel_mode = 'driving'
+        self.refine_time = None
         
         # Load saved API key if exists
         self.load_api_key()
         
+        # Messages from any thread, shown by the Tk main loop
+        self.log_queue = LogQueue(self.log_file)
+        
         # Create UI
         self.create_widgets()
+        self.root.after(LOG_POLL_MS, self.poll_log)
         
     def create_widgets(self):
         """Créer l'interface utilisateur"""
@@ -95,6 +112,11 @@ class IlotierZoneMapper:
         csv_help.grid(row=row, column=1, sticky=tk.W, padx=5, pady=(0, 10))
         row += 1
         
+        incremental_check = ttk.Checkbutton(main_frame, variable=self.incremental,
+                                            text="Mise à jour : réutiliser le zones.json précédent (seuls les changements sont géocodés)")
+        incremental_check.grid(row=row, column=1, columnspan=2, sticky=tk.W, padx=5, pady=(0, 10))
+        row += 1
+        
         # Security notice
         security_frame = ttk.Frame(main_frame)
         security_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), padx=(20, 0), pady=(0, 10))
@@ -117,30 +139,16 @@ class IlotierZoneMapper:
         section2_label.grid(row=row, column=0, sticky=tk.W, pady=(10, 5))
         row += 1
         
-        # Ilotier 1
-        ilotier1_frame = ttk.LabelFrame(main_frame, text="Ilotier 1", padding="10")
-        ilotier1_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5, padx=(20, 0))
-        
-        ttk.Label(ilotier1_frame, text="Nom :").grid(row=0, column=0, sticky=tk.W)
-        ttk.Entry(ilotier1_frame, textvariable=self.ilotier1_name, width=30).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5)
-        
-        ttk.Label(ilotier1_frame, text="Adresse :").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
-        ttk.Entry(ilotier1_frame, textvariable=self.ilotier1_address, width=50).grid(row=1, column=1, sticky=(tk.W, tk.E), padx=5, pady=(5, 0))
-        
-        ilotier1_frame.columnconfigure(1, weight=1)
+        # Ilotiers (variable number)
+        self.ilotiers_frame = ttk.Frame(main_frame)
+        self.ilotiers_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), padx=(20, 0))
+        self.ilotiers_frame.columnconfigure(0, weight=1)
+        self.add_ilotier()
+        self.add_ilotier()
         row += 1
         
-        # Ilotier 2
-        ilotier2_frame = ttk.LabelFrame(main_frame, text="Ilotier 2", padding="10")
-        ilotier2_frame.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5, padx=(20, 0))
-        
-        ttk.Label(ilotier2_frame, text="Nom :").grid(row=0, column=0, sticky=tk.W)
-        ttk.Entry(ilotier2_frame, textvariable=self.ilotier2_name, width=30).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5)
-        
-        ttk.Label(ilotier2_frame, text="Adresse :").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
-        ttk.Entry(ilotier2_frame, textvariable=self.ilotier2_address, width=50).grid(row=1, column=1, sticky=(tk.W, tk.E), padx=5, pady=(5, 0))
-        
-        ilotier2_frame.columnconfigure(1, weight=1)
+        add_ilotier_btn = ttk.Button(main_frame, text="+ Ajouter un ilotier", command=self.add_ilotier)
+        add_ilotier_btn.grid(row=row, column=0, columnspan=3, sticky=tk.W, padx=(20, 0), pady=(5, 0))
         row += 1
         
         # Separator
@@ -173,6 +181,16 @@ class IlotierZoneMapper:
         api_help2.pack(side=tk.LEFT)
         row += 1
         
+        ttk.Label(main_frame, text="Référentiel hors ligne :").grid(row=row, column=0, sticky=tk.W, padx=(20, 0))
+        ttk.Entry(main_frame, textvariable=self.gazetteer_file, width=40).grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5)
+        ttk.Button(main_frame, text="Parcourir...", command=self.browse_gazetteer).grid(row=row, column=2)
+        row += 1
+        
+        gazetteer_help = ttk.Label(main_frame, text="Optionnel : CSV adresse/code postal/ville → lat/lng, remplace Google Maps", 
+                                   font=('Helvetica', 9), foreground='gray')
+        gazetteer_help.grid(row=row, column=1, sticky=tk.W, padx=5, pady=(0, 10))
+        row += 1
+        
         # Separator
         ttk.Separator(main_frame, orient='horizontal').grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
         row += 1
@@ -194,6 +212,7 @@ class IlotierZoneMapper:
         row += 1
         
         self.log_text = scrolledtext.ScrolledText(main_frame, height=10, width=80, wrap=tk.WORD)
+        self.log_text.tag_configure('error', foreground='red')
         self.log_text.grid(row=row, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         main_frame.rowconfigure(row, weight=1)
         row += 1
@@ -210,6 +229,52 @@ class IlotierZoneMapper:
         about_btn = ttk.Button(footer_frame, text="À propos", command=self.show_about)
         about_btn.pack(side=tk.RIGHT)
         
+        cache_btn = ttk.Button(footer_frame, text="Vider le cache", command=self.clear_geocode_cache)
+        cache_btn.pack(side=tk.RIGHT, padx=(0, 5))
+        
+    def add_ilotier(self):
+        """Ajouter un bloc de saisie d'ilotier"""
+        number = len(self.ilotiers) + 1
+        ilotier = {
+            'name': tk.StringVar(value=f"Ilotier {number}"),
+            'address': tk.StringVar(),
+            'weight': tk.StringVar(value="1")
+        }
+        
+        frame = ttk.LabelFrame(self.ilotiers_frame, padding="10")
+        ilotier['frame'] = frame
+        
+        ttk.Label(frame, text="Nom :").grid(row=0, column=0, sticky=tk.W)
+        ttk.Entry(frame, textvariable=ilotier['name'], width=30).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5)
+        
+        ttk.Label(frame, text="Poids :").grid(row=0, column=2, sticky=tk.W, padx=(10, 0))
+        ttk.Entry(frame, textvariable=ilotier['weight'], width=5).grid(row=0, column=3, sticky=tk.W, padx=5)
+        
+        ilotier['remove_btn'] = ttk.Button(frame, text="Retirer", command=lambda: self.remove_ilotier(ilotier))
+        ilotier['remove_btn'].grid(row=0, column=4, padx=(10, 0))
+        
+        ttk.Label(frame, text="Adresse :").grid(row=1, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Entry(frame, textvariable=ilotier['address'], width=50).grid(row=1, column=1, columnspan=4, sticky=(tk.W, tk.E), padx=5, pady=(5, 0))
+        
+        frame.columnconfigure(1, weight=1)
+        self.ilotiers.append(ilotier)
+        self.refresh_ilotiers()
+        
+    def remove_ilotier(self, ilotier):
+        """Retirer un ilotier (au moins deux sont conservés)"""
+        if len(self.ilotiers) <= 2:
+            return
+        self.ilotiers.remove(ilotier)
+        ilotier['frame'].destroy()
+        self.refresh_ilotiers()
+        
+    def refresh_ilotiers(self):
+        """Renuméroter et replacer les blocs d'ilotiers"""
+        for index, ilotier in enumerate(self.ilotiers):
+            ilotier['frame'].config(text=f"Ilotier {index + 1}")
+            ilotier['frame'].grid(row=index, column=0, sticky=(tk.W, tk.E), pady=5)
+            ilotier['remove_btn'].config(state='normal' if len(self.ilotiers) > 2 else 'disabled')
+            
     def browse_csv(self):
         """Sélectionner un fichier CSV ou Excel"""
         filename = filedialog.askopenfilename(
@@ -224,21 +289,50 @@ class IlotierZoneMapper:
             self.csv_file.set(filename)
             self.log(f"Fichier sélectionné : {os.path.basename(filename)}")
             
-    def log(self, message):
-        """Ajouter un message au journal"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)
-        self.root.update()
+    def browse_gazetteer(self):
+        """Sélectionner un référentiel de géocodage hors ligne"""
+        filename = filedialog.askopenfilename(
+            title="Sélectionner le référentiel hors ligne",
+            filetypes=[
+                ("Fichiers CSV", "*.csv"),
+                ("Tous les fichiers", "*.*")
+            ]
+        )
+        if filename:
+            self.gazetteer_file.set(filename)
+            self.log(f"Référentiel sélectionné : {os.path.basename(filename)}")
+            
+    def log(self, message, level=logging.INFO):
+        """Ajouter un message au journal (depuis n'importe quel thread)"""
+        self.log_queue(message, level)
+        
+    def poll_log(self):
+        """Afficher par lot les messages en attente, dans le thread de Tk"""
+        finished = self.worker is not None and not self.worker.is_alive()
+        
+        # Only the last MAX_LOG_LINES of a burst can stay on screen
+        records = deque(self.log_queue.drain(), maxlen=MAX_LOG_LINES)
+        if records:
+            for record in records:
+                tags = ('error',) if record.level >= logging.ERROR else ()
+                self.log_text.insert(tk.END, format_record(record) + "\n", tags)
+            excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - MAX_LOG_LINES
+            if excess > 0:
+                self.log_text.delete('1.0', f'{excess + 1}.0')
+            self.log_text.see(tk.END)
+            
+        if finished:
+            self.finish_processing()
+        self.root.after(LOG_POLL_MS, self.poll_log)
         
     def save_api_key(self):
         """Sauvegarder la clé API"""
         api_key = self.api_key.get().strip()
         if api_key:
-            config_file = os.path.expanduser("~/.ilotier_config.json")
             try:
-                with open(config_file, 'w') as f:
-                    json.dump({"api_key": api_key}, f)
+                config = load_config()
+                config["api_key"] = api_key
+                save_config(config)
                 self.log("Clé API sauvegardée avec succès")
                 messagebox.showinfo("Succès", "Clé API sauvegardée")
             except Exception as e:
@@ -247,14 +341,38 @@ class IlotierZoneMapper:
                 
     def load_api_key(self):
         """Charger la clé API sauvegardée"""
-        config_file = os.path.expanduser("~/.ilotier_config.json")
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                    self.api_key.set(config.get("api_key", ""))
-            except:
-                pass
+        config = load_config()
+        self.api_key.set(config.get("api_key", ""))
+        self.geocoding_settings.update(config.get("geocoding", {}))
+        self.log_file = config.get("log_file")
+        self.profile = config.get("profile")
+        self.zones_format = config.get("zones_format", 'json')
+        self.map_format = config.get("map_format", 'kml')
+        self.layer_limit = config.get("layer_limit", LAYER_LIMIT)
+        self.boundaries = config.get("boundaries", True)
+        self.travel_time = config.get("travel_time")
+        self.travel_mode = config.get("travel_mode", 'driving')
+        # "refine": true, or a time budget in seconds
+        refine = config.get("refine")
+        self.refine_time = TIME_BUDGET if refine is True else (refine or None)
+                
+    def clear_geocode_cache(self):
+        """Vider le cache de géocodage"""
+        if self.processing:
+            messagebox.showwarning("Traitement en cours", "Impossible de vider le cache pendant un traitement")
+            return
+        if not messagebox.askyesno("Vider le cache", 
+                "Supprimer toutes les adresses mémorisées ?\n\n" +
+                "Le prochain traitement interrogera de nouveau Google Maps pour chaque adresse."):
+            return
+        try:
+            cache = GeocodeCache()
+            cache.clear()
+            cache.close()
+            self.log("Cache de géocodage vidé")
+        except Exception as e:
+            self.log(f"Erreur lors du vidage du cache : {str(e)}")
+            messagebox.showerror("Erreur", f"Impossible de vider le cache : {str(e)}")
                 
     def validate_inputs(self):
         """Valider les entrées utilisateur"""
@@ -263,20 +381,32 @@ class IlotierZoneMapper:
         if not self.csv_file.get():
             errors.append("- Veuillez sélectionner un fichier CSV")
             
-        if not self.api_key.get():
-            errors.append("- Veuillez entrer une clé API Google Maps")
+        if not self.api_key.get() and not self.gazetteer_file.get():
+            errors.append("- Veuillez entrer une clé API Google Maps ou un référentiel hors ligne")
             
-        if not self.ilotier1_address.get():
-            errors.append("- Veuillez entrer l'adresse de l'ilotier 1")
+        names = set()
+        for number, ilotier in enumerate(self.ilotiers, start=1):
+            name = ilotier['name'].get().strip()
+            if not name:
+                errors.append(f"- Veuillez entrer le nom de l'ilotier {number}")
+            elif name in names:
+                errors.append(f"- Le nom « {name} » est utilisé par plusieurs ilotiers")
+            names.add(name)
             
-        if not self.ilotier2_address.get():
-            errors.append("- Veuillez entrer l'adresse de l'ilotier 2")
+            if not ilotier['address'].get():
+                errors.append(f"- Veuillez entrer l'adresse de l'ilotier {number}")
+                
+            try:
+                if float(ilotier['weight'].get().replace(',', '.')) <= 0:
+                    raise ValueError
+            except ValueError:
+                errors.append(f"- Le poids de l'ilotier {number} doit être un nombre positif")
             
         if errors:
             messagebox.showerror("Données manquantes", "Veuillez corriger les erreurs suivantes :\n\n" + "\n".join(errors))
             return False
             
-        if not GOOGLEMAPS_AVAILABLE:
+        if not self.gazetteer_file.get() and not GOOGLEMAPS_AVAILABLE:
             messagebox.showerror("Module manquant", 
                 "Le module 'googlemaps' n'est pas installé.\n\n" +
                 "Veuillez l'installer avec : pip install googlemaps")
@@ -293,502 +423,97 @@ class IlotierZoneMapper:
             messagebox.showwarning("Traitement en cours", "Un traitement est déjà en cours")
             return
             
+        # Offer to resume an interrupted run of the same file
+        resumable = 0 if self.gazetteer_file.get() else pending_checkpoint(self.csv_file.get())
+        self.resume = bool(resumable) and messagebox.askyesno("Reprendre le traitement",
+            f"Un traitement interrompu de ce fichier avait déjà géocodé {resumable} adresses.\n\n" +
+            "Reprendre à partir de ce point ?\n" +
+            "(Non : tout géocoder à nouveau)")
+            
         # Clear log
         self.log_text.delete(1.0, tk.END)
         
-        # Start processing in a separate thread
-        thread = threading.Thread(target=self.process_data_thread)
-        thread.daemon = True
-        thread.start()
-        
-    def process_data_thread(self):
-        """Thread de traitement des données"""
         self.processing = True
+        self.worker_error = None
         self.process_btn.config(state='disabled')
         self.progress.grid()
         self.progress.start()
         
-        try:
-            self.log("Début du traitement...")
-            
-            # Initialize Google Maps client
-            gmaps = googlemaps.Client(key=self.api_key.get())
-            
-            # Load and process data
-            families = self.load_families_from_csv(self.csv_file.get())
-            self.log(f"Chargé {len(families)} familles du CSV")
-            
-            # Geocode ilotiers
-            ilotier_coords = self.geocode_ilotiers(gmaps)
-            
-            # Geocode families
-            self.geocode_families(families, gmaps)
-            
-            # Apply balance algorithm
-            self.apply_balance_algorithm(families, ilotier_coords)
-            
-            # Save outputs
-            self.save_outputs(families, ilotier_coords)
-            
-            self.log("Traitement terminé avec succès !")
-            messagebox.showinfo("Succès", 
-                "Le traitement est terminé !\n\n" +
-                "Fichiers générés :\n" +
-                "- zones.json (données pour visualisation)\n" +
-                "- familles_zones.csv (CSV mis à jour)\n" +
-                "- zones.kml (pour Google My Maps)")
-            
-        except Exception as e:
-            self.log(f"ERREUR : {str(e)}")
-            messagebox.showerror("Erreur", f"Une erreur est survenue :\n\n{str(e)}")
-            
-        finally:
-            self.processing = False
-            self.process_btn.config(state='normal')
-            self.progress.stop()
-            self.progress.grid_remove()
-            
-    def load_families_from_csv(self, filename):
-        """Charger les familles depuis le fichier CSV ou Excel"""
-        families_dict = {}
-        
-        # Check file extension
-        file_ext = os.path.splitext(filename)[1].lower()
-        
-        if file_ext in ['.xlsx', '.xls']:
-            # Load from Excel
-            if not OPENPYXL_AVAILABLE:
-                raise Exception("Le module 'openpyxl' n'est pas installé. Installez-le avec : pip install openpyxl")
-                
-            wb = openpyxl.load_workbook(filename, read_only=True)
-            ws = wb.active
-            
-            # Get headers from first row
-            headers = []
-            for cell in ws[1]:
-                headers.append(cell.value if cell.value else '')
-                
-            # Process rows
-            for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-                # Create dict from row
-                row_dict = {}
-                for col_idx, value in enumerate(row):
-                    if col_idx < len(headers):
-                        row_dict[headers[col_idx]] = str(value) if value is not None else ''
-                        
-                self.process_family_row(row_dict, families_dict)
-                
-            wb.close()
-            
-        else:
-            # Load from CSV
-            with open(filename, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    self.process_family_row(row, families_dict)
-                    
-        return list(families_dict.values())
-        
-    def process_family_row(self, row, families_dict):
-        """Traiter une ligne de données famille"""
-        family_code = row.get('Famille', '').strip()
-        if not family_code or family_code == 'None':
-            return
-            
-        # Skip invalid family codes (example for German families)
-        # You can customize this list based on your needs
-        if family_code in ['2165915', '2192050']:
-            return
-            
-        # Build address
-        address_parts = []
-        if row.get('Adresse postale') and row.get('Adresse postale') != 'None':
-            address_parts.append(row['Adresse postale'].strip())
-        if row.get('Code postal de résidence') and row.get('Code postal de résidence') != 'None':
-            address_parts.append(row['Code postal de résidence'].strip())
-        if row.get('Ville de residence') and row.get('Ville de residence') != 'None':
-            address_parts.append(row['Ville de residence'].strip())
-            
-        address = ', '.join(address_parts)
-        
-        # Get contact info
-        is_main = row.get('Personne lien (O/N)', '') == 'O'
-        
-        # Store or update family
-        if family_code not in families_dict or is_main:
-            prenom = row.get('Prénoms', '')
-            nom = row.get('Nom de famille', '')
-            if prenom == 'None': prenom = ''
-            if nom == 'None': nom = ''
-            
-            families_dict[family_code] = {
-                'family_code': family_code,
-                'address': address,
-                'contact_name': f"{prenom} {nom}".strip(),
-                'mobile': row.get('Mobile perso', '').strip() if row.get('Mobile perso') != 'None' else '',
-                'phone': row.get('Téléphone perso', '').strip() if row.get('Téléphone perso') != 'None' else '',
-                'email': row.get('Adresse électronique 2 (Usage communication consulaire et vote électronique)', '').strip() if row.get('Adresse électronique 2 (Usage communication consulaire et vote électronique)') != 'None' else '',
-                'raw_data': row
-            }
-        
-    def geocode_ilotiers(self, gmaps):
-        """Géocoder les adresses des ilotiers"""
-        self.log("Géocodage des ilotiers...")
-        
-        ilotiers = {
-            self.ilotier1_name.get(): {
-                'address': self.ilotier1_address.get(),
-                'zone': 1
+        # Tk variables are only read here, on the main thread
+        job = {
+            'input_file': self.csv_file.get(),
+            'gazetteer': self.gazetteer_file.get(),
+            'api_key': self.api_key.get(),
+            'ilotiers': [(ilotier['name'].get().strip(), ilotier['address'].get()) for ilotier in self.ilotiers],
+            'weights': {
+                ilotier['name'].get().strip(): float(ilotier['weight'].get().replace(',', '.'))
+                for ilotier in self.ilotiers
             },
-            self.ilotier2_name.get(): {
-                'address': self.ilotier2_address.get(),
-                'zone': 2
-            }
+            'incremental': self.incremental.get()
         }
         
-        for name, info in ilotiers.items():
-            try:
-                result = gmaps.geocode(info['address'])
-                if result:
-                    location = result[0]['geometry']['location']
-                    info['lat'] = location['lat']
-                    info['lng'] = location['lng']
-                    self.log(f"  {name} : {info['lat']:.6f}, {info['lng']:.6f}")
-                else:
-                    raise Exception(f"Impossible de géocoder l'adresse de {name}")
-            except Exception as e:
-                raise Exception(f"Erreur lors du géocodage de {name}: {str(e)}")
-                
-        return ilotiers
+        # Start processing in a separate thread, poll_log() notices its end
+        self.worker = threading.Thread(target=self.process_data_thread, kwargs=job)
+        self.worker.daemon = True
+        self.worker.start()
         
-    def geocode_families(self, families, gmaps):
-        """Géocoder les adresses des familles"""
-        self.log(f"Géocodage de {len(families)} familles...")
+    def process_data_thread(self, input_file, gazetteer, api_key, ilotiers, weights, incremental):
+        """Thread de traitement des données (sans appel à Tk : le formulaire est lu par process_data)"""
+        # Imported on first use: numpy and the solver are not needed to show the window
+        from carte_ilotier.pipeline import ZonePipeline
+        from carte_ilotier.travel import TravelTimeCache, create_travel_service
         
-        for i, family in enumerate(families):
-            if i % 10 == 0:
-                self.log(f"  Progression : {i}/{len(families)}")
-                
+        try:
+            if gazetteer:
+                geocoder = create_geocoder('offline', gazetteer=gazetteer)
+            else:
+                geocoder = create_geocoder('google', api_key=api_key)
+            
+            # Optional travel-time balancing (config keys travel_time / travel_mode)
+            travel_service = None
+            if self.travel_time:
+                travel_service = create_travel_service(self.travel_time, api_key, self.travel_mode)
+            
+            cache = GeocodeCache()
+            travel_cache = TravelTimeCache() if travel_service and travel_service.cacheable else None
+            pipeline = ZonePipeline(log=self.log, geocoding_settings=self.geocoding_settings,
+                                    profile=self.profile, zones_format=self.zones_format,
+                                    map_format=self.map_format, layer_limit=self.layer_limit,
+                                    boundaries=self.boundaries, travel_service=travel_service,
+                                    travel_cache=travel_cache, refine_time=self.refine_time)
             try:
-                result = gmaps.geocode(family['address'])
-                if result:
-                    location = result[0]['geometry']['location']
-                    family['lat'] = location['lat']
-                    family['lng'] = location['lng']
-                else:
-                    family['lat'] = None
-                    family['lng'] = None
-                    self.log(f"  ⚠ Impossible de géocoder : {family['family_code']}")
-            except Exception as e:
-                family['lat'] = None
-                family['lng'] = None
-                self.log(f"  ⚠ Erreur pour {family['family_code']}: {str(e)}")
-                
-            # Rate limiting
-            time.sleep(0.2)
-            
-        self.log(f"  Géocodage terminé")
-        
-    def calculate_distance(self, lat1, lng1, lat2, lng2):
-        """Calculer la distance entre deux points (formule Haversine)"""
-        R = 6371  # Rayon de la Terre en km
-        
-        phi1 = math.radians(lat1)
-        phi2 = math.radians(lat2)
-        delta_phi = math.radians(lat2 - lat1)
-        delta_lambda = math.radians(lng2 - lng1)
-        
-        a = math.sin(delta_phi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda/2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-        
-        return R * c
-        
-    def apply_balance_algorithm(self, families, ilotier_coords):
-        """Appliquer l'algorithme d'équilibrage des zones"""
-        self.log("Application de l'algorithme d'équilibrage...")
-        
-        # Get ilotier names
-        ilotier_names = list(ilotier_coords.keys())
-        ilotier1_name = ilotier_names[0]
-        ilotier2_name = ilotier_names[1]
-        
-        # Calculate distances for each family
-        valid_families = []
-        for family in families:
-            if family.get('lat') is None:
-                continue
-                
-            family['dist_ilotier1'] = self.calculate_distance(
-                family['lat'], family['lng'],
-                ilotier_coords[ilotier1_name]['lat'], 
-                ilotier_coords[ilotier1_name]['lng']
-            )
+                pipeline.run(input_file, ilotiers, geocoder, cache=cache, weights=weights,
+                             incremental=incremental, resume=self.resume)
+            finally:
+                cache.close()
+                if travel_cache is not None:
+                    travel_cache.close()
             
-            family['dist_ilotier2'] = self.calculate_distance(
-                family['lat'], family['lng'],
-                ilotier_coords[ilotier2_name]['lat'],
-                ilotier_coords[ilotier2_name]['lng']
-            )
+            self.log("Traitement terminé avec succès !")
             
-            valid_families.append(family)
+        except Exception as e:
+            self.worker_error = e
+            self.log(f"ERREUR : {str(e)}", logging.ERROR)
             
-        # Natural Voronoi assignment
-        for family in valid_families:
-            if family['dist_ilotier1'] <= family['dist_ilotier2']:
-                family['natural_zone'] = 1
-            else:
-                family['natural_zone'] = 2
-                
-        # Count natural distribution
-        zone1_count = sum(1 for f in valid_families if f['natural_zone'] == 1)
-        zone2_count = sum(1 for f in valid_families if f['natural_zone'] == 2)
-        
-        self.log(f"  Répartition naturelle : Zone 1={zone1_count}, Zone 2={zone2_count}")
-        
-        # Balance if needed
-        total = len(valid_families)
-        target = total // 2
-        imbalance = zone1_count - zone2_count
+    def finish_processing(self):
+        """Fin du traitement : rétablir l'interface et afficher le résultat"""
+        self.worker = None
+        self.processing = False
+        self.process_btn.config(state='normal')
+        self.progress.stop()
+        self.progress.grid_remove()
         
-        if abs(imbalance) > 2:
-            # Need rebalancing
-            self.log(f"  Rééquilibrage nécessaire...")
-            
-            # Calculate transferability
-            for family in valid_families:
-                dist_diff = abs(family['dist_ilotier1'] - family['dist_ilotier2'])
-                max_dist = max(family['dist_ilotier1'], family['dist_ilotier2'])
-                family['transferability'] = dist_diff / max_dist if max_dist > 0 else 0
-                
-            # Sort by transferability
-            valid_families.sort(key=lambda x: x['transferability'])
-            
-            # Transfer families to achieve balance
-            transferred = 0
-            need_to_transfer = abs(imbalance) // 2
-            
-            for family in valid_families:
-                if transferred >= need_to_transfer:
-                    break
-                    
-                if imbalance > 0 and family['natural_zone'] == 1:
-                    # Transfer from zone 1 to zone 2
-                    family['zone'] = 2
-                    family['ilotier'] = ilotier2_name
-                    family['distance'] = family['dist_ilotier2']
-                    transferred += 1
-                elif imbalance < 0 and family['natural_zone'] == 2:
-                    # Transfer from zone 2 to zone 1
-                    family['zone'] = 1
-                    family['ilotier'] = ilotier1_name
-                    family['distance'] = family['dist_ilotier1']
-                    transferred += 1
-                else:
-                    # Keep natural assignment
-                    family['zone'] = family['natural_zone']
-                    if family['zone'] == 1:
-                        family['ilotier'] = ilotier1_name
-                        family['distance'] = family['dist_ilotier1']
-                    else:
-                        family['ilotier'] = ilotier2_name
-                        family['distance'] = family['dist_ilotier2']
-                        
-            # Assign remaining families
-            for family in valid_families:
-                if 'zone' not in family:
-                    family['zone'] = family['natural_zone']
-                    if family['zone'] == 1:
-                        family['ilotier'] = ilotier1_name
-                        family['distance'] = family['dist_ilotier1']
-                    else:
-                        family['ilotier'] = ilotier2_name
-                        family['distance'] = family['dist_ilotier2']
-                        
-            self.log(f"  {transferred} familles transférées pour l'équilibrage")
+        if self.worker_error:
+            messagebox.showerror("Erreur", f"Une erreur est survenue :\n\n{str(self.worker_error)}")
         else:
-            # Keep natural assignment
-            for family in valid_families:
-                family['zone'] = family['natural_zone']
-                if family['zone'] == 1:
-                    family['ilotier'] = ilotier1_name
-                    family['distance'] = family['dist_ilotier1']
-                else:
-                    family['ilotier'] = ilotier2_name
-                    family['distance'] = family['dist_ilotier2']
-                    
-        # Final count
-        zone1_final = sum(1 for f in valid_families if f['zone'] == 1)
-        zone2_final = sum(1 for f in valid_families if f['zone'] == 2)
-        
-        self.log(f"  Répartition finale : Zone 1={zone1_final}, Zone 2={zone2_final}")
-        self.log(f"  Équilibre : {zone1_final/total*100:.1f}% / {zone2_final/total*100:.1f}%")
-        
-    def save_outputs(self, families, ilotier_coords):
-        """Sauvegarder les fichiers de sortie"""
-        output_dir = os.path.dirname(self.csv_file.get())
-        
-        # Save JSON
-        json_file = os.path.join(output_dir, "zones.json")
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                'ilotiers': ilotier_coords,
-                'families': families
-            }, f, ensure_ascii=False, indent=2)
-        self.log(f"Fichier JSON sauvegardé : zones.json")
-        
-        # Save updated CSV
-        csv_file = os.path.join(output_dir, "familles_zones.csv")
-        self.save_updated_csv(families, csv_file)
-        self.log(f"Fichier CSV sauvegardé : familles_zones.csv")
-        
-        # Save KML
-        kml_file = os.path.join(output_dir, "zones.kml")
-        self.save_kml(families, ilotier_coords, kml_file)
-        self.log(f"Fichier KML sauvegardé : zones.kml")
-        
-    def save_updated_csv(self, families, output_file):
-        """Sauvegarder le CSV mis à jour"""
-        # Read original CSV to preserve all columns
-        original_rows = []
-        with open(self.csv_file.get(), 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-            for row in reader:
-                original_rows.append(row)
-                
-        # Add new columns
-        new_fieldnames = fieldnames + ['Ilotier', 'Zone', 'Distance (km)', 'Lien Google Maps']
-        
-        # Create family lookup
-        family_lookup = {f['family_code']: f for f in families if 'zone' in f}
-        
-        # Update rows
-        for row in original_rows:
-            family_code = row.get('Famille', '')
-            if family_code in family_lookup:
-                family = family_lookup[family_code]
-                row['Ilotier'] = family.get('ilotier', '')
-                row['Zone'] = str(family.get('zone', ''))
-                row['Distance (km)'] = f"{family.get('distance', 0):.2f}"
-                row['Lien Google Maps'] = f"https://www.google.com/maps/search/?api=1&query={family.get('lat', '')},{family.get('lng', '')}"
-            else:
-                row['Ilotier'] = ''
-                row['Zone'] = ''
-                row['Distance (km)'] = ''
-                row['Lien Google Maps'] = ''
-                
-        # Write updated CSV
-        with open(output_file, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=new_fieldnames)
-            writer.writeheader()
-            writer.writerows(original_rows)
-            
-    def save_kml(self, families, ilotier_coords, output_file):
-        """Générer le fichier KML pour Google My Maps"""
-        kml_content = '''<?xml version="1.0" encoding="UTF-8"?>
-<kml xmlns="http://www.opengis.net/kml/2.2">
-    <Document>
-        <name>Zones d'urgence</name>
-        <description>Répartition des familles entre ilotiers</description>
-        
-        <!-- Style Zone 1 -->
-        <Style id="zone1">
-            <IconStyle>
-                <color>ffff0000</color>
-                <scale>0.8</scale>
-                <Icon>
-                    <href>http://maps.google.com/mapfiles/kml/paddle/blu-circle.png</href>
-                </Icon>
-            </IconStyle>
-        </Style>
-        
-        <!-- Style Zone 2 -->
-        <Style id="zone2">
-            <IconStyle>
-                <color>ff0000ff</color>
-                <scale>0.8</scale>
-                <Icon>
-                    <href>http://maps.google.com/mapfiles/kml/paddle/red-circle.png</href>
-                </Icon>
-            </IconStyle>
-        </Style>
-        
-        <!-- Style Ilotier -->
-        <Style id="ilotier">
-            <IconStyle>
-                <color>ff00ff00</color>
-                <scale>1.2</scale>
-                <Icon>
-                    <href>http://maps.google.com/mapfiles/kml/paddle/grn-stars.png</href>
-                </Icon>
-            </IconStyle>
-        </Style>
-        
-        <!-- Ilotiers -->
-        <Folder>
-            <name>Ilotiers</name>
-'''
-        
-        # Add ilotiers
-        for name, coords in ilotier_coords.items():
-            kml_content += f'''            <Placemark>
-                <name>{name}</name>
-                <description>Ilotier Zone {coords['zone']}</description>
-                <styleUrl>#ilotier</styleUrl>
-                <Point>
-                    <coordinates>{coords['lng']},{coords['lat']},0</coordinates>
-                </Point>
-            </Placemark>
-'''
-        
-        kml_content += '''        </Folder>
-        
-        <!-- Familles Zone 1 -->
-        <Folder>
-            <name>Zone 1</name>
-'''
-        
-        # Add Zone 1 families
-        for family in families:
-            if family.get('zone') == 1 and family.get('lat'):
-                kml_content += f'''            <Placemark>
-                <name>{family['family_code']}</name>
-                <description>{family.get('address', '')}
-Distance : {family.get('distance', 0):.2f} km</description>
-                <styleUrl>#zone1</styleUrl>
-                <Point>
-                    <coordinates>{family['lng']},{family['lat']},0</coordinates>
-                </Point>
-            </Placemark>
-'''
-        
-        kml_content += '''        </Folder>
-        
-        <!-- Familles Zone 2 -->
-        <Folder>
-            <name>Zone 2</name>
-'''
-        
-        # Add Zone 2 families
-        for family in families:
-            if family.get('zone') == 2 and family.get('lat'):
-                kml_content += f'''            <Placemark>
-                <name>{family['family_code']}</name>
-                <description>{family.get('address', '')}
-Distance : {family.get('distance', 0):.2f} km</description>
-                <styleUrl>#zone2</styleUrl>
-                <Point>
-                    <coordinates>{family['lng']},{family['lat']},0</coordinates>
-                </Point>
-            </Placemark>
-'''
-        
-        kml_content += '''        </Folder>
-    </Document>
-</kml>'''
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(kml_content)
+            messagebox.showinfo("Succès", 
+                "Le traitement est terminé !\n\n" +
+                "Fichiers générés :\n" +
+                f"- {zones_filename(self.zones_format)} (données pour visualisation)\n" +
+                "- familles_zones.csv (CSV mis à jour)\n" +
+                f"- zones.{self.map_format} (pour Google My Maps)\n" +
+                ("- zones_contours.geojson (contours des zones)\n" if self.boundaries else "") +
+                "- metriques.json (durée de chaque étape)")
             
     def show_api_guide(self):
         """Afficher le guide pour obtenir une clé API"""
@@ -883,6 +608,8 @@ UTILISATION :
    • Entrez le nom de chaque ilotier
    • Entrez l'adresse complète de chaque ilotier
    • Ces adresses serviront de points de référence
+   • "+ Ajouter un ilotier" pour répartir entre plus de deux
+   • Poids : part relative de familles (2 = deux fois plus)
 
 3. ENTRER LA CLÉ API
    • Entrez votre clé API Google Maps
@@ -893,6 +620,9 @@ UTILISATION :
    • Cliquez sur "Lancer le traitement"
    • Le processus peut prendre plusieurs minutes
    • Ne fermez pas l'application pendant le traitement
+   • Les adresses déjà géocodées sont mémorisées : une
+     relance ne consomme pas de nouveaux appels à l'API
+     (bouton "Vider le cache" pour tout réinterroger)
 
 FICHIERS GÉNÉRÉS :
 
@@ -907,10 +637,11 @@ FICHIERS GÉNÉRÉS :
 ALGORITHME :
 
 L'application utilise un algorithme de répartition équilibrée :
-1. Assigne chaque famille à l'ilotier le plus proche
-2. Si le déséquilibre est trop important (>2 familles)
-3. Transfère les familles les plus "transférables"
-4. Objectif : répartition 50/50
+1. Chaque ilotier reçoit une part des familles proportionnelle
+   à son poids (à une famille près)
+2. Parmi toutes les répartitions respectant ces parts, celle
+   qui minimise la distance totale est retenue (optimale)
+3. Avec des poids égaux : répartition 50/50, 33/33/33, etc.
 
 DÉPANNAGE :
 
@@ -953,10 +684,26 @@ Licence : Usage libre pour les ilotiers"""
         
         messagebox.showinfo("À propos", about_text)
 
+def write_startup_probe(root, filename):
+    """Noter l'heure d'affichage de la première fenêtre puis quitter (mesure du démarrage)"""
+    root.update()
+    with open(filename, 'w') as f:
+        f.write(repr(time.time()))
+    root.destroy()
+
 def main():
-    """Point d'entrée principal"""
+    """Point d'entrée principal : interface graphique, ou ligne de commande si des arguments sont fournis"""
+    # Frozen executable: batch worker processes re-run it, they must not reach the CLI
+    multiprocessing.freeze_support()
+    if len(sys.argv) > 1:
+        from carte_ilotier.cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+        
     root = tk.Tk()
     app = IlotierZoneMapper(root)
+    probe = os.environ.get(STARTUP_PROBE_ENV)
+    if probe:
+        root.after_idle(write_startup_probe, root, probe)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Tests du géocodage hors ligne (GazetteerGeocoder)"""
+
+import os
+import tempfile
+import unittest
+
+from carte_ilotier.geocoders import GazetteerGeocoder
+
+GAZETTEER = '''adresse,code_postal,ville,lat,lng
+141 rue de la Paix,75001,Paris,48.869,2.331
+1 rue de Rivoli,75001,Paris,48.856,2.352
+,162-0842,Tokyo,35.6938,139.7264
+"1-2-11 Ichigayasadoharacho, 162-0842, Tokyo",,,35.6935,139.7301
+'''
+
+
+class GazetteerGeocoderTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            f.write(GAZETTEER)
+        self.geocoder = GazetteerGeocoder(self.filename)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_same_postal_code_exact_addresses(self):
+        # Addresses as built by the pipeline: street, postal code, city
+        self.assertEqual(self.geocoder.geocode('1 rue de Rivoli, 75001, Paris'), (48.856, 2.352))
+        self.assertEqual(self.geocoder.geocode('141 Rue de la Paix, 75 001, PARIS'), (48.869, 2.331))
+        self.assertEqual(self.geocoder.approximate, {})
+
+    def test_postal_code_centroid_is_averaged(self):
+        lat, lng = self.geocoder.geocode('3 rue du Louvre, 75001, Paris')
+        self.assertAlmostEqual(lat, 48.8625)
+        self.assertAlmostEqual(lng, 2.3415)
+        self.assertEqual(self.geocoder.approximate, {'3 rue du louvre, 75001, paris': 'code postal'})
+
+    def test_postal_code_row_without_address_is_the_centroid(self):
+        self.assertEqual(self.geocoder.geocode('1-2-11 Ichigayasadoharacho, 162-0842, Tokyo'), (35.6935, 139.7301))
+        self.assertEqual(self.geocoder.geocode('5-1 Ichigayasadoharacho, 162-0842, Tokyo'), (35.6938, 139.7264))
+
+    def test_unknown_address(self):
+        self.assertIsNone(self.geocoder.geocode('1 rue Inconnue, Lyon'))
+
+
+if __name__ == '__main__':
+    unittest.main()